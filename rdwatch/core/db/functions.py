@@ -78,6 +78,19 @@ class BoundingBoxGeoJSON(Cast):
         return super().__init__(json_str, JSONField())  # noqa: B037
 
 
+class BoundingBoxSize(Func):
+    """Gets the larger of the width and height of a geometry's bounding box"""
+
+    output_field: FloatField = FloatField()
+    template = (
+        'GREATEST('
+        'ST_XMax(%(expressions)s) - ST_XMin(%(expressions)s), '
+        'ST_YMax(%(expressions)s) - ST_YMin(%(expressions)s)'
+        ')'
+    )
+    arity = 1
+
+
 class AsGeoJSONDeserialized(Cast):
     def __init__(self, field):
         json_str = AsGeoJSON(field)
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from rdwatch.core.models import Region
+from rdwatch.core.tasks import harvest_capture_catalog
+
+
+class Command(BaseCommand):
+    help = 'Queues harvesting the captures over a region into the local capture catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--region',
+            type=str,
+            help='Name of the region to harvest captures for',
+            required=True,
+        )
+        parser.add_argument(
+            '--start',
+            type=datetime.fromisoformat,
+            help='Start of the time window to harvest, in UTC',
+            required=True,
+        )
+        parser.add_argument(
+            '--end',
+            type=datetime.fromisoformat,
+            help='End of the time window to harvest, in UTC',
+            required=True,
+        )
+        parser.add_argument(
+            '--constellation',
+            nargs='+',
+            default=['S2', 'L8', 'WV'],
+            help='Constellations to harvest captures of',
+        )
+
+    def handle(self, *args, **kwargs):
+        regions = Region.objects.filter(name=kwargs['region'])
+        if not regions.exists():
+            self.stdout.write(
+                self.style.ERROR(f"Error: Region {kwargs['region']} does not exist")
+            )
+            return
+        for region in regions:
+            harvest_capture_catalog.delay(
+                region.pk, kwargs['start'], kwargs['end'], kwargs['constellation']
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Queued harvesting captures for {kwargs['region']}")
+        )
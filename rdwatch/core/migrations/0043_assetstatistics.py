@@ -0,0 +1,50 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+import django_extensions.db.fields
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0042_siteevaluation_smqtk_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetStatistics',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'href',
+                    models.CharField(
+                        help_text=(
+                            'Link to the raster asset the statistics were computed for'
+                        ),
+                        max_length=2048,
+                        unique=True,
+                    ),
+                ),
+                (
+                    'created',
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name='created'
+                    ),
+                ),
+                (
+                    'statistics',
+                    models.JSONField(
+                        help_text='Per band min, max and 2nd/98th percentiles of the asset'
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+import django_extensions.db.fields
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0044_satellitefetching_watermarks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Capture',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'catalog',
+                    models.CharField(
+                        help_text='URL of the STAC catalog the item was harvested from',
+                        max_length=2048,
+                    ),
+                ),
+                ('collection', models.CharField(max_length=255)),
+                ('item_id', models.CharField(max_length=255)),
+                (
+                    'datetime',
+                    models.DateTimeField(
+                        db_index=True, help_text='Acquisition time of the item, in UTC'
+                    ),
+                ),
+                (
+                    'footprint',
+                    django.contrib.gis.db.models.fields.GeometryField(
+                        help_text='Footprint of the item', srid=4326
+                    ),
+                ),
+                ('item', models.JSONField(help_text='The STAC item')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('catalog', 'collection', 'item_id'),
+                        name='unique_capture_item',
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='CaptureHarvest',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'catalog',
+                    models.CharField(
+                        help_text='URL of the STAC catalog that was harvested',
+                        max_length=2048,
+                    ),
+                ),
+                ('collection', models.CharField(max_length=255)),
+                (
+                    'area',
+                    django.contrib.gis.db.models.fields.PolygonField(
+                        help_text='Bounding box that was harvested', srid=4326
+                    ),
+                ),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                (
+                    'created',
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name='created'
+                    ),
+                ),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        fields=['catalog', 'collection', 'start', 'end'],
+                        name='capture_harvest_window_idx',
+                    )
+                ],
+            },
+        ),
+    ]
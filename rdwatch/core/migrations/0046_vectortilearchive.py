@@ -0,0 +1,68 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+import django_extensions.db.fields
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0045_capture_captureharvest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VectorTileArchive',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'archive',
+                    models.FileField(
+                        blank=True,
+                        default=None,
+                        help_text=(
+                            'PMTiles archive of the vector tiles, '
+                            'empty if every tile is empty'
+                        ),
+                        null=True,
+                        upload_to='',
+                    ),
+                ),
+                (
+                    'timestamp',
+                    models.DateTimeField(
+                        help_text='Latest change to the model run when the archive was built'
+                    ),
+                ),
+                (
+                    'max_zoom',
+                    models.PositiveSmallIntegerField(
+                        help_text='Highest zoom level in the archive'
+                    ),
+                ),
+                (
+                    'created',
+                    django_extensions.db.fields.CreationDateTimeField(
+                        auto_now_add=True, verbose_name='created'
+                    ),
+                ),
+                (
+                    'model_run',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='vector_tile_archive',
+                        to='core.modelrun',
+                    ),
+                ),
+            ],
+        ),
+    ]
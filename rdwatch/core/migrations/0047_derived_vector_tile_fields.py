@@ -0,0 +1,78 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+from django.contrib.gis.db.models.functions import Transform
+from django.db import migrations, models
+from django.db.models import FloatField, Func, OuterRef, Subquery
+
+
+def populate_derived_fields(apps, schema_editor):
+    ObservationLabel = apps.get_model('core', 'ObservationLabel')
+    SiteEvaluation = apps.get_model('core', 'SiteEvaluation')
+    SiteObservation = apps.get_model('core', 'SiteObservation')
+
+    label_slug = Subquery(
+        ObservationLabel.objects.filter(pk=OuterRef('label_id')).values('slug')[:1]
+    )
+    SiteEvaluation.objects.update(label_slug=label_slug)
+    SiteObservation.objects.update(
+        label_slug=label_slug,
+        area=Func(
+            Transform('geom', srid=6933),
+            function='ST_Area',
+            output_field=FloatField(),
+        ),
+        next_timestamp=Subquery(
+            SiteObservation.objects.filter(
+                siteeval_id=OuterRef('siteeval_id'),
+                timestamp__gt=OuterRef('timestamp'),
+            )
+            .order_by('timestamp')
+            .values('timestamp')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0046_vectortilearchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='siteevaluation',
+            name='label_slug',
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                default='',
+                help_text='Slug of the site feature classification label',
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='siteobservation',
+            name='label_slug',
+            field=models.SlugField(
+                blank=True,
+                db_index=False,
+                default='',
+                help_text='Slug of the observation label',
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='siteobservation',
+            name='area',
+            field=models.FloatField(
+                help_text='Equal-area size of the footprint (m²)', null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name='siteobservation',
+            name='next_timestamp',
+            field=models.DateTimeField(
+                help_text="Timestamp of the site's next observation", null=True
+            ),
+        ),
+        migrations.RunPython(populate_derived_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0047_derived_vector_tile_fields'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vectortilearchive',
+            name='timestamp',
+        ),
+        # Existing archives don't match any generation until they are rebuilt
+        migrations.AddField(
+            model_name='vectortilearchive',
+            name='generation',
+            field=models.BigIntegerField(
+                default=0,
+                help_text=(
+                    'Cache generation of the vector tiles when the archive was built'
+                ),
+            ),
+            preserve_default=False,
+        ),
+    ]
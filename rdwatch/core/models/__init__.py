@@ -1,4 +1,6 @@
 from . import lookups
+from .asset_statistics import AssetStatistics
+from .capture import Capture, CaptureHarvest
 from .model_run import ModelRun
 from .model_run_upload import ModelRunUpload
 from .performer import Performer
@@ -8,9 +10,13 @@ from .site_evaluation import SiteEvaluation, SiteEvaluationTracking
 from .site_image import SiteImage
 from .site_observation import SiteObservation, SiteObservationTracking
 from .task_exports import AnimationModelRunExport, AnimationSiteExport, AnnotationExport
+from .vector_tile_archive import VectorTileArchive
 
 __all__ = [
+    'AssetStatistics',
     'AnnotationExport',
+    'Capture',
+    'CaptureHarvest',
     'lookups',
     'ModelRun',
     'ModelRunUpload',
@@ -24,4 +30,5 @@ __all__ = [
     'SiteObservationTracking',
     'AnimationSiteExport',
     'AnimationModelRunExport',
+    'VectorTileArchive',
 ]
@@ -0,0 +1,18 @@
+from django_extensions.db.models import CreationDateTimeField
+
+from django.db import models
+
+
+class AssetStatistics(models.Model):
+    href = models.CharField(
+        max_length=2048,
+        unique=True,
+        help_text='Link to the raster asset the statistics were computed for',
+    )
+    created = CreationDateTimeField()
+    statistics = models.JSONField(
+        help_text='Per band min, max and 2nd/98th percentiles of the asset',
+    )
+
+    def __str__(self) -> str:
+        return self.href
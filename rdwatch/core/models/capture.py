@@ -0,0 +1,65 @@
+from django_extensions.db.models import CreationDateTimeField
+
+from django.contrib.gis.db.models import GeometryField, PolygonField
+from django.db import models
+
+
+class Capture(models.Model):
+    """A STAC item harvested into the local capture catalog."""
+
+    catalog = models.CharField(
+        max_length=2048,
+        help_text='URL of the STAC catalog the item was harvested from',
+    )
+    collection = models.CharField(max_length=255)
+    item_id = models.CharField(max_length=255)
+    datetime = models.DateTimeField(
+        db_index=True,
+        help_text='Acquisition time of the item, in UTC',
+    )
+    footprint = GeometryField(
+        srid=4326,
+        spatial_index=True,
+        help_text='Footprint of the item',
+    )
+    item = models.JSONField(help_text='The STAC item')
+
+    def __str__(self) -> str:
+        return f'{self.collection}/{self.item_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_capture_item',
+                fields=['catalog', 'collection', 'item_id'],
+            ),
+        ]
+
+
+class CaptureHarvest(models.Model):
+    """An area and time window of a collection harvested into the catalog."""
+
+    catalog = models.CharField(
+        max_length=2048,
+        help_text='URL of the STAC catalog that was harvested',
+    )
+    collection = models.CharField(max_length=255)
+    area = PolygonField(
+        srid=4326,
+        spatial_index=True,
+        help_text='Bounding box that was harvested',
+    )
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    created = CreationDateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.collection}@{self.start.isoformat()}/{self.end.isoformat()}'
+
+    class Meta:
+        indexes = [
+            models.Index(
+                name='capture_harvest_window_idx',
+                fields=['catalog', 'collection', 'start', 'end'],
+            ),
+        ]
@@ -36,6 +36,11 @@ class BaseSatelliteFetching(models.Model):
     )
 
     error = models.TextField(blank=True, help_text='Error text if an error occurs')
+    watermarks = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Date range and parameters already fetched, per constellation',
+    )
 
     def __str__(self) -> str:
         time = self.timestamp.isoformat()
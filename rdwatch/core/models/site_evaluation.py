@@ -15,6 +15,7 @@ from rdwatch.core.models.region import get_or_create_region
 from rdwatch.core.schemas import RegionModel, SiteModel
 from rdwatch.core.schemas.region_model import RegionFeature, SiteSummaryFeature
 from rdwatch.core.schemas.site_model import SiteFeature
+from rdwatch.core.utils.vector_tile_generation import bump_vector_tile_generation
 
 
 class SiteEvaluation(models.Model):
@@ -59,6 +60,12 @@ class SiteEvaluation(models.Model):
         help_text='Site feature classification label',
         db_index=True,
     )
+    # Copy of the label's slug, so vector tiles don't have to join the label
+    label_slug = models.SlugField(
+        help_text='Slug of the site feature classification label',
+        blank=True,
+        db_index=False,
+    )
     score = models.FloatField(
         help_text='Score of site footprint',
     )
@@ -173,6 +180,7 @@ class SiteEvaluation(models.Model):
                 end_date=site_feature.properties.end_date,
                 geom=geom,
                 label=label,
+                label_slug=label.slug,
                 point=point,
                 score=site_feature.properties.score,
                 status=status,
@@ -184,6 +192,7 @@ class SiteEvaluation(models.Model):
                 modified_timestamp=datetime.now(),
             )
             SiteObservation.bulk_create_from_site_evaluation(site_eval, site_model)
+            bump_vector_tile_generation(configuration.pk)
 
         return site_eval
 
@@ -227,12 +236,14 @@ class SiteEvaluation(models.Model):
                     number=feature.properties.site_number,
                     geom=geometry,
                     label=label_map[feature.properties.status],
+                    label_slug=label_map[feature.properties.status].slug,
                     score=feature.properties.score,
                     modified_timestamp=datetime.now(),
                 )
                 site_evals.append(site_eval)
 
             created = cls.objects.bulk_create(site_evals)
+            bump_vector_tile_generation(configuration.pk)
 
         return created
 
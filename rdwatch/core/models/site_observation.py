@@ -1,11 +1,13 @@
+from collections.abc import Iterable
 from typing import Self
 from uuid import uuid4
 
 from django.contrib.gis.db.models import PointField, PolygonField
+from django.contrib.gis.db.models.functions import Transform
 from django.contrib.gis.geos import MultiPolygon, Point, Polygon
 from django.contrib.postgres.indexes import GistIndex
 from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db.models import CheckConstraint, FloatField, Func, OuterRef, Q, Subquery
 
 from rdwatch.core.models import SiteEvaluation, lookups
 from rdwatch.core.schemas import SiteModel
@@ -60,6 +62,23 @@ class SiteObservation(models.Model):
     )
     notes = models.TextField(null=True, blank=True)
 
+    # Derived from the fields above and the other observations of the site,
+    # see `update_derived_fields`, so vector tiles don't compute them for
+    # every feature
+    label_slug = models.SlugField(
+        help_text='Slug of the observation label',
+        blank=True,
+        db_index=False,
+    )
+    area = models.FloatField(
+        help_text='Equal-area size of the footprint (m²)',
+        null=True,
+    )
+    next_timestamp = models.DateTimeField(
+        help_text="Timestamp of the site's next observation",
+        null=True,
+    )
+
     def __str__(self):
         sit = str(self.siteeval)
         lbl = str(self.label).upper()
@@ -155,7 +174,37 @@ class SiteObservation(models.Model):
                     )
                 )
 
-        return SiteObservation.objects.bulk_create(site_observations)
+        created = SiteObservation.objects.bulk_create(site_observations)
+        cls.update_derived_fields([site_eval.pk])
+        return created
+
+    @classmethod
+    def update_derived_fields(cls, siteeval_ids: Iterable) -> None:
+        """
+        Recompute the derived fields of every observation of the given site
+        evaluations. This has to be done whenever observations are added or
+        their label, footprint or timestamp changes.
+        """
+        cls.objects.filter(siteeval_id__in=siteeval_ids).update(
+            label_slug=Subquery(
+                lookups.ObservationLabel.objects.filter(pk=OuterRef('label_id')).values(
+                    'slug'
+                )[:1]
+            ),
+            area=Func(
+                Transform('geom', srid=6933),
+                function='ST_Area',
+                output_field=FloatField(),
+            ),
+            next_timestamp=Subquery(
+                cls.objects.filter(
+                    siteeval_id=OuterRef('siteeval_id'),
+                    timestamp__gt=OuterRef('timestamp'),
+                )
+                .order_by('timestamp')
+                .values('timestamp')[:1]
+            ),
+        )
 
     class Meta:
         default_related_name = 'observations'
@@ -0,0 +1,35 @@
+from django_extensions.db.models import CreationDateTimeField
+
+from django.db import models
+from django.dispatch import receiver
+
+
+class VectorTileArchive(models.Model):
+    model_run = models.OneToOneField(
+        to='ModelRun',
+        on_delete=models.CASCADE,
+        related_name='vector_tile_archive',
+    )
+    archive = models.FileField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text='PMTiles archive of the vector tiles, empty if every tile is empty',
+    )
+    generation = models.BigIntegerField(
+        help_text='Cache generation of the vector tiles when the archive was built',
+    )
+    max_zoom = models.PositiveSmallIntegerField(
+        help_text='Highest zoom level in the archive',
+    )
+    created = CreationDateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.model_run_id}@{self.generation}'
+
+
+@receiver(models.signals.pre_delete, sender=VectorTileArchive)
+def delete_archive(sender, instance: VectorTileArchive, **kwargs):
+    # Also runs when the archive is deleted along with its model run
+    if instance.archive:
+        instance.archive.delete(save=False)
@@ -1,10 +1,8 @@
-import io
 import json
 import logging
 import os
 import tempfile
 import zipfile
-from collections.abc import Iterable
 from datetime import datetime, timedelta
 from typing import Literal, TypeVar
 from uuid import UUID, uuid4
@@ -17,7 +15,6 @@ from celery.result import AsyncResult
 from celery.states import READY_STATES
 from django_celery_results.models import TaskResult
 from more_itertools import ichunked
-from PIL import Image
 from pydantic import UUID4, BaseModel, ValidationError
 from pyproj import Transformer
 from segment_anything import SamPredictor, sam_model_registry
@@ -28,7 +25,15 @@ from django.contrib.gis.geos import Polygon
 from django.core.files import File
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.db.models import DateTimeField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models import (
+    DateTimeField,
+    ExpressionWrapper,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+)
 from django.db.models.functions import JSONObject  # type: ignore
 from django.utils import timezone
 
@@ -40,6 +45,7 @@ from rdwatch.core.models import (
     ModelRun,
     ModelRunUpload,
     Performer,
+    Region,
     SatelliteFetching,
     SiteEvaluation,
     SiteImage,
@@ -49,18 +55,41 @@ from rdwatch.core.models.lookups import Constellation
 from rdwatch.core.models.region import get_or_create_region
 from rdwatch.core.schemas.region_model import RegionModel
 from rdwatch.core.schemas.site_model import SiteModel
+from rdwatch.core.utils.asset_statistics import get_reader_statistics
+from rdwatch.core.utils.capture_plan import (
+    SiteCaptureWindow,
+    get_planned_items,
+    get_planned_windows,
+    plan_captures,
+    search_windows,
+)
+from rdwatch.core.utils.fetch_watermark import (
+    get_uncovered_windows,
+    in_windows,
+    make_watermark,
+)
+from rdwatch.core.utils.image_quality import get_image_quality
 from rdwatch.core.utils.images import (
     fetch_boundbox_image,
+    fetch_capture_images,
+    get_captures_from_items,
     get_max_bbox,
-    get_percent_black_pixels,
     get_range_captures,
-    ignore_pillow_filesize_limits,
     scale_bbox,
 )
-from rdwatch.core.utils.raster_tile import get_raster_bbox_from_reader
-from rdwatch.core.utils.worldview_nitf.raster_tile import get_worldview_nitf_bbox
-from rdwatch.core.utils.worldview_processed.raster_tile import (
-    get_worldview_processed_visual_bbox,
+from rdwatch.core.utils.site_image_writer import SiteImageWriter
+from rdwatch.core.utils.stac_cache import harvest_stac_items
+from rdwatch.core.utils.stac_search import COLLECTIONS_BY_SOURCE, STAC_URLS
+from rdwatch.core.utils.task_progress import ProgressReporter
+from rdwatch.core.utils.task_routing import get_bulk_fetch_options, get_delivery_options
+from rdwatch.core.utils.timestamp_index import TimestampIndex
+from rdwatch.core.utils.vector_tile_archive import build_vector_tile_archive
+from rdwatch.core.utils.vector_tile_generation import clear_vector_tile_generations
+from rdwatch.core.utils.worldview_nitf.stac_search import (
+    COLLECTIONS as WORLDVIEW_NITF_COLLECTIONS,
+)
+from rdwatch.core.utils.worldview_processed.stac_search import (
+    COLLECTIONS as WORLDVIEW_COLLECTIONS,
 )
 
 logger = logging.getLogger(__name__)
@@ -157,17 +186,114 @@ def get_site_model_feature_JSON(id: UUID4, obsevations=False):
     return None, None
 
 
-def is_inside_range(
-    timestamps: Iterable[datetime], check_timestamp: datetime, days_range
-):
-    for timestamp in timestamps:
-        time_difference = check_timestamp - timestamp
-        if abs(time_difference.days) <= days_range:
-            logger.info(
-                f'Skipping Timestamp because difference is: {time_difference.days}'
+def get_site_bbox(
+    site_eval: SiteEvaluation,
+    baseConstellation: str,
+    bboxScale: float = BboxScaleDefault,
+    pointArea: float = pointAreaDefault,
+) -> list[float]:
+    """Get the (lon/lat) bbox to fetch images for, padded for context."""
+    transformer = Transformer.from_crs('EPSG:3857', 'EPSG:4326')
+    max_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+
+    mercator: tuple[float, float, float, float] = site_eval.boundingbox
+    tempbox = transformer.transform_bounds(
+        mercator[0], mercator[1], mercator[2], mercator[3]
+    )
+    # check if data is a point instead of geometry
+    if (
+        tempbox[2] == tempbox[0] and tempbox[3] == tempbox[1]
+    ):  # create bbox based on pointArea
+        size_diff = (pointArea * 0.5) / ToMeters
+        tempbox = [
+            tempbox[0] - size_diff,
+            tempbox[1] - size_diff,
+            tempbox[2] + size_diff,
+            tempbox[3] + size_diff,
+        ]
+
+    bbox = [tempbox[1], tempbox[0], tempbox[3], tempbox[2]]
+    # if width | height is too small we pad S2/L8 regions for more context
+    bbox_width = (tempbox[2] - tempbox[0]) * ToMeters
+    bbox_height = (tempbox[3] - tempbox[1]) * ToMeters
+    if baseConstellation != 'WV' and (
+        bbox_width < overrideImageSize or bbox_height < overrideImageSize
+    ):
+        size_diff = (
+            overrideImageSize * 0.5
+        ) / ToMeters  # find how much to add to each lon/lat
+        bbox = [
+            tempbox[1] - size_diff,
+            tempbox[0] - size_diff,
+            tempbox[3] + size_diff,
+            tempbox[2] + size_diff,
+        ]
+    # add the included padding to the updated BBOX
+    bbox = scale_bbox(bbox, bboxScale)
+    # get the updated BBOX if it's bigger
+    max_bbox = get_max_bbox(bbox, max_bbox)
+    logger.info(f'UPGRADED BBOX: {bbox}')
+    return max_bbox
+
+
+def get_site_capture_window(
+    site_eval: SiteEvaluation,
+    overrideDates: None | list[datetime, datetime] = None,
+) -> tuple[datetime, timedelta]:
+    """
+    Get the time window to search for captures in, as a (center, buffer) pair.
+
+    The window covers the evaluation's start/end dates and all of its
+    observations, padded by 30 days on either side.
+    """
+    if overrideDates and len(overrideDates) == 2:
+        min_time = datetime.strptime(overrideDates[0], '%Y-%m-%d')
+        max_time = datetime.strptime(overrideDates[1], '%Y-%m-%d')
+        timebuffer = (max_time - min_time) / 2
+        return min_time + timebuffer, timebuffer
+
+    # use the Eval Start/End date if not null
+    min_time = site_eval.start_date
+    max_time = site_eval.end_date
+    if min_time is None:
+        min_time = datetime.strptime(BaseTime, '%Y-%m-%d')
+    if max_time is None:
+        max_time = datetime.now()
+
+    observation_times = SiteObservation.objects.filter(siteeval=site_eval).aggregate(
+        min_time=Min('timestamp'), max_time=Max('timestamp')
+    )
+    if observation_times['min_time'] is not None:
+        min_time = min(min_time, observation_times['min_time'])
+        max_time = max(max_time, observation_times['max_time'])
+
+    timebuffer = ((max_time + timedelta(days=30)) - (min_time - timedelta(days=30))) / 2
+    return (min_time - timedelta(days=30)) + timebuffer, timebuffer
+
+
+def get_model_run_capture_windows(
+    model_run_id: UUID4,
+    constellations: list[str],
+    overrideDates: None | list[datetime, datetime] = None,
+    bboxScale: float = BboxScaleDefault,
+    pointArea: float = pointAreaDefault,
+) -> dict[str, dict[UUID4, SiteCaptureWindow]]:
+    """Get the capture window of every site in a model run, per constellation."""
+    windows: dict[str, dict[UUID4, SiteCaptureWindow]] = {
+        base_constellation: {} for base_constellation in constellations
+    }
+    sites = SiteEvaluation.objects.filter(configuration=model_run_id)
+    for eval in sites.iterator():
+        if eval.boundingbox is None:
+            continue
+        timestamp, timebuffer = get_site_capture_window(eval, overrideDates)
+        for base_constellation in constellations:
+            windows[base_constellation][eval.pk] = SiteCaptureWindow(
+                bbox=get_site_bbox(eval, base_constellation, bboxScale, pointArea),
+                start=timestamp - timebuffer,
+                end=timestamp + timebuffer,
             )
-            return True
-    return False
+    return windows
 
 
 @app.task(bind=True)
@@ -183,6 +309,8 @@ def get_siteobservation_images_task(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    capture_plan_id: str | None = None,
+    maxDimension: int | None = None,
 ) -> None:
     try:
         capture_count = 0
@@ -199,6 +327,8 @@ def get_siteobservation_images_task(
                 bboxScale=bboxScale,
                 pointArea=pointArea,
                 worldview_source=worldview_source,
+                capture_plan_id=capture_plan_id,
+                maxDimension=maxDimension,
             )
         fetching_task = SatelliteFetching.objects.get(site_id=site_eval_id)
         fetching_task.status = SatelliteFetching.Status.COMPLETE
@@ -226,305 +356,306 @@ def get_siteobservations_images(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    capture_plan_id: str | None = None,
+    maxDimension: int | None = None,
 ) -> None:
+    progress = ProgressReporter(self)
     constellationObj = Constellation.objects.filter(slug=baseConstellation).first()
     # Ensure we are using ints for the DayRange and no_data_limit
     dayRange = int(dayRange)
     no_data_limit = int(no_data_limit)
-    site_observations = SiteObservation.objects.filter(
-        siteeval=site_eval_id
-    )  # need a full list for min/max times
+    site_observations = SiteObservation.objects.filter(siteeval=site_eval_id)
     site_obs_count = SiteObservation.objects.filter(
         siteeval=site_eval_id, constellation_id=constellationObj.pk
     ).count()
-    transformer = Transformer.from_crs('EPSG:3857', 'EPSG:4326')
-    found_timestamps = {}
-    max_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+    found_timestamps = TimestampIndex()
     matchConstellation = ''
     # Use the base SiteEvaluation extents as the max size
     baseSiteEval = SiteEvaluation.objects.get(pk=site_eval_id)
-    # use the Eval Start/End date if not null
-    min_time = baseSiteEval.start_date
-    max_time = baseSiteEval.end_date
-    if min_time is None:
-        min_time = datetime.strptime(BaseTime, '%Y-%m-%d')
-    if max_time is None:
-        max_time = datetime.now()
-
-    mercator: tuple[float, float, float, float] = baseSiteEval.boundingbox
-    tempbox = transformer.transform_bounds(
-        mercator[0], mercator[1], mercator[2], mercator[3]
-    )
-    # check if data is a point instead of geometry
-    if (
-        tempbox[2] == tempbox[0] and tempbox[3] == tempbox[1]
-    ):  # create bbox based on pointArea
-        size_diff = (pointArea * 0.5) / ToMeters
-        tempbox = [
-            tempbox[0] - size_diff,
-            tempbox[1] - size_diff,
-            tempbox[2] + size_diff,
-            tempbox[3] + size_diff,
-        ]
-
-    bbox = [tempbox[1], tempbox[0], tempbox[3], tempbox[2]]
-    # if width | height is too small we pad S2/L8 regions for more context
-    bbox_width = (tempbox[2] - tempbox[0]) * ToMeters
-    bbox_height = (tempbox[3] - tempbox[1]) * ToMeters
-    if baseConstellation != 'WV' and (
-        bbox_width < overrideImageSize or bbox_height < overrideImageSize
-    ):
-        size_diff = (
-            overrideImageSize * 0.5
-        ) / ToMeters  # find how much to add to each lon/lat
-        bbox = [
-            tempbox[1] - size_diff,
-            tempbox[0] - size_diff,
-            tempbox[3] + size_diff,
-            tempbox[2] + size_diff,
-        ]
-    # add the included padding to the updated BBOX
-    bbox = scale_bbox(bbox, bboxScale)
-    # get the updated BBOX if it's bigger
-    max_bbox = get_max_bbox(bbox, max_bbox)
-    logger.info(f'UPGRADED BBOX: {bbox}')
-
-    # First we gather all images that match observations
-    count = 0
-    downloaded_count = 0
-    for observation in site_observations.iterator():
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': count,
-                'total': site_obs_count,
-                'mode': 'Finding Matching Site Observations',
-                'siteEvalId': site_eval_id,
-                'source': baseConstellation,
-            },
-        )
-        if observation.timestamp is not None:
-            min_time = min(min_time, observation.timestamp)
-            max_time = max(max_time, observation.timestamp)
-
-        timestamp = observation.timestamp
-        constellation = observation.constellation
-        # We need to grab the image for this timerange and type
-        logger.info(timestamp)
-        if str(constellation) == baseConstellation and timestamp is not None:
-            count += 1
-            baseSiteEval = observation.siteeval
-            matchConstellation = constellation
-            found = SiteImage.objects.filter(
-                site=observation.siteeval,
-                observation=observation,
-                timestamp=observation.timestamp,
-                source=baseConstellation,
+    max_bbox = get_site_bbox(baseSiteEval, baseConstellation, bboxScale, pointArea)
+
+    # Existing images are indexed once and new ones are written in bulk
+    with SiteImageWriter(baseSiteEval, baseConstellation) as site_images:
+        # First we gather all images that match observations
+        count = 0
+        downloaded_count = 0
+        for observation in site_observations.iterator():
+            progress.update(
+                state='PROGRESS',
+                meta={
+                    'current': count,
+                    'total': site_obs_count,
+                    'mode': 'Finding Matching Site Observations',
+                    'siteEvalId': site_eval_id,
+                    'source': baseConstellation,
+                },
             )
-            if (
-                baseConstellation in ('S2', 'L8', 'PL')
-                and dayRange > -1
-                and is_inside_range(
-                    found_timestamps.keys(), observation.timestamp, dayRange
+            timestamp = observation.timestamp
+            constellation = observation.constellation
+            # We need to grab the image for this timerange and type
+            logger.info(timestamp)
+            if str(constellation) == baseConstellation and timestamp is not None:
+                count += 1
+                baseSiteEval = observation.siteeval
+                matchConstellation = constellation
+                existing = site_images.find(observation.timestamp, observation)
+                if (
+                    baseConstellation in ('S2', 'L8', 'PL')
+                    and dayRange > -1
+                    and found_timestamps.is_inside_range(
+                        observation.timestamp, dayRange
+                    )
+                ):
+                    logger.info(f'Skipping Timestamp: {timestamp}')
+                    continue
+                if existing is not None and not force:
+                    found_timestamps.add(observation.timestamp.replace(microsecond=0))
+                    continue
+                results = fetch_boundbox_image(
+                    max_bbox,
+                    timestamp,
+                    constellation.slug,
+                    worldview_source,
+                    scale,
+                    max_size=maxDimension,
                 )
-            ):
-                logger.info(f'Skipping Timestamp: {timestamp}')
-                continue
-            if found.exists() and not force:
-                found_timestamps[observation.timestamp.replace(microsecond=0)] = True
-                continue
-            results = fetch_boundbox_image(
-                bbox,
-                timestamp,
-                constellation.slug,
-                worldview_source,
-                scale,
+                if results is None:
+                    logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
+                    continue
+                bytes = results['bytes']
+                found_timestamp = results['timestamp'].replace(microsecond=0)
+                if bytes is None:
+                    logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
+                    continue
+                quality = results['quality']
+                percent_black = quality.percent_black
+                cloudcover = results['cloudcover']
+                if dayRange != -1 and percent_black < no_data_limit:
+                    found_timestamps.add(found_timestamp)
+                elif dayRange == -1:
+                    found_timestamps.add(found_timestamp)
+                output = f'tile_image_{observation.id}.png'
+                downloaded_count += 1
+                fields = {
+                    'cloudcover': cloudcover,
+                    'percent_black': percent_black,
+                    'uri_locations': results['uris'],
+                    'image_bbox': Polygon.from_bbox(max_bbox),
+                    'image_dimensions': [quality.width, quality.height],
+                }
+                if existing is not None:
+                    # the previous image is removed once the new one is saved
+                    site_images.update(existing, output, bytes, **fields)
+                else:
+                    site_images.create(
+                        output,
+                        bytes,
+                        observation=observation,
+                        timestamp=observation.timestamp,
+                        **fields,
+                    )
+
+        # Now we need to go through and find all other images
+        # that exist in the start/end range of the siteEval
+        timestamp, timebuffer = get_site_capture_window(baseSiteEval, overrideDates)
+
+        # Now we get a list of all the timestamps and captures that fall in this range.
+        if matchConstellation == '':
+            matchConstellation = Constellation.objects.filter(
+                slug=baseConstellation
+            ).first()
+            logger.info(
+                f'Utilizing Constellation: {matchConstellation} - {matchConstellation.slug}'
             )
-            if results is None:
-                logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
-                continue
-            bytes = results['bytes']
-            found_timestamp = results['timestamp'].replace(microsecond=0)
-            if bytes is None:
-                logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
-                continue
-            percent_black = get_percent_black_pixels(bytes)
-            cloudcover = results['cloudcover']
-            if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[found_timestamp] = True
-            elif dayRange == -1:
-                found_timestamps[found_timestamp] = True
-            output = f'tile_image_{observation.id}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            with ignore_pillow_filesize_limits():
-                imageObj = Image.open(io.BytesIO(bytes))
-            if image is None:  # No null/None images should be set
-                continue
-            downloaded_count += 1
-            if found.exists():
-                existing = found.first()
-                existing.image.delete()  # remove previous image if new one found
-                existing.cloudcover = cloudcover
-                existing.image = image
-                existing.percent_black = percent_black
-                existing.uri_locations = results['uris']
-                existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
-                existing.save()
-            else:
-                SiteImage.objects.create(
-                    site=observation.siteeval,
-                    observation=observation,
-                    timestamp=observation.timestamp,
-                    image=image,
-                    uri_locations=results['uris'],
-                    cloudcover=cloudcover,
-                    source=baseConstellation,
-                    percent_black=percent_black,
-                    image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
-                )
 
-    # Now we need to go through and find all other images
-    # that exist in the start/end range of the siteEval
-    if overrideDates and len(overrideDates) == 2:
-        min_time = datetime.strptime(overrideDates[0], '%Y-%m-%d')
-        max_time = datetime.strptime(overrideDates[1], '%Y-%m-%d')
-        timebuffer = (max_time - min_time) / 2
-        timestamp = min_time + timebuffer
-    else:
-        timebuffer = (
-            (max_time + timedelta(days=30)) - (min_time - timedelta(days=30))
-        ) / 2
-        timestamp = (min_time - timedelta(days=30)) + timebuffer
-
-    # Now we get a list of all the timestamps and captures that fall in this range.
-    if matchConstellation == '':
-        matchConstellation = Constellation.objects.filter(
-            slug=baseConstellation
-        ).first()
-        logger.info(
-            f'Utilizing Constellation: {matchConstellation} - {matchConstellation.slug}'
+        # Only the dates that weren't fetched before with the same parameters
+        # are searched, unless downloading is forced
+        fetching = SatelliteFetching.objects.filter(site_id=site_eval_id).first()
+        watermark = fetching.watermarks.get(baseConstellation) if fetching else None
+        fetch_params = {
+            'scale': scale,
+            'dayRange': dayRange,
+            'no_data_limit': no_data_limit,
+            'worldview_source': worldview_source,
+            'maxDimension': maxDimension,
+        }
+        range_start, range_end = timestamp - timebuffer, timestamp + timebuffer
+        windows = [(range_start, range_end)]
+        if not force:
+            windows = get_uncovered_windows(
+                watermark,
+                max_bbox,
+                range_start,
+                range_end,
+                fetch_params,
+                overlap=settings.SATELLITE_FETCH_WATERMARK_OVERLAP,
+            )
+            # Previously fetched images count as found for the dayRange checks
+            for site_image in site_images.images():
+                if dayRange == -1 or (
+                    site_image.percent_black is not None
+                    and site_image.percent_black < no_data_limit
+                ):
+                    found_timestamps.add(site_image.timestamp.replace(microsecond=0))
+        logger.info(f'Searching uncovered date ranges: {windows}')
+
+        planned_items = get_planned_items(
+            capture_plan_id, site_eval_id, baseConstellation
         )
-
-    captures = get_range_captures(
-        max_bbox,
-        timestamp,
-        matchConstellation.slug,
-        timebuffer,
-        worldview_source,
-    )
-    self.update_state(
-        state='PROGRESS',
-        meta={
-            'current': 0,
-            'total': 0,
-            'mode': 'Searching All Images',
-            'source': baseConstellation,
-            'siteEvalId': site_eval_id,
-        },
-    )
-    if (
-        baseSiteEval is None
-    ):  # We need to grab the siteEvaluation directly for a reference
-        baseSiteEval = SiteEvaluation.objects.filter(pk=site_eval_id).first()
-    count = 1
-    num_of_captures = len(captures)
-    logger.info(f'Found {num_of_captures} captures')
-    if num_of_captures == 0:
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': count,
-                'total': num_of_captures,
-                'mode': f'Found {num_of_captures} Additional Captures',
-                'source': baseConstellation,
-                'siteEvalId': site_eval_id,
-            },
+        if planned_items is not None:
+            captures = [
+                capture
+                for capture in get_captures_from_items(
+                    planned_items, matchConstellation.slug, worldview_source
+                )
+                if in_windows(capture.timestamp, windows)
+            ]
+        else:
+            captures = []
+            for window_start, window_end in windows:
+                window_buffer = (window_end - window_start) / 2
+                captures.extend(
+                    get_range_captures(
+                        max_bbox,
+                        window_start + window_buffer,
+                        matchConstellation.slug,
+                        window_buffer,
+                        worldview_source,
+                    )
+                )
+        # Captures that are already known to be skipped are never downloaded
+        captures = found_timestamps.thin_captures(
+            captures,
+            (
+                dayRange
+                if baseConstellation in ('S2', 'L8', 'PL') and dayRange > -1
+                else None
+            ),
         )
-
-    logger.info(f'Found {num_of_captures} captures')
-    # Now we go through the list and add in a timestamp if it doesn't exist
-    for capture in captures:
-        self.update_state(
+        progress.update(
             state='PROGRESS',
             meta={
-                'current': count,
-                'total': num_of_captures,
-                'mode': 'Additional Image Captures Downloading',
+                'current': 0,
+                'total': 0,
+                'mode': 'Searching All Images',
                 'source': baseConstellation,
                 'siteEvalId': site_eval_id,
             },
         )
-        capture_timestamp = capture.timestamp.replace(microsecond=0)
         if (
-            baseConstellation in ('S2', 'L8', 'PL')
-            and dayRange > -1
-            and is_inside_range(found_timestamps.keys(), capture_timestamp, dayRange)
-        ):
-            count += 1
-            continue
+            baseSiteEval is None
+        ):  # We need to grab the siteEvaluation directly for a reference
+            baseSiteEval = SiteEvaluation.objects.filter(pk=site_eval_id).first()
+        count = 1
+        num_of_captures = len(captures)
+        logger.info(f'Found {num_of_captures} captures')
+        if num_of_captures == 0:
+            progress.update(
+                state='PROGRESS',
+                meta={
+                    'current': count,
+                    'total': num_of_captures,
+                    'mode': f'Found {num_of_captures} Additional Captures',
+                    'source': baseConstellation,
+                    'siteEvalId': site_eval_id,
+                },
+            )
 
-        if capture_timestamp not in found_timestamps.keys():
-            # we need to add a new image into the structure
-            bytes = None
-            if baseConstellation == 'WV' and worldview_source == 'cog':
-                bytes = get_worldview_processed_visual_bbox(
-                    capture, max_bbox, 'PNG', scale
-                )
-            elif baseConstellation == 'WV' and worldview_source == 'nitf':
-                bytes = get_worldview_nitf_bbox(capture, max_bbox, 'PNG', scale)
-            else:
-                with capture.open_reader() as reader:
-                    bytes = get_raster_bbox_from_reader(reader, max_bbox, 'PNG', scale)
-            if bytes is None:
+        logger.info(f'Found {num_of_captures} captures')
+
+        def should_fetch(capture) -> bool:
+            capture_timestamp = capture.timestamp.replace(microsecond=0)
+            if (
+                baseConstellation in ('S2', 'L8', 'PL')
+                and dayRange > -1
+                and found_timestamps.is_inside_range(capture_timestamp, dayRange)
+            ):
+                return False
+            return capture_timestamp not in found_timestamps
+
+        # Captures are read concurrently but handed back in order, so the
+        # found_timestamps/dayRange checks below behave exactly as a serial fetch.
+        fetched_images = fetch_capture_images(
+            captures,
+            max_bbox,
+            baseConstellation,
+            worldview_source,
+            scale,
+            max_workers=settings.SATELLITE_FETCH_POOL_SIZE.get(baseConstellation, 1),
+            should_fetch=should_fetch,
+            max_size=maxDimension,
+            windows=get_planned_windows(
+                capture_plan_id, site_eval_id, baseConstellation
+            ),
+        )
+        # Now we go through the list and add in a timestamp if it doesn't exist
+        for capture, img in fetched_images:
+            progress.update(
+                state='PROGRESS',
+                meta={
+                    'current': count,
+                    'total': num_of_captures,
+                    'mode': 'Additional Image Captures Downloading',
+                    'source': baseConstellation,
+                    'siteEvalId': site_eval_id,
+                },
+            )
+            capture_timestamp = capture.timestamp.replace(microsecond=0)
+            if (
+                baseConstellation in ('S2', 'L8', 'PL')
+                and dayRange > -1
+                and found_timestamps.is_inside_range(capture_timestamp, dayRange)
+            ):
                 count += 1
-                logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
-            percent_black = get_percent_black_pixels(bytes)
-            cloudcover = capture.cloudcover
-            count += 1
-            output = f'tile_image_{baseSiteEval.pk}_nonobs_{uuid4()}.png'
-            image = File(io.BytesIO(bytes), name=output)
-            with ignore_pillow_filesize_limits():
-                imageObj = Image.open(io.BytesIO(bytes))
-            if image is None:  # No null/None images should be set
+
+            if capture_timestamp not in found_timestamps:
+                # we need to add a new image into the structure
+                if img is None:
+                    count += 1
+                    logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
+                    continue
+                quality = get_image_quality(img)
+                bytes = img.render(img_format='PNG')
+                percent_black = quality.percent_black
+                cloudcover = capture.cloudcover
                 count += 1
-                continue
-            found = SiteImage.objects.filter(
-                site=baseSiteEval,
-                timestamp=capture_timestamp,
-                source=baseConstellation,
-            )
-            if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[capture_timestamp] = True
-            elif dayRange == -1:
-                found_timestamps[capture_timestamp] = True
-            downloaded_count += 1
-            if found.exists():
-                existing = found.first()
-                existing.image.delete()
-                existing.cloudcover = cloudcover
-                existing.image = image
-                existing.uri_locations = capture.uris
-                existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
-                existing.save()
+                output = f'tile_image_{baseSiteEval.pk}_nonobs_{uuid4()}.png'
+                existing = site_images.find(capture_timestamp)
+                if dayRange != -1 and percent_black < no_data_limit:
+                    found_timestamps.add(capture_timestamp)
+                elif dayRange == -1:
+                    found_timestamps.add(capture_timestamp)
+                downloaded_count += 1
+                fields = {
+                    'cloudcover': cloudcover,
+                    'percent_black': percent_black,
+                    'uri_locations': capture.uris,
+                    'image_bbox': Polygon.from_bbox(max_bbox),
+                    'image_dimensions': [quality.width, quality.height],
+                }
+                if existing is not None:
+                    site_images.update(existing, output, bytes, **fields)
+                else:
+                    site_images.create(
+                        output, bytes, timestamp=capture_timestamp, **fields
+                    )
             else:
-                SiteImage.objects.create(
-                    site=baseSiteEval,
-                    timestamp=capture_timestamp,
-                    uri_locations=capture.uris,
-                    image=image,
-                    cloudcover=cloudcover,
-                    percent_black=percent_black,
-                    source=baseConstellation,
-                    image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
-                )
-        else:
-            logger.info('Skipping timestamp because image already found')
-            count += 1
+                logger.info('Skipping timestamp because image already found')
+                count += 1
+
+    if fetching is not None:
+        fetching.watermarks[baseConstellation] = make_watermark(
+            watermark if not force else None,
+            max_bbox,
+            range_start,
+            range_end,
+            fetch_params,
+        )
+        # The fetching row may have been removed while the task was running
+        SatelliteFetching.objects.filter(pk=fetching.pk).update(
+            watermarks=fetching.watermarks
+        )
     return downloaded_count
 
 
@@ -572,7 +703,9 @@ def collect_garbage_task() -> None:
             model_runs_to_delete.values_list('pk', flat=True).iterator(),
             1_000,
         ):
-            ModelRun.objects.filter(pk__in=model_runs).delete()
+            model_run_ids = list(model_runs)
+            ModelRun.objects.filter(pk__in=model_run_ids).delete()
+            clear_vector_tile_generations(model_run_ids)
 
     # Delete all S3 Export Files that are over an hour old
     AnnotationExport.objects.filter(
@@ -677,8 +810,9 @@ def cancel_generate_images_task(model_run_id: UUID4) -> None:
                     fetching_task.save()
 
 
-@shared_task
+@shared_task(bind=True)
 def generate_site_images(
+    self,
     site_id: UUID4,
     constellation=['WV'],  # noqa
     force=False,  # forced downloading found_timestamps again
@@ -689,6 +823,8 @@ def generate_site_images(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    capture_plan_id: str | None = None,
+    maxDimension: int | None = None,
 ):
     siteeval = SiteEvaluation.objects.get(pk=site_id)
     with transaction.atomic():
@@ -714,17 +850,22 @@ def generate_site_images(
                 timestamp=datetime.now(),
                 status=SatelliteFetching.Status.RUNNING,
             )
-        task_id = get_siteobservation_images_task.delay(
-            site_id,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
-            pointArea,
-            worldview_source,
+        task_id = get_siteobservation_images_task.apply_async(
+            (
+                site_id,
+                constellation,
+                force,
+                dayRange,
+                noData,
+                overrideDates,
+                scale,
+                bboxScale,
+                pointArea,
+                worldview_source,
+                capture_plan_id,
+                maxDimension,
+            ),
+            **get_delivery_options(self),
         )
         fetching_task.celery_id = task_id.id
         fetching_task.save()
@@ -742,22 +883,136 @@ def generate_site_images_for_evaluation_run(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    maxDimension: int | None = None,
 ):
     sites = SiteEvaluation.objects.filter(configuration=model_run_id)
-    for eval in sites.iterator():
-        generate_site_images.delay(
-            eval.pk,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
-            pointArea,
+
+    # Search once for the whole model run and hand each site its share of the
+    # results, instead of having every site run its own STAC searches.
+    capture_plan_id = uuid4().hex
+    windows = get_model_run_capture_windows(
+        model_run_id, constellation, overrideDates, bboxScale, pointArea
+    )
+    for base_constellation, site_windows in windows.items():
+        plan_captures(
+            capture_plan_id,
+            base_constellation,
+            site_windows,
             worldview_source,
+            maxDimension,
         )
 
+    total = sites.count()
+    for index, eval in enumerate(sites.iterator()):
+        generate_site_images.apply_async(
+            (
+                eval.pk,
+                constellation,
+                force,
+                dayRange,
+                noData,
+                overrideDates,
+                scale,
+                bboxScale,
+                pointArea,
+                worldview_source,
+                capture_plan_id,
+                maxDimension,
+            ),
+            **get_bulk_fetch_options(index, total),
+        )
+
+
+@shared_task
+def precompute_asset_statistics(
+    model_run_id: UUID4,
+    constellation=['S2', 'L8', 'PL'],  # noqa
+    overrideDates: None | list[datetime, datetime] = None,
+    bboxScale: float = BboxScaleDefault,
+    pointArea: float = pointAreaDefault,
+) -> int:
+    """
+    Compute the statistics used for 'bits' rescaling for every capture that
+    may be fetched for a model run, ahead of fetching the images.
+
+    WorldView captures are rescaled without asset statistics and are skipped.
+    """
+    windows = get_model_run_capture_windows(
+        model_run_id, constellation, overrideDates, bboxScale, pointArea
+    )
+    computed = 0
+    for base_constellation, site_windows in windows.items():
+        if base_constellation == 'WV' or not site_windows:
+            continue
+        items = search_windows(base_constellation, site_windows, None)
+        captures = get_captures_from_items(items, base_constellation, None)
+        seen: set[tuple[str, ...]] = set()
+        for capture in captures:
+            uris = tuple(capture.uris)
+            if uris in seen:
+                continue
+            seen.add(uris)
+            try:
+                with capture.open_reader() as reader:
+                    get_reader_statistics(reader)
+            except Exception as e:
+                logger.warning(f'Failed to compute statistics for {uris}: {e}')
+                continue
+            computed += 1
+    logger.info(f'Computed statistics for {computed} captures of {model_run_id}')
+    return computed
+
+
+@shared_task
+def harvest_capture_catalog(
+    region_id: int,
+    start: datetime,
+    end: datetime,
+    constellation=['S2', 'L8', 'WV'],  # noqa
+) -> int:
+    """
+    Harvest the STAC items over a region from `start` to `end` into the local
+    capture catalog, so that searches within that window are resolved from
+    the database instead of the STAC catalogs.
+    """
+    region = Region.objects.get(pk=region_id)
+    if region.geom is None:
+        logger.warning(f'Region {region} has no geometry to harvest captures for')
+        return 0
+    bbox = region.geom.transform(4326, clone=True).extent
+
+    stored = 0
+    for source in constellation:
+        if source == 'WV':
+            collections = WORLDVIEW_COLLECTIONS + WORLDVIEW_NITF_COLLECTIONS
+            if not settings.SMART_STAC_URL or not collections:
+                continue
+            stored += harvest_stac_items(
+                settings.SMART_STAC_URL,
+                collections,
+                bbox,
+                start,
+                end,
+                method='GET',
+                headers={'x-api-key': settings.SMART_STAC_KEY},
+            )
+        elif source in STAC_URLS:
+            stored += harvest_stac_items(
+                STAC_URLS[source],
+                COLLECTIONS_BY_SOURCE[source],
+                bbox,
+                start,
+                end,
+                method='POST',
+            )
+    logger.info(f'Harvested {stored} captures for region {region}')
+    return stored
+
+
+@shared_task
+def build_vector_tile_archive_task(model_run_id: UUID4) -> None:
+    build_vector_tile_archive(model_run_id)
+
 
 @shared_task
 def generate_image_embedding(id: int):
@@ -981,6 +1236,9 @@ def process_model_run_upload(model_run_upload: ModelRunUpload):
             SiteEvaluation.bulk_create_from_region_model(region_model, model_run)
 
         model_run.compute_aggregate_stats()
+        transaction.on_commit(
+            lambda: build_vector_tile_archive_task.delay(model_run.pk)
+        )
 
 
 @shared_task(bind=True)
@@ -27,6 +27,7 @@ from rdwatch.core.models import (
     SiteEvaluation,
     SiteImage,
 )
+from rdwatch.core.utils.task_progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -318,6 +319,7 @@ class GenerateAnimationSchema(BaseModel):
 
 @shared_task
 def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
+    progress = ProgressReporter(self)
     settingsSchema = GenerateAnimationSchema(**settings)
     output_format = settingsSchema.output_format
     fps = settingsSchema.fps
@@ -457,7 +459,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
             # Convert grayscale to RGB
             img = img.convert('RGB')
 
-        self.update_state(
+        progress.update(
             state='PROGRESS',
             meta={
                 'current': count,
@@ -666,7 +668,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
     prefix = f'{site_evaluation.configuration.title.strip()}_{site_evaluation.configuration.region.name}_{str(site_evaluation.number).zfill(4)}'  # noqa: E501
     if frames:
         # Create a temporary directory
-        self.update_state(
+        progress.update(
             state='Progress',
             meta={
                 'current': count,
@@ -723,7 +725,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
 
                 video_writer.release()  # Close the video writer
         name = f'{prefix}.{output_format}'
-        self.update_state(
+        progress.update(
             state='SUCCESS',
             meta={
                 'current': count,
@@ -778,6 +780,7 @@ def create_modelrun_animation_export(
     self, modelrun_id: UUID4, settings: dict[str, Any], userId: int
 ):
     task_id = self.request.id
+    progress = ProgressReporter(self)
     model_run = ModelRun.objects.get(pk=modelrun_id)
     user = User.objects.get(pk=userId)
     modelrun_export, created = AnimationModelRunExport.objects.get_or_create(
@@ -806,7 +809,7 @@ def create_modelrun_animation_export(
     while not result.ready():
         completed_count = result.completed_count()
         # Update the main task state with the overall progress
-        self.update_state(
+        progress.update(
             state=states.STARTED,
             meta={
                 'mode': 'Processing Site Animations',
@@ -818,7 +821,7 @@ def create_modelrun_animation_export(
         # Optionally, sleep for a while to avoid too frequent updates
         time.sleep(5)
     task_ids = [res.id for res in result.results]
-    self.update_state(
+    progress.update(
         state=states.STARTED,
         meta={
             'mode': 'Generating Zip file',
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rdwatch.core.models import CaptureHarvest
+from rdwatch.core.utils.capture_catalog import (
+    record_harvest,
+    search_catalog,
+    store_items,
+)
+from rdwatch.core.utils.stac_cache import cached_stac_search, harvest_stac_items
+
+URL = 'https://stac.example.com/'
+
+
+def make_item(item_id: str, timestamp: str, bbox: list[float]) -> dict:
+    return {
+        'type': 'Feature',
+        'id': item_id,
+        'collection': 'sentinel-2-l2a',
+        'bbox': bbox,
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [
+                [
+                    [bbox[0], bbox[1]],
+                    [bbox[2], bbox[1]],
+                    [bbox[2], bbox[3]],
+                    [bbox[0], bbox[3]],
+                    [bbox[0], bbox[1]],
+                ]
+            ],
+        },
+        'properties': {'datetime': timestamp},
+        'assets': {},
+    }
+
+
+@pytest.mark.django_db
+def test_capture_catalog_search(mocker) -> None:
+    inside = make_item('inside', '2023-03-01T10:00:00Z', [10.0, 10.0, 11.0, 11.0])
+    outside = make_item('outside', '2023-03-01T10:00:00Z', [20.0, 20.0, 21.0, 21.0])
+    late = make_item('late', '2023-09-01T10:00:00Z', [10.0, 10.0, 11.0, 11.0])
+    assert store_items(URL, [inside, outside, late, inside]) == 3
+
+    window = '2023-02-01T00:00:00Z/2023-04-01T00:00:00Z'
+    bbox = [10.2, 10.2, 10.4, 10.4]
+
+    # Not harvested yet
+    assert search_catalog(URL, ['sentinel-2-l2a'], bbox, window) is None
+
+    record_harvest(
+        URL,
+        ['sentinel-2-l2a'],
+        [9.0, 9.0, 12.0, 12.0],
+        datetime(2023, 1, 1),
+        datetime(2023, 12, 31),
+    )
+    assert search_catalog(URL, ['sentinel-2-l2a'], bbox, window) == [inside]
+
+    # Every collection has to be harvested
+    assert (
+        search_catalog(URL, ['sentinel-2-l2a', 'sentinel-2-c1-l2a'], bbox, window)
+        is None
+    )
+    # So does the whole search area and window
+    assert (
+        search_catalog(URL, ['sentinel-2-l2a'], [8.0, 8.0, 10.4, 10.4], window) is None
+    )
+    assert (
+        search_catalog(
+            URL, ['sentinel-2-l2a'], bbox, '2022-12-01T00:00:00Z/2023-04-01T00:00:00Z'
+        )
+        is None
+    )
+
+    live_search = mocker.patch('rdwatch.core.utils.stac_cache.stac_item_search')
+    assert cached_stac_search(URL, ['sentinel-2-l2a'], bbox, window) == [inside]
+    live_search.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_capture_catalog_combines_harvests() -> None:
+    inside = make_item('inside', '2023-06-01T10:00:00Z', [10.0, 10.0, 11.0, 11.0])
+    store_items(URL, [inside])
+    # A search spanning two consecutive harvest runs and two adjacent areas
+    window = '2023-05-01T00:00:00Z/2023-07-01T00:00:00Z'
+    bbox = [10.2, 10.2, 10.8, 10.4]
+
+    for west, east in ((9.0, 10.5), (10.5, 12.0)):
+        record_harvest(
+            URL,
+            ['sentinel-2-l2a'],
+            [west, 9.0, east, 12.0],
+            datetime(2023, 1, 1),
+            datetime(2023, 12, 31),
+        )
+    assert search_catalog(URL, ['sentinel-2-l2a'], bbox, window) == [inside]
+
+    record_harvest(
+        URL,
+        ['sentinel-2-c1-l2a'],
+        [9.0, 9.0, 12.0, 12.0],
+        datetime(2023, 1, 1),
+        datetime(2023, 6, 1),
+    )
+    # Part of the window is missing
+    assert (
+        search_catalog(URL, ['sentinel-2-l2a', 'sentinel-2-c1-l2a'], bbox, window)
+        is None
+    )
+    record_harvest(
+        URL,
+        ['sentinel-2-c1-l2a'],
+        [9.0, 9.0, 12.0, 12.0],
+        datetime(2023, 6, 1),
+        datetime(2023, 12, 31),
+    )
+    assert search_catalog(
+        URL, ['sentinel-2-l2a', 'sentinel-2-c1-l2a'], bbox, window
+    ) == [inside]
+
+
+@pytest.mark.django_db
+def test_harvest_leaves_recent_captures_unharvested(mocker, settings) -> None:
+    settings.CAPTURE_CATALOG_PUBLICATION_LATENCY = timedelta(days=30)
+    mocker.patch('rdwatch.core.utils.stac_cache.stac_item_search', return_value=[])
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    harvest_stac_items(
+        URL, ['sentinel-2-l2a'], [9.0, 9.0, 12.0, 12.0], now - timedelta(days=90), now
+    )
+    harvest = CaptureHarvest.objects.get()
+    assert harvest.end <= now - timedelta(days=30)
+
+    # Nothing is recorded when the whole window is recent
+    harvest_stac_items(
+        URL, ['sentinel-2-l2a'], [9.0, 9.0, 12.0, 12.0], now - timedelta(days=10), now
+    )
+    assert CaptureHarvest.objects.count() == 1
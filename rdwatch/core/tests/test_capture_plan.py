@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from rdwatch.core.utils.capture_plan import (
+    SiteCaptureWindow,
+    join_items_to_sites,
+    plan_shared_windows,
+)
+
+START, END = datetime(2023, 1, 1), datetime(2023, 12, 31)
+
+
+def make_window(bbox: list[float]) -> SiteCaptureWindow:
+    return SiteCaptureWindow(bbox=bbox, start=START, end=END)
+
+
+def test_join_items_to_sites_footprint() -> None:
+    # A rotated scene whose bbox covers both sites, but whose footprint only
+    # covers the lower left one
+    item = {
+        'id': 'rotated',
+        'bbox': [0.0, 0.0, 1.0, 1.0],
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[0.0, 0.0], [0.6, 0.0], [0.0, 0.6], [0.0, 0.0]]],
+        },
+        'properties': {'datetime': '2023-03-01T10:00:00Z'},
+    }
+    windows = [
+        make_window([0.1, 0.1, 0.2, 0.2]),
+        make_window([0.8, 0.8, 0.9, 0.9]),
+        # Outside of the time range
+        SiteCaptureWindow(
+            bbox=[0.1, 0.1, 0.2, 0.2], start=START, end=datetime(2023, 2, 1)
+        ),
+    ]
+    assert join_items_to_sites([item], windows) == [[0], [], []]
+
+
+def test_plan_shared_windows_max_size(settings) -> None:
+    settings.SHARED_WINDOW_MAX_SIZE = 0.05
+    items = [{'id': 'item'}]
+    windows = [
+        make_window([10.0, 10.0, 10.01, 10.01]),
+        make_window([10.02, 10.02, 10.04, 10.04]),
+        # Too far to share a window
+        make_window([11.0, 11.0, 11.01, 11.01]),
+    ]
+
+    site_windows = plan_shared_windows(items, windows, [[0], [0], [0]], max_size=100)
+    assert site_windows[2] == {}
+    # Both sites read the same window at the same size, which is detailed
+    # enough for the smaller site
+    assert site_windows[0]['item'] == site_windows[1]['item']
+    assert site_windows[0]['item']['bbox'] == [10.0, 10.0, 10.04, 10.04]
+    assert site_windows[0]['item']['max_size'] == 400
+
+    site_windows = plan_shared_windows(items, windows, [[0], [0], [0]])
+    assert site_windows[0]['item']['max_size'] is None
@@ -0,0 +1,424 @@
+"""
+Offline benchmark of the satellite image fetch pipeline.
+
+Synthetic COGs are written to a temporary directory and STAC searches are
+answered with fake items pointing at them, so `get_siteobservations_images`
+runs end to end without network access. Every stage is timed, inclusive of
+the stages it calls, along with the peak memory traced by `tracemalloc`
+(GDAL's own allocations aren't traced). The benchmark fails if a stage is
+slower than its threshold.
+
+The report is logged, and recorded as properties of the test for the JUnit
+XML report. Run only the benchmarks with
+`pytest -m benchmark --log-cli-level=INFO` to see it.
+"""
+
+from __future__ import annotations
+
+import functools
+import importlib
+import logging
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+import rasterio
+from pystac import Item
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+from rio_tiler.models import ImageData
+
+from rdwatch.core.models import ModelRun, SiteEvaluation, SiteImage
+from rdwatch.core.schemas import SiteModel
+from rdwatch.core.tasks import (
+    get_site_bbox,
+    get_siteobservation_images_task,
+    get_siteobservations_images,
+)
+from rdwatch.core.utils.site_image_writer import SiteImageWriter
+
+logger = logging.getLogger(__name__)
+
+# Number of captures found for the site per constellation
+CAPTURE_COUNT = 8
+# Size of the synthetic S2 and WV multispectral COGs, the WV panchromatic
+# COG is PAN_FACTOR times larger
+COG_SIZE = 512
+PAN_FACTOR = 4
+
+# Upper bounds of the total seconds spent in each stage for one site. These
+# are generous, so only significant regressions fail the benchmark.
+STAGE_THRESHOLDS = {
+    'S2': {
+        'total': 30.0,
+        'capture discovery': 2.0,
+        'chip read': 20.0,
+        'asset statistics': 10.0,
+        'rescale': 2.0,
+        'quality metrics': 2.0,
+        'png encode': 5.0,
+        'db persistence': 10.0,
+    },
+    'WV': {
+        'total': 60.0,
+        'capture discovery': 2.0,
+        'chip read': 45.0,
+        'pansharpen': 15.0,
+        'rescale': 5.0,
+        'quality metrics': 5.0,
+        'png encode': 15.0,
+        'db persistence': 10.0,
+    },
+}
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    peak_bytes: int = 0
+
+
+class StageRecorder:
+    """
+    Record the time and peak traced memory of each pipeline stage.
+
+    Stages nest: the peak of a stage includes the peaks of the stages it
+    calls. Stages must run on a single thread for their memory to be
+    attributed correctly.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageStats] = defaultdict(StageStats)
+        self._stack: list[list[int]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _traced() -> tuple[int, int]:
+        return tracemalloc.get_traced_memory()
+
+    def _enter(self) -> list[int]:
+        current, peak = self._traced()
+        if self._stack:
+            # Keep the parent's peak before resetting it for this stage
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, 0]
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, stage: str, frame: list[int], seconds: float) -> None:
+        peak = max(self._traced()[1], frame[1])
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        stats = self.stages[stage]
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.peak_bytes = max(stats.peak_bytes, peak - frame[0])
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                return func(*args, **kwargs)
+            with self._lock:
+                frame = self._enter()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._exit(stage, frame, time.perf_counter() - start)
+
+        return wrapper
+
+    def report(self) -> str:
+        lines = [f'{"stage":<20}{"calls":>8}{"seconds":>12}{"peak MiB":>12}']
+        for stage, stats in sorted(
+            self.stages.items(), key=lambda item: -item[1].seconds
+        ):
+            lines.append(
+                f'{stage:<20}{stats.calls:>8}{stats.seconds:>12.3f}'
+                f'{stats.peak_bytes / 2**20:>12.1f}'
+            )
+        return '\n'.join(lines)
+
+
+def write_cog(
+    path: Path,
+    bbox: tuple[float, float, float, float],
+    size: int,
+    count: int,
+    seed: int,
+) -> str:
+    """Write a tiled uint16 GeoTIFF with overviews covering `bbox`."""
+    rng = np.random.default_rng(seed)
+    # Smooth noise compresses and rescales like real imagery does
+    coarse = rng.integers(200, 2000, (count, size // 16, size // 16), dtype=np.uint16)
+    data = np.kron(coarse, np.ones((16, 16), dtype=np.uint16))
+    data += rng.integers(0, 50, data.shape, dtype=np.uint16)
+    with rasterio.open(
+        path,
+        'w',
+        driver='GTiff',
+        width=size,
+        height=size,
+        count=count,
+        dtype='uint16',
+        crs='EPSG:4326',
+        transform=from_bounds(*bbox, size, size),
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress='deflate',
+    ) as dataset:
+        dataset.write(data)
+        dataset.build_overviews([2, 4], Resampling.average)
+    return str(path)
+
+
+def _polygon(bbox: tuple[float, float, float, float]) -> dict[str, Any]:
+    minx, miny, maxx, maxy = bbox
+    return {
+        'type': 'Polygon',
+        'coordinates': [
+            [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny]]
+        ],
+    }
+
+
+def _in_range(
+    timestamp: datetime, center: datetime, timebuffer: timedelta | None
+) -> bool:
+    return abs(timestamp - center) <= (timebuffer or timedelta(hours=1))
+
+
+def capture_timestamps(site_evaluation: SiteEvaluation) -> Iterator[datetime]:
+    # One capture per observation, the rest spread over the site's dates
+    for observation in site_evaluation.observations.all():
+        if observation.timestamp is not None:
+            yield observation.timestamp
+    start = site_evaluation.start_date or datetime(2020, 1, 1)
+    for i in range(CAPTURE_COUNT):
+        yield start + timedelta(days=30 * i)
+
+
+def fake_s2_search(tmp_path: Path, bbox, timestamps: list[datetime]) -> Callable:
+    items = []
+    for i, timestamp in enumerate(timestamps):
+        href = write_cog(tmp_path / f's2_{i}.tif', bbox, COG_SIZE, 3, seed=i)
+        items.append(
+            {
+                'type': 'Feature',
+                'stac_version': '1.0.0',
+                'id': f'S2_BENCHMARK_{i}',
+                'collection': 'sentinel-2-l2a',
+                'geometry': _polygon(bbox),
+                'bbox': list(bbox),
+                'properties': {
+                    'datetime': f'{timestamp.isoformat()}Z',
+                    'eo:cloud_cover': 5,
+                },
+                'assets': {
+                    'visual': {
+                        'href': href,
+                        'type': 'image/tiff; application=geotiff',
+                        'roles': ['visual'],
+                        'eo:bands': [
+                            {'name': name, 'common_name': name}
+                            for name in ('red', 'green', 'blue')
+                        ],
+                    }
+                },
+                'links': [],
+            }
+        )
+
+    def stac_search(source, timestamp, bbox, timebuffer=None) -> list[Item]:
+        return [
+            Item.from_dict(item)
+            for item in items
+            if _in_range(
+                datetime.fromisoformat(item['properties']['datetime'].rstrip('Z')),
+                timestamp,
+                timebuffer,
+            )
+        ]
+
+    return stac_search
+
+
+def fake_worldview_search(tmp_path: Path, bbox, timestamps: list[datetime]) -> Callable:
+    features = []
+    for i, timestamp in enumerate(timestamps):
+        properties = {
+            'datetime': f'{timestamp.isoformat()}Z',
+            'eo:cloud_cover': 5,
+            'nitf:bits_per_pixel': 11,
+        }
+        visual = write_cog(tmp_path / f'wv_{i}.tif', bbox, COG_SIZE, 3, seed=i)
+        pan = write_cog(
+            tmp_path / f'wv_{i}_pan.tif', bbox, COG_SIZE * PAN_FACTOR, 1, seed=i
+        )
+        features.append(
+            {
+                'id': f'WV_BENCHMARK_{i}',
+                'collection': 'ta1-wv-acc-3',
+                'bbox': list(bbox),
+                'properties': {**properties, 'nitf:image_representation': 'MULTI'},
+                'assets': {'visual': {'href': visual}},
+            }
+        )
+        features.append(
+            {
+                'id': f'WV_BENCHMARK_{i}_PAN',
+                'collection': 'ta1-wv-acc-3',
+                'bbox': list(bbox),
+                'properties': {**properties, 'nitf:image_representation': 'MONO'},
+                'assets': {'B01': {'href': pan}},
+            }
+        )
+
+    def worldview_search(timestamp, bbox, timebuffer=None) -> dict[str, Any]:
+        return {
+            'type': 'FeatureCollection',
+            'features': [
+                feature
+                for feature in features
+                if _in_range(
+                    datetime.fromisoformat(
+                        feature['properties']['datetime'].rstrip('Z')
+                    ),
+                    timestamp,
+                    timebuffer,
+                )
+            ],
+        }
+
+    return worldview_search
+
+
+@pytest.fixture
+def benchmark_site(
+    site_model_json: dict[str, Any], model_run: ModelRun
+) -> SiteEvaluation:
+    return SiteEvaluation.bulk_create_from_site_model(
+        SiteModel(**site_model_json), model_run
+    )
+
+
+@pytest.fixture
+def tracing() -> Iterator[None]:
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('constellation', ['S2', 'WV'])
+def test_fetch_pipeline_benchmark(
+    constellation: str,
+    benchmark_site: SiteEvaluation,
+    tmp_path: Path,
+    mocker,
+    settings,
+    tracing,
+    record_property,
+) -> None:
+    # Reads run one at a time so memory can be attributed to stages
+    settings.SATELLITE_FETCH_POOL_SIZE = {}
+
+    site_bbox = get_site_bbox(benchmark_site, constellation)
+    # Cover more than the site, like a real scene does
+    pad_x = (site_bbox[2] - site_bbox[0]) * 0.1
+    pad_y = (site_bbox[3] - site_bbox[1]) * 0.1
+    cog_bbox = (
+        site_bbox[0] - pad_x,
+        site_bbox[1] - pad_y,
+        site_bbox[2] + pad_x,
+        site_bbox[3] + pad_y,
+    )
+    timestamps = list(capture_timestamps(benchmark_site))
+    if constellation == 'WV':
+        mocker.patch(
+            'rdwatch.core.utils.worldview_processed.satellite_captures.worldview_search',
+            fake_worldview_search(tmp_path, cog_bbox, timestamps),
+        )
+    else:
+        mocker.patch(
+            'rdwatch.core.utils.satellite_bands.stac_search',
+            fake_s2_search(tmp_path, cog_bbox, timestamps),
+        )
+
+    recorder = StageRecorder()
+    stage_targets = {
+        'capture discovery': [
+            'rdwatch.core.tasks.get_range_captures',
+            'rdwatch.core.utils.images.get_range_captures',
+        ],
+        'chip read': ['rdwatch.core.utils.images.fetch_capture_image'],
+        'asset statistics': [
+            'rdwatch.core.utils.raster_tile.get_rescale_range_from_reader'
+        ],
+        'pansharpen': ['rdwatch.core.utils.worldview_processed.raster_tile.pansharpen'],
+        'quality metrics': [
+            'rdwatch.core.tasks.get_image_quality',
+            'rdwatch.core.utils.images.get_image_quality',
+        ],
+    }
+    for stage, targets in stage_targets.items():
+        for target in targets:
+            module_name, name = target.rsplit('.', 1)
+            module = importlib.import_module(module_name)
+            mocker.patch.object(
+                module, name, recorder.wrap(stage, getattr(module, name))
+            )
+    mocker.patch.object(
+        ImageData, 'rescale', recorder.wrap('rescale', ImageData.rescale)
+    )
+    mocker.patch.object(
+        ImageData, 'render', recorder.wrap('png encode', ImageData.render)
+    )
+    mocker.patch.object(
+        SiteImageWriter, 'flush', recorder.wrap('db persistence', SiteImageWriter.flush)
+    )
+
+    run = recorder.wrap('total', get_siteobservations_images)
+    downloaded = run(
+        get_siteobservation_images_task,
+        site_eval_id=benchmark_site.pk,
+        baseConstellation=constellation,
+        dayRange=14,
+        no_data_limit=50,
+        worldview_source='cog',
+    )
+
+    report = recorder.report()
+    logger.info(f'{constellation} fetch pipeline\n{report}')
+    for stage, stats in recorder.stages.items():
+        record_property(f'{constellation} {stage} seconds', round(stats.seconds, 3))
+        record_property(f'{constellation} {stage} peak bytes', stats.peak_bytes)
+
+    assert downloaded > 0
+    assert (
+        SiteImage.objects.filter(site=benchmark_site, source=constellation).count()
+        == downloaded
+    )
+    slow = {
+        stage: recorder.stages[stage].seconds
+        for stage, threshold in STAGE_THRESHOLDS[constellation].items()
+        if recorder.stages[stage].seconds > threshold
+    }
+    assert not slow, f'Stages slower than their thresholds: {slow}\n{report}'
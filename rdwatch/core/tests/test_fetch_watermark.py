@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from rdwatch.core.utils.fetch_watermark import get_uncovered_windows, make_watermark
+
+BBOX = [-80.0, 30.0, -79.9, 30.1]
+PARAMS = {'scale': 'bits', 'dayRange': 14}
+
+
+def test_uncovered_windows_without_watermark() -> None:
+    start, end = datetime(2020, 1, 1), datetime(2021, 1, 1)
+    assert get_uncovered_windows(None, BBOX, start, end, PARAMS) == [(start, end)]
+
+
+def test_uncovered_windows_extend_covered_range() -> None:
+    watermark = make_watermark(
+        None, BBOX, datetime(2020, 1, 1), datetime(2021, 1, 1), PARAMS
+    )
+
+    # Fully covered
+    assert (
+        get_uncovered_windows(
+            watermark, BBOX, datetime(2020, 2, 1), datetime(2020, 12, 1), PARAMS
+        )
+        == []
+    )
+    # Only the newer part needs to be fetched, with some overlap
+    assert get_uncovered_windows(
+        watermark,
+        BBOX,
+        datetime(2020, 1, 1),
+        datetime(2021, 3, 1),
+        PARAMS,
+        overlap=timedelta(days=1),
+    ) == [(datetime(2020, 12, 31), datetime(2021, 3, 1))]
+    # Different parameters invalidate the watermark
+    assert get_uncovered_windows(
+        watermark,
+        BBOX,
+        datetime(2020, 2, 1),
+        datetime(2020, 12, 1),
+        {**PARAMS, 'dayRange': 7},
+    ) == [(datetime(2020, 2, 1), datetime(2020, 12, 1))]
+
+
+def test_make_watermark_merges_ranges() -> None:
+    watermark = make_watermark(
+        None, BBOX, datetime(2020, 1, 1), datetime(2021, 1, 1), PARAMS
+    )
+    watermark = make_watermark(
+        watermark, BBOX, datetime(2020, 12, 1), datetime(2021, 3, 1), PARAMS
+    )
+    assert watermark['ranges'] == [
+        [datetime(2020, 1, 1).isoformat(), datetime(2021, 3, 1).isoformat()]
+    ]
+
+
+def test_make_watermark_keeps_disjoint_ranges() -> None:
+    watermark = make_watermark(
+        None, BBOX, datetime(2020, 1, 1), datetime(2020, 3, 1), PARAMS
+    )
+    watermark = make_watermark(
+        watermark, BBOX, datetime(2020, 6, 1), datetime(2020, 9, 1), PARAMS
+    )
+    # The earlier range is still covered
+    assert get_uncovered_windows(
+        watermark, BBOX, datetime(2020, 1, 1), datetime(2020, 12, 1), PARAMS
+    ) == [
+        (datetime(2020, 3, 1), datetime(2020, 6, 1)),
+        (datetime(2020, 9, 1), datetime(2020, 12, 1)),
+    ]
+
+    # Filling the gap merges all ranges
+    watermark = make_watermark(
+        watermark, BBOX, datetime(2020, 2, 1), datetime(2020, 7, 1), PARAMS
+    )
+    assert watermark['ranges'] == [
+        [datetime(2020, 1, 1).isoformat(), datetime(2020, 9, 1).isoformat()]
+    ]
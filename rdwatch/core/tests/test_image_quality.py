@@ -0,0 +1,27 @@
+import numpy as np
+from rio_tiler.models import ImageData
+
+from rdwatch.core.utils.image_quality import get_image_quality
+
+
+def test_image_quality_nodata_and_mask() -> None:
+    data = np.full((3, 10, 20), 128, dtype=np.uint8)
+    mask = np.zeros(data.shape, dtype=bool)
+    # First two rows are masked out, the next two rows are black
+    mask[:, :2, :] = True
+    data[:, 2:4, :] = 0
+    quality = get_image_quality(ImageData(np.ma.MaskedArray(data, mask=mask)))
+
+    assert (quality.width, quality.height) == (20, 10)
+    assert quality.percent_black == 40.0
+    assert quality.mask_coverage == 80.0
+
+
+def test_image_quality_fully_masked() -> None:
+    data = np.zeros((1, 4, 4), dtype=np.uint16)
+    quality = get_image_quality(
+        ImageData(np.ma.MaskedArray(data, mask=np.ones(data.shape, dtype=bool)))
+    )
+
+    assert quality.percent_black == 100.0
+    assert quality.mask_coverage == 0.0
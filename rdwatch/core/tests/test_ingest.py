@@ -22,6 +22,35 @@ def test_site_model_ingest(
     assert res.json() == str(SiteEvaluation.objects.first().id), res.json()
 
 
+@pytest.mark.django_db(databases=['default'])
+def test_site_model_ingest_derived_fields(
+    site_model_json: dict[str, Any],
+    test_client: TestClient,
+    model_run: ModelRun,
+) -> None:
+    """Test that the fields derived for vector tiles are set on ingest."""
+    test_client.post(
+        f'/model-runs/{model_run.id}/site-model/',
+        json=site_model_json,
+    )
+
+    site_evaluation = SiteEvaluation.objects.get()
+    assert site_evaluation.label_slug == site_evaluation.label.slug
+
+    observations = list(site_evaluation.observations.order_by('timestamp'))
+    assert observations
+    for observation in observations:
+        assert observation.label_slug == observation.label.slug
+        if observation.geom:
+            assert observation.area > 0
+        later = [
+            other.timestamp
+            for other in observations
+            if other.timestamp and other.timestamp > observation.timestamp
+        ]
+        assert observation.next_timestamp == (min(later) if later else None)
+
+
 @pytest.mark.django_db(databases=['default'])
 def test_site_model_ingest_missing_scores(
     site_model_json: dict[str, Any],
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_bounds
+from rio_tiler.io.rasterio import Reader
+
+from rdwatch.core.utils.metatile import Metatile, read_metatile, split_metatile
+
+
+@pytest.fixture
+def cog_path(tmp_path):
+    path = tmp_path / 'metatile.tif'
+    # A 3857 raster around tile (12, 1201, 1535)
+    bounds = (-8296780.798, 5009377.085, -8277212.918, 5028944.964)
+    data = np.random.default_rng(0).integers(1, 255, (3, 512, 512), dtype='uint8')
+    with rasterio.open(
+        path,
+        'w',
+        driver='GTiff',
+        width=512,
+        height=512,
+        count=3,
+        dtype='uint8',
+        crs='EPSG:3857',
+        transform=from_bounds(*bounds, 512, 512),
+        nodata=0,
+    ) as dataset:
+        dataset.write(data)
+    return path
+
+
+def test_metatile_matches_tiles(cog_path) -> None:
+    with Reader(str(cog_path)) as reader:
+        tile = reader.tms.tile(-74.4, 40.99, 12)
+        metatile = Metatile(12, tile.x - tile.x % 2, tile.y - tile.y % 2, 2)
+        tiles = split_metatile(read_metatile(reader, metatile, 256), metatile, 256)
+
+        assert tiles.keys() == set(metatile.tiles())
+        for z, x, y in metatile.tiles():
+            if not reader.tile_exists(x, y, z):
+                continue
+            expected = reader.tile(x, y, z)
+            np.testing.assert_array_equal(tiles[(z, x, y)].array, expected.array)
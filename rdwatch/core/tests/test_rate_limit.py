@@ -0,0 +1,87 @@
+from urllib.error import HTTPError
+from uuid import uuid4
+
+import pytest
+
+from rdwatch.core.utils.rate_limit import _acquire_host, _token_bucket, retry_throttled
+from rdwatch.core.utils.redis_client import get_redis_client, make_key
+
+
+def http_error(code: int) -> HTTPError:
+    return HTTPError('https://example.com/', code, 'Error', {}, None)
+
+
+def test_token_bucket() -> None:
+    key = make_key(f'rate-limit|test-{uuid4()}')
+
+    def take() -> float:
+        # One token per second, up to two at once
+        return float(_token_bucket()(keys=[key], args=[1.0, 2]))
+
+    # A full bucket allows a burst, then has to wait for a refill
+    assert take() == 0
+    assert take() == 0
+    wait = take()
+    assert 0 < wait <= 1
+
+    # Tokens are refilled for the time since the bucket was last used
+    redis = get_redis_client()
+    updated = float(redis.hget(key, 'updated'))
+    redis.hset(key, mapping={'tokens': 0, 'updated': updated - 5})
+    assert take() == 0
+    assert take() == 0
+    assert take() > 0
+
+    redis.delete(key)
+
+
+def test_acquire_waits_for_token(mocker, settings) -> None:
+    settings.RATE_LIMITS = {'example.com': (2.0, 1)}
+    bucket = mocker.Mock(side_effect=['0.5', '0'])
+    mocker.patch('rdwatch.core.utils.rate_limit._token_bucket', return_value=bucket)
+    mocker.patch('rdwatch.core.utils.rate_limit.random.uniform', return_value=0.0)
+    sleep = mocker.patch('rdwatch.core.utils.rate_limit.time.sleep')
+
+    _acquire_host('example.com')
+    sleep.assert_called_once_with(0.5)
+    assert bucket.call_args.kwargs['args'] == [2.0, 1]
+
+
+@pytest.mark.parametrize('code', [429, 503])
+def test_retry_throttled(code, mocker) -> None:
+    sleep = mocker.patch('rdwatch.core.utils.rate_limit.time.sleep')
+    func = mocker.Mock(side_effect=[http_error(code), http_error(code), 'ok'])
+
+    assert retry_throttled(func) == 'ok'
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+
+
+@pytest.mark.parametrize('error', [http_error(404), http_error(500), ValueError()])
+def test_retry_throttled_other_errors(error, mocker) -> None:
+    sleep = mocker.patch('rdwatch.core.utils.rate_limit.time.sleep')
+    func = mocker.Mock(side_effect=error)
+
+    with pytest.raises(type(error)):
+        retry_throttled(func)
+    func.assert_called_once()
+    sleep.assert_not_called()
+
+
+def test_retry_throttled_backoff(mocker, settings) -> None:
+    settings.RATE_LIMIT_MAX_RETRIES = 5
+    settings.RATE_LIMIT_BACKOFF_BASE = 1.0
+    settings.RATE_LIMIT_BACKOFF_MAX = 4.0
+    # Always wait for the longest jittered delay
+    mocker.patch(
+        'rdwatch.core.utils.rate_limit.random.uniform', side_effect=lambda a, b: b
+    )
+    sleep = mocker.patch('rdwatch.core.utils.rate_limit.time.sleep')
+    func = mocker.Mock(side_effect=http_error(429))
+
+    # Gives up after the last retry
+    with pytest.raises(HTTPError):
+        retry_throttled(func)
+    assert func.call_count == 6
+    # Doubles up to the cap
+    assert [call.args[0] for call in sleep.call_args_list] == [1, 2, 4, 4, 4]
@@ -0,0 +1,29 @@
+from rdwatch.core.utils.reader_pool import ReaderPool
+
+
+def test_reader_pool_eviction(mocker) -> None:
+    mocker.patch('rdwatch.core.utils.reader_pool.rasterio')
+    mocker.patch(
+        'rdwatch.core.utils.reader_pool.Reader',
+        side_effect=lambda input: mocker.Mock(input=input),
+    )
+    monotonic = mocker.patch(
+        'rdwatch.core.utils.reader_pool.time.monotonic', return_value=0.0
+    )
+    pool = ReaderPool(max_open=1, idle_timeout=60)
+
+    with pool.reader('a.tif') as first:
+        pass
+    with pool.reader('a.tif') as reader:
+        assert reader is first
+
+    # Only one idle reader is kept
+    with pool.reader('b.tif') as second:
+        pass
+    first.close.assert_called_once()
+
+    # An expired reader is closed on checkout instead of being reused
+    monotonic.return_value = 61.0
+    with pool.reader('b.tif') as reader:
+        assert reader is not second
+    second.close.assert_called_once()
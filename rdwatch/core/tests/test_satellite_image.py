@@ -0,0 +1,62 @@
+from datetime import datetime
+from uuid import uuid4
+
+from django.core.files.storage import default_storage
+
+from rdwatch.core.utils.metatile import get_metatile
+from rdwatch.core.utils.tile_cache import _tile_path, get_capture_id
+from rdwatch.core.utils.worldview_processed.satellite_captures import (
+    WorldViewProcessedCapture,
+)
+from rdwatch.core.views.satellite_image import (
+    get_tile_bbox,
+    get_tiles,
+    get_union_bbox,
+    pick_worldview_capture,
+)
+
+
+def make_capture(tile: tuple[int, int, int]) -> WorldViewProcessedCapture:
+    # Inside the tile, so it doesn't touch the neighbouring ones
+    west, south, east, north = get_tile_bbox(tile)
+    margin = (east - west) / 4
+    return WorldViewProcessedCapture(
+        uri=f's3://bucket/{uuid4()}.tif',
+        timestamp=datetime(2023, 3, 1),
+        bbox=(west + margin, south + margin, east - margin, north - margin),
+        panuri=None,
+        cloudcover=0,
+        collection='worldview',
+        bits_per_pixel=8,
+    )
+
+
+def test_get_tiles_searches_once(mocker) -> None:
+    timestamp = datetime(2023, 3, 1)
+    tiles = [(12, 100, 200), (12, 101, 200), (12, 400, 900)]
+    # The last tile has no capture
+    captures = [make_capture(tile) for tile in tiles[:2]]
+    search_captures = mocker.Mock(return_value=captures)
+    render = mocker.Mock(
+        side_effect=lambda capture, metatile: {
+            tile: capture.uri.encode() for tile in metatile.tiles()
+        }
+    )
+
+    found = get_tiles(
+        f'test-{uuid4()}',
+        timestamp,
+        tiles,
+        search_captures,
+        lambda candidates: pick_worldview_capture(timestamp, candidates),
+        render,
+    )
+    search_captures.assert_called_once_with(get_union_bbox(tiles))
+    # Each tile is rendered from the capture that intersects it
+    assert found.keys() == set(tiles[:2])
+    for capture, tile in zip(captures, tiles, strict=False):
+        assert found[tile].content == capture.uri.encode()
+
+    for capture, tile in zip(captures, tiles, strict=False):
+        for z, x, y in get_metatile(*tile).tiles():
+            default_storage.delete(_tile_path(get_capture_id(capture), z, x, y, 'WEBP'))
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from django.core.cache import cache
+
+from rdwatch.core.utils.stac_cache import (
+    _item_cache_key,
+    _search_cache_timeout,
+    cached_stac_search,
+)
+
+BBOX = [10.0, 10.0, 11.0, 11.0]
+WINDOW = '2023-02-01T00:00:00Z/2023-04-01T00:00:00Z'
+
+
+def make_item(item_id: str) -> dict:
+    return {'type': 'Feature', 'id': item_id, 'collection': 'sentinel-2-l2a'}
+
+
+@pytest.fixture
+def url() -> str:
+    # Nothing is cached or harvested for a new catalog
+    return f'https://{uuid4()}.example.com/'
+
+
+@pytest.mark.django_db
+def test_cached_stac_search_hit(url, mocker) -> None:
+    items = [make_item('a'), make_item('b')]
+    live_search = mocker.patch(
+        'rdwatch.core.utils.stac_cache.stac_item_search', return_value=items
+    )
+
+    assert cached_stac_search(url, ['sentinel-2-l2a'], BBOX, WINDOW) == items
+    assert cached_stac_search(url, ['sentinel-2-l2a'], BBOX, WINDOW) == items
+    live_search.assert_called_once()
+
+    # A search is only a hit while all of its items are still cached
+    cache.delete(_item_cache_key(url, items[1]))
+    assert cached_stac_search(url, ['sentinel-2-l2a'], BBOX, WINDOW) == items
+    assert live_search.call_count == 2
+
+
+@pytest.mark.django_db
+def test_cached_stac_search_eviction(url, mocker, settings) -> None:
+    settings.STAC_SEARCH_CACHE_MAX_ENTRIES = 2
+    live_search = mocker.patch(
+        'rdwatch.core.utils.stac_cache.stac_item_search',
+        return_value=[make_item('a')],
+    )
+    windows = [
+        f'2023-0{month}-01T00:00:00Z/2023-0{month}-28T00:00:00Z' for month in (1, 2, 3)
+    ]
+
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[0])
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[1])
+    # Using the first search makes the second one the least recently used
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[0])
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[2])
+    assert live_search.call_count == 3
+
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[0])
+    assert live_search.call_count == 3
+    cached_stac_search(url, ['sentinel-2-l2a'], BBOX, windows[1])
+    assert live_search.call_count == 4
+
+
+def test_recent_searches_are_cached_briefly(settings) -> None:
+    settings.CAPTURE_CATALOG_PUBLICATION_LATENCY = timedelta(days=30)
+    now = datetime.now(timezone.utc)
+
+    assert (
+        _search_cache_timeout(WINDOW)
+        == settings.STAC_SEARCH_CACHE_TIMEOUT.total_seconds()
+    )
+    recent = f'{(now - timedelta(days=60)).isoformat()}/{now.isoformat()}'
+    assert (
+        _search_cache_timeout(recent)
+        == settings.STAC_RECENT_SEARCH_CACHE_TIMEOUT.total_seconds()
+    )
+    # Open ranges reach up to now
+    assert (
+        _search_cache_timeout('2023-02-01T00:00:00Z/..')
+        == settings.STAC_RECENT_SEARCH_CACHE_TIMEOUT.total_seconds()
+    )
@@ -0,0 +1,56 @@
+from uuid import uuid4
+
+from redis.exceptions import LockNotOwnedError
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from rdwatch.core.utils.capture import URICapture
+from rdwatch.core.utils.metatile import get_metatile
+from rdwatch.core.utils.tile_cache import _tile_path, get_cached_tiles, get_capture_id
+
+
+def test_tile_cache_tiers(mocker) -> None:
+    capture_id = get_capture_id(URICapture(f's3://bucket/{uuid4()}.tif'))
+    render = mocker.Mock(
+        side_effect=lambda metatile: {tile: b'tile' for tile in metatile.tiles()}
+    )
+
+    tiles = get_cached_tiles(capture_id, [(10, 1, 2)], 'WEBP', render)
+    tile = tiles[(10, 1, 2)]
+    assert tile.content == b'tile'
+    assert render.call_count == 1
+
+    # Served from the hot tier
+    assert get_cached_tiles(capture_id, [(10, 1, 2)], 'WEBP', render) == tiles
+    assert render.call_count == 1
+
+    # Served from storage once the hot tier is gone
+    path = _tile_path(capture_id, 10, 1, 2, 'WEBP')
+    cache.delete(f'tile|{path}')
+    assert get_cached_tiles(capture_id, [(10, 1, 2)], 'WEBP', render) == tiles
+    assert render.call_count == 1
+
+    # The rest of the metatile was cached along with the tile
+    metatile = get_metatile(10, 1, 2)
+    assert get_cached_tiles(capture_id, metatile.tiles(), 'WEBP', render).keys() == set(
+        metatile.tiles()
+    )
+    assert render.call_count == 1
+
+    for z, x, y in metatile.tiles():
+        default_storage.delete(_tile_path(capture_id, z, x, y, 'WEBP'))
+
+
+def test_tile_cache_expired_lock(mocker) -> None:
+    capture_id = get_capture_id(URICapture(f's3://bucket/{uuid4()}.tif'))
+    metatile = get_metatile(10, 1, 2)
+    render = mocker.Mock(return_value={(10, 1, 2): b'tile'})
+    mocker.patch('redis.lock.Lock.release', side_effect=LockNotOwnedError)
+
+    # A render that outlasts the lock still returns its tiles
+    tiles = get_cached_tiles(capture_id, [(10, 1, 2)], 'WEBP', render)
+    assert tiles[(10, 1, 2)].content == b'tile'
+
+    for z, x, y in metatile.tiles():
+        default_storage.delete(_tile_path(capture_id, z, x, y, 'WEBP'))
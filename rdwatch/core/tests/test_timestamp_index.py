@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from rdwatch.core.utils.timestamp_index import TimestampIndex
+
+FOUND = [datetime(2020, 1, 10), datetime(2020, 3, 1, 12)]
+
+
+class FakeCapture:
+    def __init__(self, timestamp: datetime) -> None:
+        self.timestamp = timestamp
+
+
+@pytest.mark.parametrize(
+    'offset',
+    [
+        timedelta(days=-15),
+        timedelta(days=-14),
+        timedelta(days=-14, hours=-1),
+        timedelta(days=14, hours=23),
+        timedelta(days=15),
+        timedelta(hours=-1),
+        timedelta(0),
+    ],
+)
+def test_is_inside_range_matches_day_difference(offset: timedelta) -> None:
+    index = TimestampIndex(FOUND)
+    check = FOUND[0] + offset
+    expected = any(abs((check - found).days) <= 14 for found in FOUND)
+    assert index.is_inside_range(check, 14) == expected
+
+
+def test_add_and_contains() -> None:
+    index = TimestampIndex()
+    assert not index.is_inside_range(FOUND[0], 14)
+    for timestamp in FOUND + FOUND:
+        index.add(timestamp)
+    assert len(index) == 2
+    assert FOUND[1] in index
+    assert FOUND[1] + timedelta(seconds=1) not in index
+
+
+def test_thin_captures() -> None:
+    index = TimestampIndex(FOUND)
+    captures = [
+        FakeCapture(FOUND[0]),
+        FakeCapture(FOUND[0] + timedelta(days=3)),
+        FakeCapture(FOUND[0] + timedelta(days=100)),
+    ]
+    assert index.thin_captures(captures, None) == captures[1:]
+    assert index.thin_captures(captures, 14) == captures[2:]
@@ -1,11 +1,27 @@
+from datetime import datetime
 from uuid import uuid4
 
 import pytest
 from ninja.testing import TestClient
 
+from django.contrib.gis.geos import Point
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 
-from rdwatch.core.models import ModelRun
+from rdwatch.core.models import ModelRun, SiteEvaluation, VectorTileArchive, lookups
+from rdwatch.core.utils.vector_tile import (
+    EVALUATION_CLUSTER_AGGREGATES,
+    EVALUATION_CLUSTER_GROUP_BY,
+    VectorTileQuery,
+    evaluation_properties,
+    render_vector_tile,
+    tile_features,
+)
+from rdwatch.core.utils.vector_tile_archive import build_vector_tile_archive
+from rdwatch.core.utils.vector_tile_generation import (
+    bump_vector_tile_generation,
+    get_vector_tile_generation,
+)
 from rdwatch.core.views.vector_tile import _get_vector_tile_cache_key
 
 
@@ -13,16 +29,45 @@ from rdwatch.core.views.vector_tile import _get_vector_tile_cache_key
 def test_vector_tile_cache(test_client: TestClient, model_run: ModelRun) -> None:
     assert model_run.evaluations.count() == 0
 
-    cache_key = _get_vector_tile_cache_key(model_run.id, 0, 0, 0, model_run.created)
-
-    assert cache.get(cache_key) is None
+    assert get_vector_tile_generation(model_run.id) is None
 
     test_client.get(f'/model-runs/{model_run.id}/vector-tile/0/0/0.pbf/')
 
     # There should be a cache hit now that the endpoint has been hit
+    generation = get_vector_tile_generation(model_run.id)
+    assert generation is not None
+    cache_key = _get_vector_tile_cache_key(model_run.id, 0, 0, 0, generation)
     assert cache.get(cache_key) is not None
 
 
+@pytest.mark.django_db
+def test_vector_tile_cache_generation(
+    test_client: TestClient,
+    model_run: ModelRun,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+) -> None:
+    url = f'/model-runs/{model_run.id}/vector-tile/0/0/0.pbf/'
+    test_client.get(url)
+    generation = get_vector_tile_generation(model_run.id)
+
+    # A warm tile is served from the cache alone
+    with django_assert_num_queries(0):
+        test_client.get(url)
+
+    # Changes invalidate the cached tiles once they are committed
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_vector_tile_generation(model_run.id)
+        assert get_vector_tile_generation(model_run.id) == generation
+    assert get_vector_tile_generation(model_run.id) == generation + 1
+
+    test_client.get(url)
+    assert (
+        cache.get(_get_vector_tile_cache_key(model_run.id, 0, 0, 0, generation + 1))
+        is not None
+    )
+
+
 @pytest.mark.django_db
 def test_vector_tile_cache_nonexistant_model_run(test_client: TestClient) -> None:
     non_existant_model_run_id = uuid4()
@@ -32,3 +77,128 @@ def test_vector_tile_cache_nonexistant_model_run(test_client: TestClient) -> Non
     )
 
     assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_vector_tile_archive(
+    test_client: TestClient,
+    model_run: ModelRun,
+    settings,
+    mocker,
+    django_capture_on_commit_callbacks,
+) -> None:
+    settings.VECTOR_TILE_ARCHIVE_MAX_ZOOM = 2
+
+    archive = build_vector_tile_archive(model_run.id)
+    assert archive is not None
+    assert archive.max_zoom == 2
+
+    expected = render_vector_tile(model_run.id, 0, 0, 0)
+    render = mocker.patch(
+        'rdwatch.core.views.vector_tile.render_vector_tile', wraps=render_vector_tile
+    )
+
+    # Served from the archive
+    resp = test_client.get(f'/model-runs/{model_run.id}/vector-tile/0/0/0.pbf/')
+    assert resp.content == expected
+    render.assert_not_called()
+
+    # Rendered above the archive's zoom levels
+    test_client.get(f'/model-runs/{model_run.id}/vector-tile/3/0/0.pbf/')
+    render.assert_called_once()
+
+    # Not served anymore once the model run changes
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_vector_tile_generation(model_run.id)
+    test_client.get(f'/model-runs/{model_run.id}/vector-tile/0/0/0.pbf/')
+    assert render.call_count == 2
+
+    archive.delete()
+
+
+@pytest.mark.django_db
+def test_vector_tile_archive_rebuild(model_run: ModelRun, settings) -> None:
+    settings.VECTOR_TILE_ARCHIVE_MAX_ZOOM = 0
+
+    first = build_vector_tile_archive(model_run.id)
+    assert first is not None and first.archive
+    first_name = first.archive.name
+    archive = build_vector_tile_archive(model_run.id)
+    assert archive is not None
+    # The replaced archive is deleted
+    assert not default_storage.exists(first_name)
+    assert default_storage.exists(archive.archive.name)
+
+    # An archive built from an older state of the model run is discarded
+    VectorTileArchive.objects.filter(pk=archive.pk).update(
+        generation=archive.generation + 1
+    )
+    stale = build_vector_tile_archive(model_run.id)
+    assert stale is not None
+    assert stale.archive.name == archive.archive.name
+    _, files = default_storage.listdir(
+        f'{settings.VECTOR_TILE_ARCHIVE_PREFIX}/{model_run.pk}'
+    )
+    assert len(files) == 1
+
+    stale.delete()
+
+
+@pytest.mark.django_db
+def test_vector_tile_point_clusters(
+    model_run: ModelRun, region_polygon, settings
+) -> None:
+    center = Point(*region_polygon.centroid.coords, srid=4326).transform(
+        3857, clone=True
+    )
+    label = lookups.ObservationLabel.objects.first()
+    SiteEvaluation.objects.bulk_create(
+        SiteEvaluation(
+            configuration=model_run,
+            number=number,
+            point=Point(center.x + number, center.y + number, srid=3857),
+            label=label,
+            score=1.0,
+            modified_timestamp=datetime.now(),
+        )
+        for number in range(50)
+    )
+
+    settings.VECTOR_TILE_CLUSTER_MAX_ZOOM = -1
+    points = render_vector_tile(model_run.id, 0, 0, 0)
+
+    # Points within a cell are drawn as a single feature
+    settings.VECTOR_TILE_CLUSTER_MAX_ZOOM = 0
+    clustered = render_vector_tile(model_run.id, 0, 0, 0)
+
+    assert 0 < len(clustered) < len(points)
+
+
+@pytest.mark.django_db
+def test_vector_tile_query(model_run: ModelRun) -> None:
+    query = VectorTileQuery()
+    query.add_source(
+        'evaluations',
+        tile_features(
+            SiteEvaluation.objects.filter(configuration=model_run),
+            0,
+            0,
+            0,
+            point='point',
+            **evaluation_properties(),
+        ),
+    )
+    query.add_layer('sites', 'evaluations', 'polygon')
+    query.add_cluster_layer(
+        'sites_points',
+        'evaluations',
+        64,
+        EVALUATION_CLUSTER_GROUP_BY,
+        EVALUATION_CLUSTER_AGGREGATES,
+    )
+    sql, params = query.sql_with_params()
+
+    # Both layers are fed by a single scan of the table
+    assert sql.count('FROM "core_siteevaluation"') == 1
+    assert params[-3:] == ('sites', 'sites_points', 64)
+    assert query.render() == b''
@@ -13,6 +13,11 @@ urlpatterns = [
         views.satelliteimage_raster_tile,
         name='satellite-tiles',
     ),
+    path(
+        'satellite-image/tiles',
+        views.satelliteimage_raster_tiles,
+        name='satellite-tiles-batch',
+    ),
     path(
         'satellite-image/bbox',
         views.satelliteimage_raster_bbox,
@@ -29,4 +34,9 @@ urlpatterns = [
         views.satelliteimage_visual_tile,
         name='satellite-visual-tiles',
     ),
+    path(
+        'satellite-image/visual-tiles',
+        views.satelliteimage_visual_tiles,
+        name='satellite-visual-tiles-batch',
+    ),
 ]
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+from collections.abc import Callable
+
+from rio_tiler.io.rasterio import Reader
+from rio_tiler.io.stac import STACReader
+from rio_tiler.models import BandStatistics
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rdwatch.core.models import AssetStatistics
+
+logger = logging.getLogger(__name__)
+
+# Statistics kept for every band of an asset
+STATISTICS_FIELDS = ('min', 'max', 'percentile_2', 'percentile_98')
+
+
+def _statistics_cache_key(href: str) -> str:
+    return f'asset-statistics|{hashlib.sha256(href.encode()).hexdigest()}'
+
+
+def get_asset_statistics(
+    href: str, compute: Callable[[], dict[str, BandStatistics]]
+) -> dict[str, dict[str, float]]:
+    """
+    Get the per band statistics of the asset at `href`.
+
+    Statistics are computed with `compute` the first time an asset is seen,
+    then stored in the database and reused (through the cache) afterwards.
+    """
+    key = _statistics_cache_key(href)
+    statistics = cache.get(key)
+    if statistics is not None:
+        return statistics
+
+    statistics = (
+        AssetStatistics.objects.filter(href=href)
+        .values_list('statistics', flat=True)
+        .first()
+    )
+    if statistics is None:
+        logger.info(f'Computing statistics for {href}')
+        statistics = {
+            band: {field: float(stats[field]) for field in STATISTICS_FIELDS}
+            for band, stats in compute().items()
+        }
+        # Another worker may have stored the same asset in the meantime
+        AssetStatistics.objects.bulk_create(
+            [AssetStatistics(href=href, statistics=statistics)],
+            ignore_conflicts=True,
+        )
+    cache.set(key, statistics, settings.ASSET_STATISTICS_CACHE_TIMEOUT.total_seconds())
+    return statistics
+
+
+def get_reader_statistics(reader: Reader | STACReader) -> dict[str, dict[str, float]]:
+    """
+    Get the stored statistics for the asset a reader reads.
+
+    For a `STACReader` these are the statistics of its first included asset.
+    """
+    if isinstance(reader, STACReader):
+        if not reader.assets:
+            return {}
+        asset = reader.assets[0]
+        return get_asset_statistics(
+            reader.item.assets[asset].href,
+            lambda: reader.statistics(assets=[asset])[asset],
+        )
+    return get_asset_statistics(reader.input, reader.statistics)
@@ -9,6 +9,9 @@ from rio_tiler.io.base import BaseReader, MultiBaseReader
 from rio_tiler.io.rasterio import Reader
 from rio_tiler.io.stac import STACReader
 
+from rdwatch.core.utils.rate_limit import acquire
+from rdwatch.core.utils.reader_pool import pooled_reader
+
 
 class AbstractCapture(ABC):
     @abstractmethod
@@ -28,16 +31,12 @@ class URICapture(AbstractCapture):
     @contextmanager
     def open_reader(self) -> Generator[Reader, None, None]:
         uri = self.uri
-        with ExitStack() as cxt_stack:
-            cxt_stack.enter_context(
-                rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR')
-            )
-
-            if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
-                cxt_stack.enter_context(rasterio.Env(AWS_NO_SIGN_REQUEST='YES'))
-                uri = 's3://sentinel-cogs/' + uri[49:]
+        env_options = {'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR'}
+        if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
+            env_options['AWS_NO_SIGN_REQUEST'] = 'YES'
+            uri = 's3://sentinel-cogs/' + uri[49:]
 
-            cog = cxt_stack.enter_context(Reader(input=uri))
+        with pooled_reader(uri, **env_options) as cog:
             yield cog
 
     @property
@@ -53,6 +52,7 @@ class STACCapture(AbstractCapture):
 
     @contextmanager
     def open_reader(self) -> Generator[STACReader, None, None]:
+        acquire(*self.uris)
         with ExitStack() as cxt_stack:
             reader = cxt_stack.enter_context(
                 STACReader(None, item=self.stac_item, include_assets=self.stac_assets)
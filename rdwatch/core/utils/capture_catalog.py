@@ -0,0 +1,203 @@
+import json
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, MultiPolygon, Polygon
+
+from rdwatch.core.models import Capture, CaptureHarvest
+
+logger = logging.getLogger(__name__)
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """Convert `timestamp` to a naive UTC datetime, as they are stored."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _parse_time(value: str) -> datetime | None:
+    value = value.rstrip('Z')
+    if not value or value == '..':
+        return None
+    return naive_utc(datetime.fromisoformat(value))
+
+
+def parse_datetime_range(value: str) -> tuple[datetime, datetime] | None:
+    """
+    Parse the `datetime` parameter of a STAC search into a closed range.
+    Returns None for open ranges.
+    """
+    parts = value.split('/')
+    if len(parts) > 2:
+        return None
+    start = _parse_time(parts[0])
+    end = _parse_time(parts[-1])
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+def _bbox_polygon(bbox: Iterable[float]) -> Polygon:
+    polygon = Polygon.from_bbox(tuple(bbox))
+    polygon.srid = 4326
+    return polygon
+
+
+def _item_datetime(item: dict[str, Any]) -> datetime | None:
+    properties = item.get('properties', {})
+    value = properties.get('datetime') or properties.get('start_datetime')
+    return _parse_time(value) if value else None
+
+
+def item_footprint(item: dict[str, Any]) -> GEOSGeometry | None:
+    """Get the WGS-84 footprint of a STAC item, falling back to its bbox."""
+    try:
+        if item.get('geometry'):
+            return GEOSGeometry(json.dumps(item['geometry']), srid=4326)
+        if item.get('bbox'):
+            bbox = item['bbox']
+            # 3D bboxes are ordered (minx, miny, minz, maxx, maxy, maxz)
+            if len(bbox) == 6:
+                bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+            return _bbox_polygon(bbox)
+    except (GEOSException, ValueError) as e:
+        logger.warning(f"Invalid footprint for STAC item {item.get('id')}: {e}")
+    return None
+
+
+def _is_harvested(
+    harvests: list[tuple[Polygon, datetime, datetime]],
+    area: Polygon,
+    start: datetime,
+    end: datetime,
+) -> bool:
+    """
+    Whether the union of `harvests` covers `area` from `start` to `end`.
+
+    The time window is split wherever a harvest starts or ends, and in each
+    part the areas of the harvests spanning it have to cover `area`.
+    """
+    times = sorted(
+        {start, end}
+        | {
+            time
+            for _, harvest_start, harvest_end in harvests
+            for time in (harvest_start, harvest_end)
+            if start < time < end
+        }
+    )
+    for part_start, part_end in zip(times, times[1:] or times, strict=False):
+        areas = [
+            harvest_area
+            for harvest_area, harvest_start, harvest_end in harvests
+            if harvest_start <= part_start and harvest_end >= part_end
+        ]
+        if not areas or not MultiPolygon(*areas).unary_union.covers(area):
+            return False
+    return True
+
+
+def search_catalog(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    time_str: str,
+) -> list[dict[str, Any]] | None:
+    """
+    Search the local capture catalog, as the STAC catalog at `url` would be.
+
+    Returns None unless every one of `collections` has been harvested over
+    the search's area and time window, possibly by several harvests, in which
+    case the search has to go to the STAC catalog itself.
+    """
+    time_range = parse_datetime_range(time_str)
+    if not collections or time_range is None:
+        return None
+    start, end = time_range
+    area = _bbox_polygon(bbox)
+
+    harvests: dict[str, list[tuple[Polygon, datetime, datetime]]] = defaultdict(list)
+    for collection, harvest_area, harvest_start, harvest_end in (
+        CaptureHarvest.objects.filter(
+            catalog=url,
+            collection__in=collections,
+            area__intersects=area,
+            start__lte=end,
+            end__gte=start,
+        )
+        .order_by('start')
+        .values_list('collection', 'area', 'start', 'end')
+    ):
+        harvests[collection].append((harvest_area, harvest_start, harvest_end))
+    if not all(
+        _is_harvested(harvests[collection], area, start, end)
+        for collection in collections
+    ):
+        return None
+
+    return list(
+        Capture.objects.filter(
+            catalog=url,
+            collection__in=collections,
+            footprint__intersects=area,
+            datetime__gte=start,
+            datetime__lte=end,
+        )
+        .order_by('-datetime', 'item_id')
+        .values_list('item', flat=True)
+    )
+
+
+def store_items(url: str, items: list[dict[str, Any]]) -> int:
+    """Add STAC items found in the catalog at `url` to the local catalog."""
+    # A row can only be upserted once per statement
+    captures: dict[tuple[str, str], Capture] = {}
+    for item in items:
+        timestamp = _item_datetime(item)
+        footprint = item_footprint(item)
+        if timestamp is None or footprint is None or not item.get('collection'):
+            continue
+        captures[(item['collection'], item['id'])] = Capture(
+            catalog=url,
+            collection=item['collection'],
+            item_id=item['id'],
+            datetime=timestamp,
+            footprint=footprint,
+            item=item,
+        )
+    Capture.objects.bulk_create(
+        list(captures.values()),
+        batch_size=settings.CAPTURE_CATALOG_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['catalog', 'collection', 'item_id'],
+        update_fields=['datetime', 'footprint', 'item'],
+    )
+    return len(captures)
+
+
+def record_harvest(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    start: datetime,
+    end: datetime,
+) -> None:
+    """Record that `collections` were harvested for `bbox` from `start` to `end`."""
+    area = _bbox_polygon(bbox)
+    CaptureHarvest.objects.bulk_create(
+        [
+            CaptureHarvest(
+                catalog=url,
+                collection=collection,
+                area=area,
+                start=start,
+                end=end,
+            )
+            for collection in collections
+        ]
+    )
@@ -0,0 +1,270 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Literal
+from urllib.error import URLError
+
+import numpy as np
+from pystac_client.exceptions import APIError
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.contrib.gis.geos.prepared import PreparedGeometry
+from django.core.cache import cache
+
+from rdwatch.core.utils.capture_catalog import item_footprint, naive_utc
+from rdwatch.core.utils.images import get_max_bbox, search_range_items
+from rdwatch.core.utils.shared_window import (
+    SharedWindow,
+    cluster_bboxes,
+    get_window_max_size,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SiteCaptureWindow:
+    bbox: list[float]
+    start: datetime
+    end: datetime
+
+
+def _capture_plan_key(plan_id: str, site_id: str, constellation: str) -> str:
+    return f'capture-plan|{plan_id}|{site_id}|{constellation}'
+
+
+def _capture_plan_item_key(plan_id: str, constellation: str, index: int) -> str:
+    return f'capture-plan-item|{plan_id}|{constellation}|{index}'
+
+
+def _item_bbox(item: dict) -> list[float]:
+    bbox = item['bbox']
+    # 3D bboxes are ordered (minx, miny, minz, maxx, maxy, maxz)
+    if len(bbox) == 6:
+        return [bbox[0], bbox[1], bbox[3], bbox[4]]
+    return bbox
+
+
+def join_items_to_sites(
+    items: list[dict], windows: list[SiteCaptureWindow]
+) -> list[list[int]]:
+    """
+    Spatially and temporally join STAC items to site capture windows.
+
+    Returns, for each window, the indexes of the items whose footprint
+    intersects the window's bbox and whose datetime falls inside the window.
+    Item bboxes are only used to rule items out cheaply, since the footprints
+    of partial or rotated scenes cover much less than their bbox.
+    """
+    usable = [
+        index
+        for index, item in enumerate(items)
+        if item.get('bbox') and item.get('properties', {}).get('datetime')
+    ]
+    if not usable or not windows:
+        return [[] for _ in windows]
+
+    item_times = np.array(
+        [
+            naive_utc(datetime.fromisoformat(items[index]['properties']['datetime']))
+            for index in usable
+        ],
+        dtype='datetime64[us]',
+    )
+    # Items sorted by time, so each window's items are a contiguous slice
+    order = np.argsort(item_times, kind='stable')
+    item_times = item_times[order]
+    usable_indexes = np.array(usable)[order]
+    item_bboxes = np.array([_item_bbox(items[index]) for index in usable_indexes])
+
+    footprints: dict[int, PreparedGeometry | None] = {}
+
+    def intersects(index: int, bbox: list[float]) -> bool:
+        if index not in footprints:
+            footprint = item_footprint(items[index])
+            footprints[index] = footprint.prepared if footprint else None
+        footprint = footprints[index]
+        return footprint is not None and footprint.intersects(
+            Polygon.from_bbox(tuple(bbox))
+        )
+
+    joined = []
+    for window in windows:
+        start = np.datetime64(naive_utc(window.start), 'us')
+        end = np.datetime64(naive_utc(window.end), 'us')
+        first = np.searchsorted(item_times, start, side='left')
+        last = np.searchsorted(item_times, end, side='right')
+        bboxes = item_bboxes[first:last]
+        matches = (
+            (bboxes[:, 0] <= window.bbox[2])
+            & (bboxes[:, 2] >= window.bbox[0])
+            & (bboxes[:, 1] <= window.bbox[3])
+            & (bboxes[:, 3] >= window.bbox[1])
+        )
+        joined.append(
+            sorted(
+                index
+                for index in usable_indexes[first:last][matches].tolist()
+                if intersects(index, window.bbox)
+            )
+        )
+    return joined
+
+
+def search_windows(
+    constellation: str,
+    windows: dict[str, SiteCaptureWindow],
+    worldview_source: Literal['cog', 'nitf'] | None,
+) -> list[dict]:
+    """Run a single STAC search covering every site window."""
+    union_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+    for window in windows.values():
+        union_bbox = get_max_bbox(window.bbox, union_bbox)
+    start = min(window.start for window in windows.values())
+    end = max(window.end for window in windows.values())
+    timebuffer = (end - start) / 2
+    return search_range_items(
+        union_bbox, start + timebuffer, constellation, timebuffer, worldview_source
+    )
+
+
+def plan_captures(
+    plan_id: str,
+    constellation: str,
+    windows: dict[str, SiteCaptureWindow],
+    worldview_source: Literal['cog', 'nitf'] | None,
+    max_size: int | None = None,
+) -> bool:
+    """
+    Run a single STAC search covering every site window and store each site's
+    share of the results under `plan_id`. `max_size` is the longest side the
+    sites' chips are limited to.
+
+    Returns False if the search failed, in which case the sites should fall
+    back to searching on their own.
+    """
+    if not windows:
+        return False
+
+    try:
+        items = search_windows(constellation, windows, worldview_source)
+    except (URLError, APIError) as e:
+        logger.warning(f'Failed to plan {constellation} captures: {e}')
+        return False
+
+    logger.info(f'Planned {len(items)} {constellation} items for {len(windows)} sites')
+    site_ids = list(windows.keys())
+    joined = join_items_to_sites(items, [windows[site_id] for site_id in site_ids])
+    # WorldView captures are pansharpened from several assets and can't be
+    # cropped out of a shared window
+    shared_windows = (
+        plan_shared_windows(
+            items, [windows[site_id] for site_id in site_ids], joined, max_size
+        )
+        if constellation != 'WV'
+        else [{} for _ in site_ids]
+    )
+    # Items are stored once for the plan and shared by the sites that hit them
+    planned_items = {
+        _capture_plan_item_key(plan_id, constellation, index): items[index]
+        for indexes in joined
+        for index in indexes
+    }
+    cache.set_many(
+        {
+            **planned_items,
+            **{
+                _capture_plan_key(plan_id, str(site_id), constellation): {
+                    'items': [
+                        _capture_plan_item_key(plan_id, constellation, index)
+                        for index in indexes
+                    ],
+                    'windows': site_windows,
+                }
+                for site_id, indexes, site_windows in zip(
+                    site_ids, joined, shared_windows
+                )
+            },
+        },
+        settings.STAC_SEARCH_CACHE_TIMEOUT.total_seconds(),
+    )
+    return True
+
+
+def plan_shared_windows(
+    items: list[dict],
+    windows: list[SiteCaptureWindow],
+    joined: list[list[int]],
+    max_size: int | None = None,
+) -> list[dict[str, SharedWindow]]:
+    """
+    Group the sites that hit the same item into shared read windows.
+
+    Returns, for each site, a mapping of item id to the window the site's
+    chip should be cropped from. Sites that have no neighbours within
+    `SHARED_WINDOW_MAX_SIZE` read their chips directly and get no window.
+    Each window is read at a single size that suits all of its sites, so
+    they all share the same read.
+    """
+    sites_by_item: dict[int, list[int]] = defaultdict(list)
+    for site_index, indexes in enumerate(joined):
+        for item_index in indexes:
+            sites_by_item[item_index].append(site_index)
+
+    site_windows: list[dict[str, SharedWindow]] = [{} for _ in windows]
+    for item_index, site_indexes in sites_by_item.items():
+        if len(site_indexes) < 2:
+            continue
+        item_id = items[item_index]['id']
+        clusters = cluster_bboxes(
+            [windows[site_index].bbox for site_index in site_indexes],
+            settings.SHARED_WINDOW_MAX_SIZE,
+        )
+        for window, members in clusters:
+            if len(members) < 2:
+                continue
+            shared: SharedWindow = {
+                'bbox': window,
+                'max_size': get_window_max_size(
+                    window,
+                    [windows[site_indexes[member]].bbox for member in members],
+                    max_size,
+                ),
+            }
+            for member in members:
+                site_windows[site_indexes[member]][item_id] = shared
+    return site_windows
+
+
+def get_planned_items(
+    plan_id: str | None, site_id: str, constellation: str
+) -> list[dict] | None:
+    """
+    Get the STAC items planned for a site, or None if there is no usable plan.
+    """
+    if plan_id is None:
+        return None
+    plan = cache.get(_capture_plan_key(plan_id, str(site_id), constellation))
+    if plan is None:
+        return None
+    item_keys = plan['items']
+    items = cache.get_many(item_keys)
+    if len(items) != len(set(item_keys)):
+        return None
+    return [items[key] for key in item_keys]
+
+
+def get_planned_windows(
+    plan_id: str | None, site_id: str, constellation: str
+) -> dict[str, SharedWindow]:
+    """
+    Get the shared read windows planned for a site, keyed by STAC item id.
+    """
+    if plan_id is None:
+        return {}
+    plan = cache.get(_capture_plan_key(plan_id, str(site_id), constellation))
+    if plan is None:
+        return {}
+    return plan['windows']
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+# Digits bboxes are rounded to before being compared
+BBOX_PRECISION = 6
+
+
+def _normalize_bbox(bbox: list[float] | tuple[float, ...]) -> list[float]:
+    return [round(coord, BBOX_PRECISION) for coord in bbox]
+
+
+def _get_ranges(watermark: dict[str, Any]) -> list[tuple[datetime, datetime]]:
+    return [
+        (datetime.fromisoformat(start), datetime.fromisoformat(end))
+        for start, end in watermark['ranges']
+    ]
+
+
+def watermark_matches(
+    watermark: dict[str, Any] | None,
+    bbox: list[float],
+    params: dict[str, Any],
+    start: datetime,
+) -> bool:
+    """Whether a watermark was recorded for the same bbox and fetch parameters."""
+    if (
+        watermark is None
+        or watermark.get('bbox') != _normalize_bbox(bbox)
+        or watermark.get('params') != params
+        # Watermarks recorded before several ranges were kept are refetched
+        or not watermark.get('ranges')
+    ):
+        return False
+    # Naive and aware datetimes can't be compared
+    covered_start = datetime.fromisoformat(watermark['ranges'][0][0])
+    return (covered_start.tzinfo is None) == (start.tzinfo is None)
+
+
+def get_uncovered_windows(
+    watermark: dict[str, Any] | None,
+    bbox: list[float],
+    start: datetime,
+    end: datetime,
+    params: dict[str, Any],
+    overlap: timedelta | None = None,
+) -> list[tuple[datetime, datetime]]:
+    """
+    Get the parts of [start, end] that previous fetches did not cover.
+
+    Each covered range is shrunk by `overlap` on its newer end, so captures
+    that were published late are still picked up.
+    """
+    if not watermark_matches(watermark, bbox, params, start):
+        return [(start, end)]
+
+    windows = []
+    window_start = start
+    for covered_start, covered_end in _get_ranges(watermark):
+        covered_end -= overlap or timedelta(0)
+        if covered_end <= max(window_start, covered_start) or covered_start >= end:
+            continue
+        if window_start < covered_start:
+            windows.append((window_start, covered_start))
+        window_start = covered_end
+    if window_start < end:
+        windows.append((window_start, end))
+    return windows
+
+
+def in_windows(timestamp: datetime, windows: list[tuple[datetime, datetime]]) -> bool:
+    """Whether `timestamp` falls in any of `windows`."""
+    for start, end in windows:
+        if (timestamp.tzinfo is None) != (start.tzinfo is None):
+            # Windows built from plain dates are naive, capture times are not
+            timestamp = timestamp.replace(tzinfo=start.tzinfo)
+        if start <= timestamp <= end:
+            return True
+    return False
+
+
+def make_watermark(
+    previous: dict[str, Any] | None,
+    bbox: list[float],
+    start: datetime,
+    end: datetime,
+    params: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Record that [start, end] has been fetched for `bbox` and `params`.
+
+    The watermark keeps a sorted list of disjoint ranges: the new range is
+    added to the previous watermark's ranges when both were fetched with the
+    same bbox and parameters, merging any ranges that touch it. The end is
+    clamped to now, since later captures can't have been found yet.
+    """
+    end = min(end, datetime.now(end.tzinfo))
+    ranges = [(start, end)]
+    if watermark_matches(previous, bbox, params, start):
+        ranges.extend(_get_ranges(previous))
+    ranges.sort()
+
+    merged: list[tuple[datetime, datetime]] = []
+    for range_start, range_end in ranges:
+        if merged and range_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return {
+        'bbox': _normalize_bbox(bbox),
+        'params': params,
+        'ranges': [
+            [range_start.isoformat(), range_end.isoformat()]
+            for range_start, range_end in merged
+        ],
+    }
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+
+import numpy as np
+from rio_tiler.models import ImageData
+
+
+@dataclass(frozen=True)
+class ImageQuality:
+    width: int
+    height: int
+    # Percentage of pixels that are either masked or black in every band
+    percent_black: float
+    # Percentage of pixels that are valid according to the image's alpha/mask
+    mask_coverage: float
+
+
+def get_image_quality(img: ImageData) -> ImageQuality:
+    """
+    Compute quality metrics for an image before it is rendered.
+
+    The metrics are computed on the (already rescaled) masked array held by
+    the `ImageData`, so there is no need to encode and decode the image.
+    """
+    array = img.array
+    _, height, width = array.shape
+    num_pixels = width * height
+    if num_pixels == 0:
+        return ImageQuality(
+            width=width,
+            height=height,
+            percent_black=100.0,
+            mask_coverage=0.0,
+        )
+
+    data = array.data
+    # A pixel is valid if it is unmasked in at least one band
+    valid = np.logical_or.reduce(~np.ma.getmaskarray(array), axis=0)
+    black = np.logical_and.reduce(data == 0, axis=0)
+    num_valid = int(np.count_nonzero(valid))
+    num_nodata = int(np.count_nonzero(~valid | black))
+
+    return ImageQuality(
+        width=width,
+        height=height,
+        percent_black=(num_nodata / num_pixels) * 100,
+        mask_coverage=(num_valid / num_pixels) * 100,
+    )
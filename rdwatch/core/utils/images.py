@@ -1,26 +1,46 @@
-import io
 import logging
-from collections.abc import Generator
+from collections import deque
+from collections.abc import Callable, Generator, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Literal
 from urllib.error import URLError
 
 from PIL import Image
+from pystac import Item
+from rio_tiler.models import ImageData
 
-from rdwatch.core.utils.capture import AbstractCapture
-from rdwatch.core.utils.raster_tile import get_raster_bbox_from_reader
-from rdwatch.core.utils.satellite_bands import get_bands
-from rdwatch.core.utils.worldview_nitf.raster_tile import get_worldview_nitf_bbox
+from rdwatch.core.utils.capture import AbstractCapture, STACCapture
+from rdwatch.core.utils.image_quality import get_image_quality
+from rdwatch.core.utils.raster_tile import get_raster_bbox_image_from_reader
+from rdwatch.core.utils.rate_limit import retry_throttled
+from rdwatch.core.utils.satellite_bands import get_bands, get_bands_from_items
+from rdwatch.core.utils.shared_window import (
+    SharedWindow,
+    get_raster_bbox_image_from_window,
+)
+from rdwatch.core.utils.stac_search import stac_search
+from rdwatch.core.utils.worldview_nitf.raster_tile import get_worldview_nitf_bbox_image
 from rdwatch.core.utils.worldview_nitf.satellite_captures import (
     get_captures as get_worldview_nitf_captures,
 )
+from rdwatch.core.utils.worldview_nitf.satellite_captures import (
+    get_captures_from_features as get_worldview_nitf_captures_from_features,
+)
+from rdwatch.core.utils.worldview_nitf.stac_search import (
+    worldview_search as worldview_nitf_search,
+)
 from rdwatch.core.utils.worldview_processed.raster_tile import (
-    get_worldview_processed_visual_bbox,
+    get_worldview_processed_visual_bbox_image,
 )
 from rdwatch.core.utils.worldview_processed.satellite_captures import (
     get_captures as get_worldview_captures,
 )
+from rdwatch.core.utils.worldview_processed.satellite_captures import (
+    get_captures_from_features as get_worldview_captures_from_features,
+)
+from rdwatch.core.utils.worldview_processed.stac_search import worldview_search
 
 logger = logging.getLogger(__name__)
 
@@ -64,58 +84,83 @@ def get_max_bbox(
     return newbbox
 
 
-def get_percent_black_pixels(bytes: bytes):
-    with ignore_pillow_filesize_limits():
-        img = Image.open(io.BytesIO(bytes))
-
-    # determine the size of the image
-    width, height = img.size
-
-    # get the pixel data of the image
-    pixels = img.load()
-
-    # count the number of black pixels in the image
-    num_black_pixels = 0
-    for x in range(width):
-        for y in range(height):
-            if pixels[x, y] == (0, 0, 0):
-                num_black_pixels += 1
-
-    # calculate the percentage of black pixels in the image
-    percent_black_pixels = (num_black_pixels / (width * height)) * 100
-    return percent_black_pixels
-
-
 def get_range_captures(
     bbox: tuple[float, float, float, float],
     timestamp: datetime,
     constellation: str,
     timebuffer: timedelta,
     worldView: Literal['cog', 'nitf'] | None,
+    items: list[dict] | None = None,
 ) -> list[AbstractCapture]:
+    """
+    Get the captures within `timebuffer` of `timestamp` that overlap `bbox`.
+
+    If `items` is given, the captures are built from those (already searched
+    for) STAC items instead of running a new search.
+    """
+    if items is not None:
+        return get_captures_from_items(items, constellation, worldView)
+
     if constellation == 'WV' and worldView == 'cog':
         captures = get_worldview_captures(timestamp, bbox, timebuffer)
     elif constellation == 'WV' and worldView == 'nitf':
         captures = get_worldview_nitf_captures(timestamp, bbox, timebuffer)
     else:
         captures = list(get_bands(constellation, timestamp, bbox, timebuffer))
-
-        # Filter bands by requested processing level and spectrum
-        tempCaptures = []
-        for band in captures:
-            if band.level.slug == '2A' and band.spectrum.slug == 'visual':
-                tempCaptures.append(band)
-        captures = tempCaptures
+        captures = filter_visual_bands(captures)
 
     return captures
 
 
+def filter_visual_bands(captures: list[AbstractCapture]) -> list[AbstractCapture]:
+    # Filter bands by requested processing level and spectrum
+    tempCaptures = []
+    for band in captures:
+        if band.level.slug == '2A' and band.spectrum.slug == 'visual':
+            tempCaptures.append(band)
+    return tempCaptures
+
+
+def search_range_items(
+    bbox: tuple[float, float, float, float],
+    timestamp: datetime,
+    constellation: str,
+    timebuffer: timedelta,
+    worldView: Literal['cog', 'nitf'] | None,
+) -> list[dict]:
+    """Search for the raw STAC items that `get_range_captures` would use."""
+    if constellation == 'WV' and worldView == 'cog':
+        return worldview_search(timestamp, bbox, timebuffer)['features']
+    elif constellation == 'WV' and worldView == 'nitf':
+        return worldview_nitf_search(timestamp, bbox, timebuffer)['features']
+    return [
+        item.to_dict()
+        for item in stac_search(constellation, timestamp, bbox, timebuffer)
+    ]
+
+
+def get_captures_from_items(
+    items: list[dict],
+    constellation: str,
+    worldView: Literal['cog', 'nitf'] | None,
+) -> list[AbstractCapture]:
+    if constellation == 'WV' and worldView == 'cog':
+        return get_worldview_captures_from_features(items)
+    elif constellation == 'WV' and worldView == 'nitf':
+        return get_worldview_nitf_captures_from_features(items)
+    captures = list(
+        get_bands_from_items(constellation, [Item.from_dict(item) for item in items])
+    )
+    return filter_visual_bands(captures)
+
+
 def fetch_boundbox_image(
     bbox: tuple[float, float, float, float],
     timestamp: datetime,
     constellation: str,
     worldView: Literal['cog', 'nitf'] | None = None,
     scale: Literal['default', 'bits'] | list[int] = 'bits',
+    max_size: int | None = None,
 ):
     timebuffer = timedelta(days=1)
     try:
@@ -127,23 +172,134 @@ def fetch_boundbox_image(
             worldView,
         )
     except URLError as e:
-        logger.warning('Failed to get range capture because of URLError')
+        logger.warning('Failed to get range capture because of URLError after retries')
         logger.warning(e)
         return None
 
     if len(captures) == 0:
         return None
     closest_capture = min(captures, key=lambda band: abs(band.timestamp - timestamp))
-    if worldView == 'cog' and constellation == 'WV':
-        bytes = get_worldview_processed_visual_bbox(closest_capture, bbox, 'PNG', scale)
-    elif worldView == 'nitf' and constellation == 'WV':
-        bytes = get_worldview_nitf_bbox(closest_capture, bbox, 'PNG', scale)
-    else:
-        with closest_capture.open_reader() as reader:
-            bytes = get_raster_bbox_from_reader(reader, bbox, 'PNG', scale)
+    img = fetch_capture_image(
+        closest_capture, bbox, constellation, worldView, scale, max_size=max_size
+    )
+    if img is None:
+        return None
     return {
-        'bytes': bytes,
+        'bytes': img.render(img_format='PNG'),
+        'quality': get_image_quality(img),
         'cloudcover': closest_capture.cloudcover,
         'timestamp': closest_capture.timestamp,
         'uris': closest_capture.uris,
     }
+
+
+def fetch_capture_image(
+    capture: AbstractCapture,
+    bbox: tuple[float, float, float, float],
+    constellation: str,
+    worldView: Literal['cog', 'nitf'] | None = None,
+    scale: Literal['default', 'bits'] | list[int] = 'bits',
+    window: SharedWindow | None = None,
+    max_size: int | None = None,
+) -> ImageData | None:
+    """
+    Read and rescale the given bbox of a capture without rendering it.
+
+    If a `window` containing `bbox` is given, the bbox is cropped out of that
+    window, which is read once and shared with any other sites inside it.
+    If `max_size` is given, the longest side of the image is limited to it.
+    Reads that are throttled by the remote host are retried.
+    """
+
+    def read() -> ImageData | None:
+        if worldView == 'cog' and constellation == 'WV':
+            return get_worldview_processed_visual_bbox_image(
+                capture, bbox, scale, max_size
+            )
+        elif worldView == 'nitf' and constellation == 'WV':
+            return get_worldview_nitf_bbox_image(capture, bbox, scale, max_size)
+        if window is not None:
+            return get_raster_bbox_image_from_window(
+                capture, window, bbox, scale, max_size
+            )
+        with capture.open_reader() as reader:
+            return get_raster_bbox_image_from_reader(reader, bbox, scale, max_size)
+
+    return retry_throttled(read)
+
+
+def fetch_capture_images(
+    captures: Iterable[AbstractCapture],
+    bbox: tuple[float, float, float, float],
+    constellation: str,
+    worldView: Literal['cog', 'nitf'] | None = None,
+    scale: Literal['default', 'bits'] | list[int] = 'bits',
+    max_workers: int = 1,
+    should_fetch: Callable[[AbstractCapture], bool] = lambda capture: True,
+    windows: dict[str, SharedWindow] | None = None,
+    max_size: int | None = None,
+) -> Iterator[tuple[AbstractCapture, ImageData | None]]:
+    """
+    Read the given bbox from each capture using a bounded pool of threads.
+
+    Results are yielded in the same order as `captures`, so callers can apply
+    order-dependent rules (such as `dayRange` deduplication) deterministically.
+    At most `max_workers` reads are in flight at once. Captures for which
+    `should_fetch` returns False when they are scheduled are yielded with a
+    `None` image without being read.
+
+    `windows` maps STAC item ids to shared read windows, see `fetch_capture_image`.
+    """
+
+    def get_window(capture: AbstractCapture) -> SharedWindow | None:
+        if not windows or not isinstance(capture, STACCapture):
+            return None
+        return windows.get(capture.stac_item.id)
+
+    if max_workers <= 1:
+        for capture in captures:
+            if not should_fetch(capture):
+                yield capture, None
+                continue
+            yield capture, fetch_capture_image(
+                capture,
+                bbox,
+                constellation,
+                worldView,
+                scale,
+                get_window(capture),
+                max_size,
+            )
+        return
+
+    pending: deque[tuple[AbstractCapture, Future | None]] = deque()
+    capture_iter = iter(captures)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                # Keep at most `max_workers` reads in flight
+                while sum(future is not None for _, future in pending) < max_workers:
+                    capture = next(capture_iter, None)
+                    if capture is None:
+                        break
+                    future = None
+                    if should_fetch(capture):
+                        future = executor.submit(
+                            fetch_capture_image,
+                            capture,
+                            bbox,
+                            constellation,
+                            worldView,
+                            scale,
+                            get_window(capture),
+                            max_size,
+                        )
+                    pending.append((capture, future))
+                if not pending:
+                    break
+                capture, future = pending.popleft()
+                yield capture, future.result() if future is not None else None
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
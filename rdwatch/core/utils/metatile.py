@@ -0,0 +1,88 @@
+from typing import Any, NamedTuple
+
+from morecantile import Tile
+from rio_tiler.io.rasterio import Reader
+from rio_tiler.io.stac import STACReader
+from rio_tiler.models import ImageData
+
+from django.conf import settings
+
+# A web map tile as (z, x, y)
+TileZXY = tuple[int, int, int]
+
+
+class Metatile(NamedTuple):
+    """A block of `size` by `size` web map tiles, rendered together."""
+
+    z: int
+    # Column and row of the top left tile
+    x: int
+    y: int
+    size: int
+
+    def tiles(self) -> list[TileZXY]:
+        return [
+            (self.z, self.x + column, self.y + row)
+            for row in range(self.size)
+            for column in range(self.size)
+        ]
+
+
+def get_metatile(z: int, x: int, y: int) -> Metatile:
+    """Get the metatile of `TILE_METATILE_SIZE` tiles that a tile belongs to."""
+    size = min(settings.TILE_METATILE_SIZE, 2**z)
+    return Metatile(z, x - x % size, y - y % size, size)
+
+
+def read_metatile(
+    reader: Reader | STACReader,
+    metatile: Metatile,
+    tilesize: int,
+    **kwargs: Any,
+) -> ImageData:
+    """Read a metatile in a single `part()` call, as `tile()` would each tile."""
+    top_left = reader.tms.xy_bounds(Tile(metatile.x, metatile.y, metatile.z))
+    bottom_right = reader.tms.xy_bounds(
+        Tile(
+            metatile.x + metatile.size - 1,
+            metatile.y + metatile.size - 1,
+            metatile.z,
+        )
+    )
+    bounds = (top_left.left, bottom_right.bottom, bottom_right.right, top_left.top)
+    return reader.part(
+        bounds,
+        dst_crs=reader.tms.rasterio_crs,
+        bounds_crs=reader.tms.rasterio_crs,
+        height=tilesize * metatile.size,
+        width=tilesize * metatile.size,
+        max_size=None,
+        **kwargs,
+    )
+
+
+def split_metatile(
+    img: ImageData, metatile: Metatile, tilesize: int
+) -> dict[TileZXY, ImageData]:
+    """Slice an image read with `read_metatile` into its tiles."""
+    tiles = {}
+    for z, x, y in metatile.tiles():
+        row = (y - metatile.y) * tilesize
+        column = (x - metatile.x) * tilesize
+        tiles[(z, x, y)] = ImageData(
+            img.array[:, row : row + tilesize, column : column + tilesize],
+            assets=img.assets,
+            crs=img.crs,
+            band_names=img.band_names,
+        )
+    return tiles
+
+
+def render_metatile(
+    img: ImageData, metatile: Metatile, tilesize: int, img_format: str = 'WEBP'
+) -> dict[TileZXY, bytes]:
+    """Render each tile of an image read with `read_metatile`."""
+    return {
+        tile: tile_img.render(img_format=img_format)
+        for tile, tile_img in split_metatile(img, metatile, tilesize).items()
+    }
@@ -0,0 +1,56 @@
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+from rio_tiler.models import ImageData
+from rio_tiler.utils import pansharpening_brovey
+
+# Weight of the (missing) NIR band used by the Brovey transform
+BROVEY_WEIGHT = 0.2
+
+
+def read_pan_and_multispectral(
+    read_pan: Callable[[], ImageData], read_multispectral: Callable[[], ImageData]
+) -> tuple[ImageData, ImageData]:
+    """
+    Run the panchromatic and multispectral reads of a capture concurrently.
+
+    Each read runs in its own thread, so it has to enter its own
+    `rasterio.Env`, which is thread local.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pan_future = executor.submit(read_pan)
+        try:
+            multispectral = read_multispectral()
+        finally:
+            # Don't let a failed pan read mask a failed multispectral read
+            wait([pan_future])
+        pan = pan_future.result()
+    return pan, multispectral
+
+
+def _resize_nearest(img: ImageData, height: int, width: int) -> ImageData:
+    rows = np.arange(height) * img.height // height
+    cols = np.arange(width) * img.width // width
+    array = img.array[:, rows[:, None], cols[None, :]]
+    return ImageData(
+        array,
+        assets=img.assets,
+        crs=img.crs,
+        bounds=img.bounds,
+        band_names=img.band_names,
+    )
+
+
+def pansharpen(multispectral: ImageData, pan: ImageData) -> ImageData:
+    """
+    Pansharpen a multispectral chip with a panchromatic chip of the same bounds.
+
+    The multispectral chip is resampled to the size of the panchromatic chip
+    first, since they are read independently at their native resolutions.
+    """
+    if (multispectral.height, multispectral.width) != (pan.height, pan.width):
+        multispectral = _resize_nearest(multispectral, pan.height, pan.width)
+    return ImageData.from_array(
+        pansharpening_brovey(multispectral.data, pan.data, BROVEY_WEIGHT, 'uint16')
+    )
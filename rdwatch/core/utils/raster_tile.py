@@ -1,11 +1,19 @@
 import logging
-from contextlib import ExitStack
 from typing import Literal
 
-import rasterio  # type: ignore
 from pystac import Asset
 from rio_tiler.io.rasterio import Reader
 from rio_tiler.io.stac import STACReader
+from rio_tiler.models import ImageData
+
+from rdwatch.core.utils.asset_statistics import get_reader_statistics
+from rdwatch.core.utils.capture import URICapture
+from rdwatch.core.utils.metatile import (
+    Metatile,
+    TileZXY,
+    read_metatile,
+    render_metatile,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,11 +49,8 @@ def get_read_kwargs_for_reader(reader: Reader | STACReader):
 
 
 def get_rescale_range_from_reader(reader: Reader | STACReader) -> tuple[float, float]:
-    """Get the rescale range from the reader statistics."""
-    if isinstance(reader, STACReader):
-        all_stats = reader.merged_statistics()
-    else:
-        all_stats = reader.statistics()
+    """Get the rescale range from the reader's stored asset statistics."""
+    all_stats = get_reader_statistics(reader)
 
     if len(all_stats) == 0:
         return DEFAULT_RESCALE_RANGE
@@ -70,29 +75,47 @@ def get_raster_tile_from_reader(
     return img.render(img_format='WEBP')
 
 
-def get_raster_tile(uri: str, z: int, x: int, y: int) -> bytes:
-    # logger.info(f'SITE URI: {uri}')
-    with ExitStack() as cxt_stack:
-        cxt_stack.enter_context(rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR'))
+def get_raster_metatile_from_reader(
+    reader: Reader | STACReader,
+    metatile: Metatile,
+    scale: Literal['default', 'bits'] | list[int] = 'default',
+    tilesize: int = 256,
+) -> dict[TileZXY, bytes]:
+    """Render every tile of a metatile, as `get_raster_tile_from_reader` would."""
+    img = read_metatile(
+        reader, metatile, tilesize, **get_read_kwargs_for_reader(reader)
+    )
+    if scale == 'default':
+        img.rescale(in_range=((0, 255),))
+    elif scale == 'bits':
+        low, high = get_rescale_range_from_reader(reader)
+        img.rescale(in_range=((low, high),))
+    return render_metatile(img, metatile, tilesize)
 
-        scale_by = 'default'
-        if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
-            cxt_stack.enter_context(rasterio.Env(AWS_NO_SIGN_REQUEST='YES'))
-            uri = 's3://sentinel-cogs/' + uri[49:]
-            # rescale S2 data wit hbits
-            scale_by = 'bits'
 
-        cog = cxt_stack.enter_context(Reader(input=uri))
+def get_raster_tile(uri: str, z: int, x: int, y: int) -> bytes:
+    # logger.info(f'SITE URI: {uri}')
+    scale_by = 'default'
+    if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
+        # rescale S2 data wit hbits
+        scale_by = 'bits'
+    with URICapture(uri).open_reader() as cog:
         return get_raster_tile_from_reader(cog, z, x, y, scale=scale_by)
 
 
-def get_raster_bbox_from_reader(
+def get_raster_bbox_image_from_reader(
     reader: Reader | STACReader,
     bbox: tuple[float, float, float, float],
-    format_='PNG',
     scale: Literal['default', 'bits'] | list[int] = 'bits',
-) -> bytes:
-    img = reader.part(bbox, **get_read_kwargs_for_reader(reader))
+    max_size: int | None = None,
+) -> ImageData:
+    """
+    Read and rescale a bbox from a reader.
+
+    If `max_size` is given the longest side of the image is limited to it,
+    which lets GDAL read from the matching COG overview.
+    """
+    img = reader.part(bbox, max_size=max_size, **get_read_kwargs_for_reader(reader))
     if scale == 'default':
         img.rescale(in_range=((0, 255),))
     elif scale == 'bits':
@@ -100,6 +123,17 @@ def get_raster_bbox_from_reader(
         img.rescale(in_range=((low, high),))
     elif isinstance(scale, list) and len(scale) == 2:
         img.rescale(in_range=((scale[0], scale[1]),))
+    return img
+
+
+def get_raster_bbox_from_reader(
+    reader: Reader | STACReader,
+    bbox: tuple[float, float, float, float],
+    format_='PNG',
+    scale: Literal['default', 'bits'] | list[int] = 'bits',
+    max_size: int | None = None,
+) -> bytes:
+    img = get_raster_bbox_image_from_reader(reader, bbox, scale, max_size)
     return img.render(img_format=format_)
 
 
@@ -108,13 +142,9 @@ def get_raster_bbox(
     bbox: tuple[float, float, float, float],
     format_='PNG',
     scale: Literal['default', 'bits'] | list[int] = 'bits',
+    max_size: int | None = None,
 ) -> bytes:
-    with ExitStack() as cxt_stack:
-        cxt_stack.enter_context(rasterio.Env(GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR'))
-
-        if uri.startswith('https://sentinel-cogs.s3.us-west-2.amazonaws.com'):
-            cxt_stack.enter_context(rasterio.Env(AWS_NO_SIGN_REQUEST='YES'))
-            uri = 's3://sentinel-cogs/' + uri[49:]
-
-        cog = cxt_stack.enter_context(Reader(input=uri))
-        return get_raster_bbox_from_reader(cog, bbox, format_=format_, scale=scale)
+    with URICapture(uri).open_reader() as cog:
+        return get_raster_bbox_from_reader(
+            cog, bbox, format_=format_, scale=scale, max_size=max_size
+        )
@@ -0,0 +1,131 @@
+import logging
+import random
+import time
+from collections.abc import Callable
+from functools import cache
+from typing import TypeVar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+
+from pystac_client.exceptions import APIError
+from rasterio.errors import RasterioIOError
+from redis.commands.core import Script
+
+from django.conf import settings
+
+from rdwatch.core.utils.redis_client import get_redis_client, make_key
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+THROTTLING_STATUS_CODES = (429, 503)
+# Connection errors that are worth retrying, other URLErrors (DNS failures,
+# refused connections, bad certificates...) won't go away on their own
+TRANSIENT_CONNECTION_ERRORS = (
+    TimeoutError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+# Messages of GDAL errors caused by throttled or timed out HTTP requests
+THROTTLING_MESSAGES = (
+    'HTTP response code: 429',
+    'HTTP response code: 503',
+    'SlowDown',
+    'Too Many Requests',
+    'Operation timed out',
+    'Connection reset by peer',
+)
+
+# Refills the bucket for the time since it was last used, then takes a
+# token. Returns how long to wait for a token if there is none.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+@cache
+def _token_bucket() -> Script:
+    return get_redis_client().register_script(TOKEN_BUCKET_SCRIPT)
+
+
+def get_host(url: str) -> str | None:
+    """Get the host of `url`, or the bucket name for `s3://` URIs."""
+    return urlparse(url).netloc or None
+
+
+def _acquire_host(host: str) -> None:
+    rate, burst = settings.RATE_LIMITS.get(host, settings.RATE_LIMIT_DEFAULT)
+    key = make_key(f'rate-limit|{host}')
+    while True:
+        wait = float(_token_bucket()(keys=[key], args=[rate, burst]))
+        if wait <= 0:
+            return
+        time.sleep(wait + random.uniform(0, 1 / rate))
+
+
+def acquire(*urls: str) -> None:
+    """
+    Wait for a token to make a request to each distinct host among `urls`.
+
+    Tokens are shared by every process through a Redis token bucket per host,
+    refilled at the rate configured in `RATE_LIMITS` for the host. URLs
+    without a host (local files) aren't limited.
+    """
+    for host in sorted({get_host(url) for url in urls} - {None}):
+        _acquire_host(host)
+
+
+def is_throttling_error(e: BaseException) -> bool:
+    """Whether `e` was caused by a throttled, timed out or dropped request."""
+    if isinstance(e, HTTPError):
+        return e.code in THROTTLING_STATUS_CODES
+    if isinstance(e, URLError):
+        return isinstance(e.reason, TRANSIENT_CONNECTION_ERRORS)
+    if isinstance(e, TRANSIENT_CONNECTION_ERRORS):
+        return True
+    if isinstance(e, APIError):
+        return getattr(e, 'status_code', None) in THROTTLING_STATUS_CODES
+    if isinstance(e, RasterioIOError):
+        return any(message in str(e) for message in THROTTLING_MESSAGES)
+    return False
+
+
+def retry_throttled(func: Callable[[], T]) -> T:
+    """
+    Call `func`, retrying it with jittered exponential backoff if it fails
+    because of throttling, up to `RATE_LIMIT_MAX_RETRIES` times.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= settings.RATE_LIMIT_MAX_RETRIES or not is_throttling_error(e):
+                raise
+            delay = random.uniform(
+                0,
+                min(
+                    settings.RATE_LIMIT_BACKOFF_MAX,
+                    settings.RATE_LIMIT_BACKOFF_BASE * 2**attempt,
+                ),
+            )
+            attempt += 1
+            logger.info(f'Request throttled ({e}), retry {attempt} in {delay:.1f}s')
+            time.sleep(delay)
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any
+
+import rasterio  # type: ignore
+from rio_tiler.io.rasterio import Reader
+
+from django.conf import settings
+
+from rdwatch.core.utils.rate_limit import acquire
+
+logger = logging.getLogger(__name__)
+
+PoolKey = tuple[str, tuple[tuple[str, Any], ...]]
+
+
+class ReaderPool:
+    """
+    An LRU pool of open rio-tiler `Reader`s, keyed by URI and GDAL options.
+
+    Reusing an open reader skips fetching the COG header and IFDs again.
+    A reader is checked out by a single caller at a time, since GDAL
+    dataset handles can't be used concurrently. Readers that have been idle
+    for longer than `idle_timeout` seconds are closed, and at most
+    `max_open` idle readers are kept. Checked out readers aren't counted
+    against `max_open`, so there may be more open readers while they are in
+    use.
+    """
+
+    def __init__(self, max_open: int, idle_timeout: float) -> None:
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Idle readers, least recently used first
+        self._idle: OrderedDict[int, tuple[PoolKey, Reader, float]] = OrderedDict()
+
+    def _evict(self, now: float) -> list[Reader]:
+        """
+        Remove the idle readers that expired or are over `max_open`, and
+        return them to be closed outside of the lock.
+        """
+        evicted = []
+        for handle_id, (_, idle_reader, last_used) in list(self._idle.items()):
+            if len(self._idle) > self.max_open or now - last_used > self.idle_timeout:
+                del self._idle[handle_id]
+                evicted.append(idle_reader)
+        return evicted
+
+    def _checkout(self, key: PoolKey) -> Reader | None:
+        found = None
+        with self._lock:
+            # Expired readers are never handed out, even if nothing was
+            # checked in since they expired
+            to_close = self._evict(time.monotonic())
+            for handle_id, (idle_key, reader, _) in reversed(self._idle.items()):
+                if idle_key == key:
+                    del self._idle[handle_id]
+                    found = reader
+                    break
+        for idle_reader in to_close:
+            self._close(idle_reader)
+        return found
+
+    def _checkin(self, key: PoolKey, reader: Reader) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._idle[id(reader)] = (key, reader, now)
+            to_close = self._evict(now)
+        for idle_reader in to_close:
+            self._close(idle_reader)
+
+    @staticmethod
+    def _close(reader: Reader) -> None:
+        try:
+            reader.close()
+        except Exception as e:
+            logger.info(f'Failed to close reader for {reader.input}: {e}')
+
+    @contextmanager
+    def reader(self, uri: str, **env_options: Any) -> Generator[Reader, None, None]:
+        """
+        Check out a reader for `uri`, opening one if none is idle.
+
+        The reader is used inside a `rasterio.Env` with `env_options`, which
+        are part of the pool key. A reader that raised an error is closed
+        instead of being returned to the pool.
+        """
+        key: PoolKey = (uri, tuple(sorted(env_options.items())))
+        with rasterio.Env(**env_options):
+            reader = self._checkout(key)
+            if reader is None:
+                reader = Reader(input=uri)
+            try:
+                yield reader
+            except BaseException:
+                self._close(reader)
+                raise
+            self._checkin(key, reader)
+
+    def clear(self, close: bool = True) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        if close:
+            for _, reader, _ in idle.values():
+                self._close(reader)
+
+
+_pool: ReaderPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_reader_pool() -> ReaderPool:
+    """Get the reader pool of the current process."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ReaderPool(
+                max_open=settings.READER_POOL_MAX_OPEN,
+                idle_timeout=settings.READER_POOL_IDLE_TIMEOUT.total_seconds(),
+            )
+        return _pool
+
+
+def _reset_pool_after_fork() -> None:
+    # Dataset handles inherited from the parent process must not be shared
+    global _pool, _pool_lock
+    if _pool is not None:
+        _pool.clear(close=False)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+@contextmanager
+def pooled_reader(uri: str, **env_options: Any) -> Generator[Reader, None, None]:
+    """
+    Check out a pooled `Reader`, see `ReaderPool.reader`.
+
+    Every checkout takes a rate limit token for the host of `uri`.
+    """
+    acquire(uri)
+    with get_reader_pool().reader(uri, **env_options) as reader:
+        yield reader
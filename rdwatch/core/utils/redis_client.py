@@ -0,0 +1,22 @@
+from functools import cache
+
+import redis
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+
+@cache
+def get_redis_client() -> redis.Redis:
+    """
+    Get a raw Redis client for the default cache's Redis server.
+
+    Use this only for operations the Django cache API doesn't expose
+    (sorted sets, scripts, etc). Build key names with `make_key` so they
+    are namespaced the same way as regular Django cache keys.
+    """
+    return redis.Redis.from_url(settings.CACHES['default']['LOCATION'])
+
+
+def make_key(key: str) -> str:
+    return django_cache.make_key(key)
@@ -1,5 +1,5 @@
 import logging
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
@@ -47,8 +47,6 @@ def get_bands(
     if constellation not in SOURCES:
         raise ValueError(f'Unsupported constellation {constellation}')
 
-    s3_requester_pays = constellation in S3_REQUESTER_PAYS_COLLECTIONS
-
     results = stac_search(
         constellation,
         timestamp,
@@ -56,12 +54,19 @@ def get_bands(
         timebuffer=timebuffer or timedelta(hours=1),
     )
 
+    yield from get_bands_from_items(constellation, results)
+
+
+def get_bands_from_items(constellation: str, items: Iterable[Item]) -> Iterator[Band]:
+    """Build the bands for STAC items that have already been searched for."""
+    s3_requester_pays = constellation in S3_REQUESTER_PAYS_COLLECTIONS
+
     level, _ = ProcessingLevel.objects.get_or_create(
         slug='2A',
         defaults={'description': 'surface reflectance'},
     )
 
-    for item in results.items():
+    for item in items:
         timestr = item.properties.get('datetime')
         if not timestr:
             logger.warning("Malformed STAC response: no 'properties.datetime'")
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import math
+import time
+from typing import Literal, TypedDict
+
+from rio_tiler.models import ImageData
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rdwatch.core.utils.capture import AbstractCapture
+from rdwatch.core.utils.raster_tile import (
+    get_raster_bbox_image_from_reader,
+    get_read_kwargs_for_reader,
+    get_rescale_range_from_reader,
+)
+
+logger = logging.getLogger(__name__)
+
+# How long a worker waits for another worker to finish reading a window
+# before giving up and reading its own chip directly
+WINDOW_LOCK_WAIT = 30
+WINDOW_LOCK_POLL_INTERVAL = 0.5
+
+
+class SharedWindow(TypedDict):
+    bbox: list[float]
+    # Longest side the window is read at, or None for full resolution
+    max_size: int | None
+
+
+def cluster_bboxes(
+    bboxes: list[list[float]], max_size: float
+) -> list[tuple[list[float], list[int]]]:
+    """
+    Greedily group nearby bboxes into windows no larger than `max_size`.
+
+    Returns a list of (window, member indexes) pairs. Bboxes that are larger
+    than `max_size` on their own end up alone in their window.
+    """
+    clusters: list[tuple[list[float], list[int]]] = []
+    for index in sorted(range(len(bboxes)), key=lambda i: bboxes[i][0]):
+        bbox = bboxes[index]
+        for window, members in clusters:
+            union = [
+                min(window[0], bbox[0]),
+                min(window[1], bbox[1]),
+                max(window[2], bbox[2]),
+                max(window[3], bbox[3]),
+            ]
+            if union[2] - union[0] <= max_size and union[3] - union[1] <= max_size:
+                window[:] = union
+                members.append(index)
+                break
+        else:
+            clusters.append((list(bbox), [index]))
+    return clusters
+
+
+def get_window_max_size(
+    window: list[float], bboxes: list[list[float]], max_size: int | None
+) -> int | None:
+    """
+    Get the longest side to read a shared window at, so that each of the
+    `bboxes` cropped out of it is at least as detailed as when it is read on
+    its own with `max_size`.
+    """
+    if max_size is None:
+        return None
+    # The smallest bbox needs the most detailed window
+    ratio = max(
+        max(
+            (window[2] - window[0]) / max(bbox[2] - bbox[0], 1e-12),
+            (window[3] - window[1]) / max(bbox[3] - bbox[1], 1e-12),
+        )
+        for bbox in bboxes
+    )
+    return math.ceil(max_size * ratio)
+
+
+def _window_cache_key(
+    capture: AbstractCapture,
+    window: list[float],
+    scale: str | list[int],
+    max_size: int | None,
+) -> str:
+    params = json.dumps(
+        [
+            capture.uris,
+            [round(coord, 6) for coord in window],
+            scale == 'bits',
+            max_size,
+        ],
+        separators=(',', ':'),
+    )
+    return f'shared-window|{hashlib.sha256(params.encode()).hexdigest()}'
+
+
+def _read_window(
+    capture: AbstractCapture,
+    window: list[float],
+    scale: str | list[int],
+    max_size: int | None,
+) -> dict:
+    with capture.open_reader() as reader:
+        img = reader.part(
+            window, max_size=max_size, **get_read_kwargs_for_reader(reader)
+        )
+        rescale_range = (
+            get_rescale_range_from_reader(reader) if scale == 'bits' else None
+        )
+    return {'image': img, 'rescale_range': rescale_range}
+
+
+def get_shared_window(
+    capture: AbstractCapture,
+    window: list[float],
+    scale: str | list[int],
+    max_size: int | None = None,
+) -> dict | None:
+    """
+    Get the raw (not rescaled) window of a capture, shared between workers.
+
+    The first worker to ask for a window reads it and stores it in the cache,
+    other workers wait for it instead of issuing their own range requests.
+    Returns None if the window couldn't be obtained in time.
+    """
+    key = _window_cache_key(capture, window, scale, max_size)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    lock_key = f'{key}|lock'
+    if cache.add(lock_key, True, WINDOW_LOCK_WAIT):
+        try:
+            cached = _read_window(capture, window, scale, max_size)
+            cache.set(key, cached, settings.SHARED_WINDOW_CACHE_TIMEOUT.total_seconds())
+        finally:
+            cache.delete(lock_key)
+        return cached
+
+    deadline = time.monotonic() + WINDOW_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WINDOW_LOCK_POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        if cache.get(lock_key) is None:
+            break
+    return None
+
+
+def get_raster_bbox_image_from_window(
+    capture: AbstractCapture,
+    window: SharedWindow,
+    bbox: tuple[float, float, float, float],
+    scale: Literal['default', 'bits'] | list[int] = 'bits',
+    max_size: int | None = None,
+) -> ImageData:
+    """
+    Read a bbox from a capture by cropping it out of a shared, larger window.
+
+    The window is read at the size it was planned with, see
+    `get_window_max_size`, so every site inside it shares the same read.
+    Falls back to reading the bbox directly if the shared window is not
+    available.
+    """
+    shared = get_shared_window(capture, window['bbox'], scale, window['max_size'])
+    if shared is None:
+        logger.info(f'Shared window unavailable, reading {capture.uris} directly')
+        with capture.open_reader() as reader:
+            return get_raster_bbox_image_from_reader(reader, bbox, scale, max_size)
+
+    img: ImageData = shared['image'].clip(bbox)
+    if max_size is not None and max(img.width, img.height) > max_size:
+        # Larger bboxes get more detail out of the window than they need
+        factor = max_size / max(img.width, img.height)
+        img = img.resize(
+            max(round(img.height * factor), 1), max(round(img.width * factor), 1)
+        )
+    if scale == 'default':
+        img.rescale(in_range=((0, 255),))
+    elif scale == 'bits':
+        low, high = shared['rescale_range']
+        img.rescale(in_range=((low, high),))
+    elif isinstance(scale, list) and len(scale) == 2:
+        img.rescale(in_range=((scale[0], scale[1]),))
+    return img
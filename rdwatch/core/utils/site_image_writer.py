@@ -0,0 +1,181 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.core.files.base import ContentFile
+
+from rdwatch.core.models import SiteEvaluation, SiteImage, SiteObservation
+
+logger = logging.getLogger(__name__)
+
+# Fields that are written when an existing image is replaced
+UPDATE_FIELDS = [
+    'image',
+    'cloudcover',
+    'percent_black',
+    'uri_locations',
+    'image_bbox',
+    'image_dimensions',
+]
+
+
+class SiteImageWriter:
+    """
+    Buffer `SiteImage` writes for a single site and source.
+
+    Every existing (timestamp, observation) key for the site is loaded once
+    up front, so checking whether an image exists doesn't hit the database.
+    New and replaced images are uploaded to storage concurrently and their
+    rows are written with `bulk_create`/`bulk_update` in batches.
+
+    Use it as a context manager so buffered rows are flushed on exit.
+    """
+
+    def __init__(
+        self,
+        site: SiteEvaluation,
+        source: str,
+        batch_size: int | None = None,
+        max_workers: int | None = None,
+    ) -> None:
+        self.site = site
+        self.source = source
+        self.batch_size = batch_size or settings.SITE_IMAGE_BULK_BATCH_SIZE
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.SITE_IMAGE_UPLOAD_POOL_SIZE
+        )
+        self._field = SiteImage._meta.get_field('image')
+
+        self._by_observation: dict[tuple[datetime, Any], SiteImage] = {}
+        self._by_timestamp: dict[datetime, SiteImage] = {}
+        for site_image in (
+            SiteImage.objects.filter(site=site, source=source)
+            .only(
+                'id',
+                'site_id',
+                'observation_id',
+                'timestamp',
+                'source',
+                'image',
+                'percent_black',
+            )
+            .order_by('pk')
+        ):
+            self._index(site_image)
+
+        self._to_create: list[SiteImage] = []
+        self._to_update: dict[int, SiteImage] = {}
+        # Uploads that haven't been assigned to their row yet, keyed by id()
+        self._uploads: dict[int, tuple[SiteImage, Future[str]]] = {}
+        self._to_delete: list[str] = []
+
+    def __enter__(self) -> 'SiteImageWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _index(self, site_image: SiteImage) -> None:
+        self._by_observation[
+            (site_image.timestamp, site_image.observation_id)
+        ] = site_image
+        self._by_timestamp.setdefault(site_image.timestamp, site_image)
+
+    def find(
+        self, timestamp: datetime, observation: SiteObservation | None = None
+    ) -> SiteImage | None:
+        """
+        Find the image for an observation, or any image at `timestamp` if no
+        observation is given.
+        """
+        if observation is not None:
+            return self._by_observation.get((timestamp, observation.pk))
+        return self._by_timestamp.get(timestamp)
+
+    def images(self) -> list[SiteImage]:
+        """All existing and buffered images of the site."""
+        return list(self._by_observation.values())
+
+    def _upload(self, name: str, content: bytes) -> str:
+        return self._field.storage.save(name, ContentFile(content))
+
+    def _schedule_upload(self, site_image: SiteImage, name: str, content: bytes):
+        name = self._field.generate_filename(site_image, name)
+        previous = self._uploads.pop(id(site_image), None)
+        if previous is not None:
+            # The row is replaced again before its first upload was saved
+            self._to_delete.append(previous[1].result())
+        self._uploads[id(site_image)] = (
+            site_image,
+            self._executor.submit(self._upload, name, content),
+        )
+
+    def create(self, name: str, content: bytes, **fields) -> SiteImage:
+        """Buffer a new image for the site."""
+        site_image = SiteImage(site=self.site, source=self.source, **fields)
+        self._schedule_upload(site_image, name, content)
+        self._to_create.append(site_image)
+        self._index(site_image)
+        self._maybe_flush()
+        return site_image
+
+    def update(
+        self,
+        site_image: SiteImage,
+        name: str,
+        content: bytes,
+        *,
+        cloudcover: float | None,
+        percent_black: float | None,
+        uri_locations: list[str],
+        image_bbox: Polygon,
+        image_dimensions: list[int],
+    ) -> SiteImage:
+        """Buffer replacing the image of an existing row."""
+        if site_image.image and id(site_image) not in self._uploads:
+            self._to_delete.append(site_image.image.name)
+        site_image.cloudcover = cloudcover
+        site_image.percent_black = percent_black
+        site_image.uri_locations = uri_locations
+        site_image.image_bbox = image_bbox
+        site_image.image_dimensions = image_dimensions
+        self._schedule_upload(site_image, name, content)
+        if site_image.pk is not None:
+            self._to_update[site_image.pk] = site_image
+        self._maybe_flush()
+        return site_image
+
+    def _maybe_flush(self) -> None:
+        if len(self._to_create) + len(self._to_update) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Wait for pending uploads and write all buffered rows."""
+        uploads, self._uploads = self._uploads, {}
+        for site_image, future in uploads.values():
+            site_image.image = future.result()
+
+        to_create, self._to_create = self._to_create, []
+        to_update, self._to_update = list(self._to_update.values()), {}
+        if to_create:
+            SiteImage.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            SiteImage.objects.bulk_update(
+                to_update, UPDATE_FIELDS, batch_size=self.batch_size
+            )
+
+        # Only remove replaced files once nothing references them anymore
+        to_delete, self._to_delete = self._to_delete, []
+        for name in to_delete:
+            self._executor.submit(self._field.storage.delete, name)
+        if to_create or to_update:
+            logger.info(
+                f'Saved {len(to_create)} new and {len(to_update)} updated '
+                f'{self.source} images for site {self.site.pk}'
+            )
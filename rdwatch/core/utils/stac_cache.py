@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Iterable
+from datetime import datetime as dt
+from datetime import timezone
+from functools import cache as memoize
+from typing import Any, Literal
+
+from pystac_client import Client
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rdwatch.core.utils.capture_catalog import (
+    naive_utc,
+    parse_datetime_range,
+    record_harvest,
+    search_catalog,
+    store_items,
+)
+from rdwatch.core.utils.rate_limit import acquire, retry_throttled
+from rdwatch.core.utils.redis_client import get_redis_client, make_key
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of cached search keys, scored by last access time
+SEARCH_INDEX_KEY = 'stac-search-index'
+
+
+@memoize
+def _open_catalog(url: str, headers: tuple[tuple[str, str], ...]) -> Client:
+    return Client.open(url, headers=dict(headers) or None)
+
+
+def open_catalog(url: str, headers: dict[str, str] | None = None) -> Client:
+    """Open a STAC catalog, reusing the catalog already opened for `url`."""
+    return _open_catalog(url, tuple(sorted((headers or {}).items())))
+
+
+def _normalize_bbox(bbox: Iterable[float]) -> list[float]:
+    # Round to ~10cm so equivalent float representations share a cache entry
+    return [round(float(coord), 6) for coord in bbox]
+
+
+def _search_cache_key(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    datetime: str,
+) -> str:
+    params = json.dumps(
+        [url, sorted(collections), _normalize_bbox(bbox), datetime],
+        separators=(',', ':'),
+    )
+    digest = hashlib.sha256(params.encode()).hexdigest()
+    return f'stac-search|{digest}'
+
+
+def _item_cache_key(url: str, item: dict[str, Any]) -> str:
+    # Item ids are only unique within a catalog
+    catalog = hashlib.sha256(url.encode()).hexdigest()[:12]
+    return f"stac-item|{catalog}|{item.get('collection')}|{item['id']}"
+
+
+def _search_cache_timeout(datetime: str) -> float:
+    """
+    Get how long to cache a search for. Captures within
+    `CAPTURE_CATALOG_PUBLICATION_LATENCY` of now may still be published, so
+    searches that reach into that time are only cached briefly.
+    """
+    time_range = parse_datetime_range(datetime)
+    published = dt.now(timezone.utc).replace(tzinfo=None) - (
+        settings.CAPTURE_CATALOG_PUBLICATION_LATENCY
+    )
+    if time_range is None or time_range[1] >= published:
+        return settings.STAC_RECENT_SEARCH_CACHE_TIMEOUT.total_seconds()
+    return settings.STAC_SEARCH_CACHE_TIMEOUT.total_seconds()
+
+
+def _touch_search(search_key: str) -> None:
+    """Mark a search as recently used and evict the least recently used ones."""
+    client = get_redis_client()
+    index_key = make_key(SEARCH_INDEX_KEY)
+    with client.pipeline() as pipe:
+        pipe.zadd(index_key, {search_key: time.time()})
+        pipe.zcard(index_key)
+        _, size = pipe.execute()
+
+    excess = size - settings.STAC_SEARCH_CACHE_MAX_ENTRIES
+    if excess > 0:
+        evicted = client.zpopmin(index_key, excess)
+        cache.delete_many([key.decode() for key, _ in evicted])
+
+
+def stac_item_search(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    datetime: str,
+    method: Literal['GET', 'POST'] = 'POST',
+    headers: dict[str, str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Run a STAC item search against the catalog at `url`, rate limited per
+    host and retried if it is throttled.
+    """
+
+    def search() -> list[dict[str, Any]]:
+        acquire(url)
+        stac_catalog = open_catalog(url, headers)
+        results = stac_catalog.search(
+            method=method,
+            bbox=list(bbox),
+            datetime=datetime,
+            collections=collections,
+            limit=100,
+        )
+        return list(results.items_as_dicts())
+
+    return retry_throttled(search)
+
+
+def cached_stac_search(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    datetime: str,
+    method: Literal['GET', 'POST'] = 'POST',
+    headers: dict[str, str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Run a STAC item search, resolving it from the local capture catalog if
+    the search window has been harvested, or else caching the resulting
+    items in Redis.
+
+    Items are cached individually so that overlapping searches share them.
+    The cache for the search itself only holds the list of item keys, and
+    is short lived for searches that may still find newly published items.
+    Searches that miss the cache are rate limited per host and retried if
+    they are throttled.
+    """
+    bbox = _normalize_bbox(bbox)
+
+    catalog_items = search_catalog(url, collections, bbox, datetime)
+    if catalog_items is not None:
+        return catalog_items
+
+    search_key = _search_cache_key(url, collections, bbox, datetime)
+
+    item_keys: list[str] | None = cache.get(search_key)
+    if item_keys is not None:
+        items = cache.get_many(item_keys)
+        # Only a hit if none of the items have been evicted in the meantime
+        if len(items) == len(set(item_keys)):
+            _touch_search(search_key)
+            return [items[key] for key in item_keys]
+
+    items = stac_item_search(url, collections, bbox, datetime, method, headers)
+
+    item_keys = [_item_cache_key(url, item) for item in items]
+    cache.set_many(
+        dict(zip(item_keys, items)),
+        settings.STAC_ITEM_CACHE_TIMEOUT.total_seconds(),
+    )
+    cache.set(search_key, item_keys, _search_cache_timeout(datetime))
+    _touch_search(search_key)
+    return items
+
+
+def _fmt_time(time: dt) -> str:
+    return f'{time.isoformat()[:19]}Z'
+
+
+def harvest_stac_items(
+    url: str,
+    collections: list[str],
+    bbox: Iterable[float],
+    start: dt,
+    end: dt,
+    method: Literal['GET', 'POST'] = 'POST',
+    headers: dict[str, str] | None = None,
+) -> int:
+    """
+    Copy the items of `collections` in the catalog at `url` within `bbox` and
+    from `start` to `end` into the local capture catalog.
+
+    The window is searched in chunks of `CAPTURE_CATALOG_HARVEST_CHUNK` and
+    only recorded as harvested once every chunk has been stored. It ends no
+    later than now, and the last `CAPTURE_CATALOG_PUBLICATION_LATENCY` of it
+    isn't recorded, so captures published or backfilled late are still
+    searched for live. Returns the number of items stored.
+    """
+    bbox = _normalize_bbox(bbox)
+    # Searches are made to the second
+    start = naive_utc(start).replace(microsecond=0)
+    now = dt.now(timezone.utc).replace(tzinfo=None)
+    end = min(naive_utc(end), now).replace(microsecond=0)
+    stored = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + settings.CAPTURE_CATALOG_HARVEST_CHUNK, end)
+        items = stac_item_search(
+            url,
+            collections,
+            bbox,
+            f'{_fmt_time(chunk_start)}/{_fmt_time(chunk_end)}',
+            method,
+            headers,
+        )
+        stored += store_items(url, items)
+        if chunk_end >= end:
+            break
+        chunk_start = chunk_end
+    harvested_end = min(end, now - settings.CAPTURE_CATALOG_PUBLICATION_LATENCY)
+    if harvested_end > start:
+        record_harvest(url, collections, bbox, start, harvested_end)
+    return stored
@@ -3,7 +3,9 @@ from datetime import datetime, timedelta
 from itertools import chain
 from typing import Literal, TypedDict
 
-from pystac_client import Client, ItemSearch
+from pystac import Item
+
+from rdwatch.core.utils.stac_cache import cached_stac_search
 
 logger = logging.getLogger(__name__)
 
@@ -70,9 +72,7 @@ def stac_search(
     timestamp: datetime,
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta | None = None,
-) -> ItemSearch:
-    stac_catalog = Client.open(STAC_URLS[source])
-
+) -> list[Item]:
     if timebuffer is not None:
         min_time = timestamp - timebuffer
         max_time = timestamp + timebuffer
@@ -80,12 +80,12 @@ def stac_search(
     else:
         time_str = f'{_fmt_time(timestamp)}Z'
 
-    results = stac_catalog.search(
+    results = cached_stac_search(
+        STAC_URLS[source],
+        COLLECTIONS_BY_SOURCE[source],
+        bbox,
+        time_str,
         method='POST',
-        bbox=bbox,
-        datetime=time_str,
-        collections=COLLECTIONS_BY_SOURCE[source],
-        limit=100,
     )
 
-    return results
+    return [Item.from_dict(item) for item in results]
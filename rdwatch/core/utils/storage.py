@@ -0,0 +1,24 @@
+from django.core.files.storage import Storage, default_storage
+
+
+def read_range(
+    name: str, offset: int, length: int, storage: Storage = default_storage
+) -> bytes:
+    """
+    Read `length` bytes of a stored file from `offset`.
+
+    S3 storages read just the byte range, other storages open the file and
+    seek to it.
+    """
+    bucket = getattr(storage, 'bucket', None)
+    normalize_name = getattr(storage, '_normalize_name', None)
+    if bucket is not None and hasattr(bucket, 'Object') and normalize_name is not None:
+        # django-storages only exposes the object key through _normalize_name,
+        # which also applies the storage's location prefix
+        response = bucket.Object(normalize_name(name)).get(
+            Range=f'bytes={offset}-{offset + length - 1}'
+        )
+        return response['Body'].read()
+    with storage.open(name) as f:
+        f.seek(offset)
+        return f.read(length)
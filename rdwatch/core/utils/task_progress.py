@@ -0,0 +1,101 @@
+import time
+from typing import Any
+
+from celery import Task
+from celery.result import AsyncResult
+from celery.states import READY_STATES
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _progress_key(task_id: str) -> str:
+    return f'task-progress|{task_id}'
+
+
+class ProgressReporter:
+    """
+    Report the progress of a long running Celery task through the cache.
+
+    Intermediate states are coalesced, only written when the mode changes,
+    when `TASK_PROGRESS_MIN_INTERVAL` seconds have passed, or when progress
+    moved by at least `TASK_PROGRESS_MIN_PERCENT`. They never reach the
+    result backend, only terminal states are persisted there.
+    """
+
+    def __init__(
+        self,
+        task: Task,
+        min_interval: float | None = None,
+        min_percent: float | None = None,
+    ) -> None:
+        self.task = task
+        self.task_id = task.request.id
+        self.min_interval = (
+            settings.TASK_PROGRESS_MIN_INTERVAL
+            if min_interval is None
+            else min_interval
+        )
+        self.min_percent = (
+            settings.TASK_PROGRESS_MIN_PERCENT if min_percent is None else min_percent
+        )
+        self._last_time: float | None = None
+        self._last_state: str | None = None
+        self._last_meta: dict[str, Any] = {}
+
+    @staticmethod
+    def _percent(meta: dict[str, Any]) -> float:
+        total = meta.get('total') or 0
+        if not total:
+            return 0.0
+        return (meta.get('current') or 0) / total * 100
+
+    def _should_write(self, state: str, meta: dict[str, Any]) -> bool:
+        if self._last_time is None or state != self._last_state:
+            return True
+        ignored = ('current',)
+        if {k: v for k, v in meta.items() if k not in ignored} != {
+            k: v for k, v in self._last_meta.items() if k not in ignored
+        }:
+            return True
+        if time.monotonic() - self._last_time >= self.min_interval:
+            return True
+        return (
+            abs(self._percent(meta) - self._percent(self._last_meta))
+            >= self.min_percent
+        )
+
+    def update(
+        self, state: str = 'PROGRESS', meta: dict[str, Any] | None = None
+    ) -> None:
+        meta = meta or {}
+        if state in READY_STATES:
+            self.task.update_state(state=state, meta=meta)
+        elif self.task_id is None or not self._should_write(state, meta):
+            # Tasks that are called directly have no id to report progress on
+            return
+        if self.task_id is not None:
+            cache.set(
+                _progress_key(self.task_id),
+                {'state': state, 'info': meta},
+                settings.TASK_PROGRESS_TIMEOUT.total_seconds(),
+            )
+        self._last_time = time.monotonic()
+        self._last_state = state
+        self._last_meta = meta
+
+
+def get_task_state(task_id: Any) -> tuple[str, Any]:
+    """
+    Get the (state, info) of a task.
+
+    While a task is running its latest progress is read from the cache,
+    once it is finished its result is read from the result backend.
+    """
+    result = AsyncResult(str(task_id))
+    state = result.state
+    if state not in READY_STATES:
+        progress = cache.get(_progress_key(str(task_id)))
+        if progress is not None:
+            return progress['state'], progress['info']
+    return state, result.info
@@ -0,0 +1,46 @@
+from typing import Any
+
+from celery import Task
+
+from django.conf import settings
+
+
+def get_fair_priority(index: int, total: int) -> int:
+    """
+    Get the priority of the `index`th of `total` tasks fanned out for a
+    model run.
+
+    The tasks are spread evenly over the priority steps by their fraction of
+    the model run, so every model run has tasks at the highest priority and
+    one that is queued later is interleaved with the rest of the ones queued
+    earlier, however large they are.
+    """
+    steps = settings.TASK_MAX_PRIORITY + 1
+    return min(index * steps // max(total, 1), settings.TASK_MAX_PRIORITY)
+
+
+def get_bulk_fetch_options(index: int, total: int) -> dict[str, Any]:
+    """
+    Get the `apply_async` options of the `index`th of `total` sites of a
+    model run fetch.
+    """
+    return {
+        'queue': settings.BULK_FETCH_QUEUE,
+        'priority': get_fair_priority(index, total),
+    }
+
+
+def get_delivery_options(task: Task) -> dict[str, Any]:
+    """
+    Get the queue and priority `task` was delivered with.
+
+    Subtasks are sent with the same options, so the work for a site that was
+    queued as part of a bulk fetch stays on the bulk queue.
+    """
+    delivery_info = task.request.delivery_info or {}
+    options = {}
+    if delivery_info.get('routing_key'):
+        options['queue'] = delivery_info['routing_key']
+    if delivery_info.get('priority') is not None:
+        options['priority'] = delivery_info['priority']
+    return options
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from typing import NamedTuple
+
+from redis.exceptions import LockNotOwnedError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from rdwatch.core.utils.capture import AbstractCapture
+from rdwatch.core.utils.metatile import Metatile, TileZXY, get_metatile
+from rdwatch.core.utils.redis_client import get_redis_client, make_key
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of tile keys in the hot tier, scored by last access time
+HOT_INDEX_KEY = 'tile-cache-index'
+
+
+class CachedTile(NamedTuple):
+    content: bytes
+    # Hash of the content, usable as an ETag
+    etag: str
+
+
+def get_capture_id(capture: AbstractCapture) -> str:
+    """Identify a capture by the URIs its tiles are rendered from."""
+    uris = list(capture.uris)
+    panuri = getattr(capture, 'panuri', None)
+    if panuri:
+        uris.append(panuri)
+    return '|'.join(uris)
+
+
+def _tile_path(capture_id: str, z: int, x: int, y: int, format: str) -> str:
+    digest = hashlib.sha256(capture_id.encode()).hexdigest()
+    return (
+        f'{settings.TILE_CACHE_STORAGE_PREFIX}/{digest[:2]}/{digest}/'
+        f'{z}/{x}/{y}.{format.lower()}'
+    )
+
+
+def _touch_hot(key: str) -> None:
+    """Mark a hot tile as recently used and evict the least recently used ones."""
+    client = get_redis_client()
+    index_key = make_key(HOT_INDEX_KEY)
+    with client.pipeline() as pipe:
+        pipe.zadd(index_key, {key: time.time()})
+        pipe.zcard(index_key)
+        _, size = pipe.execute()
+
+    excess = size - settings.TILE_CACHE_HOT_MAX_ENTRIES
+    if excess > 0:
+        evicted = client.zpopmin(index_key, excess)
+        cache.delete_many([evicted_key.decode() for evicted_key, _ in evicted])
+
+
+def _set_hot(key: str, tile: CachedTile) -> None:
+    cache.set(key, tile, settings.TILE_CACHE_HOT_TIMEOUT.total_seconds())
+    _touch_hot(key)
+
+
+def _read_durable(path: str) -> bytes | None:
+    try:
+        with default_storage.open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Storage backends don't agree on the error for a missing object
+        logger.debug(f'Tile {path} not in storage: {e}')
+        return None
+
+
+def _write_durable(path: str, content: bytes) -> None:
+    try:
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(content))
+    except Exception as e:
+        logger.warning(f'Failed to store tile {path}: {e}')
+
+
+def get_timestamp_resolution_key(
+    source: str, z: int, x: int, y: int, timestamp: datetime
+) -> str:
+    """
+    Get the cache key of the capture that a tile request for `timestamp`
+    resolves to. Timestamps are compared to the second.
+    """
+    timestamp = timestamp.replace(microsecond=0)
+    return f'tile-timestamp|{source}|{z}/{x}/{y}|{timestamp.isoformat()}'
+
+
+def _get_tile(path: str) -> CachedTile | None:
+    key = f'tile|{path}'
+    tile: CachedTile | None = cache.get(key)
+    if tile is not None:
+        _touch_hot(key)
+        return tile
+
+    content = _read_durable(path)
+    if content is None:
+        return None
+    tile = CachedTile(content, hashlib.sha256(content).hexdigest())
+    _set_hot(key, tile)
+    return tile
+
+
+def _put_tile(path: str, content: bytes) -> CachedTile:
+    _write_durable(path, content)
+    tile = CachedTile(content, hashlib.sha256(content).hexdigest())
+    _set_hot(f'tile|{path}', tile)
+    return tile
+
+
+def get_cached_tiles(
+    capture_id: str,
+    tiles: Iterable[TileZXY],
+    format: str,
+    render: Callable[[Metatile], dict[TileZXY, bytes]],
+) -> dict[TileZXY, CachedTile]:
+    """
+    Get rendered tiles of a capture, see `get_capture_id`, rendering the
+    metatiles of the ones that aren't cached in either tier with `render`.
+
+    Tiles are looked up in the hot tier in the cache first, which is
+    limited to `TILE_CACHE_HOT_MAX_ENTRIES` least recently used tiles, then
+    in the default storage, which keeps every rendered tile. A tile found in
+    storage is promoted to the hot tier. Every tile of a rendered metatile is
+    cached, and a metatile is only rendered by one request at a time.
+    """
+    found: dict[TileZXY, CachedTile] = {}
+    missing: dict[Metatile, list[TileZXY]] = defaultdict(list)
+    for tile in tiles:
+        cached = _get_tile(_tile_path(capture_id, *tile, format))
+        if cached is None:
+            missing[get_metatile(*tile)].append(tile)
+        else:
+            found[tile] = cached
+
+    digest = hashlib.sha256(capture_id.encode()).hexdigest()
+    for metatile, metatile_tiles in missing.items():
+        z, x, y, size = metatile
+        lock = get_redis_client().lock(
+            make_key(f'tile-lock|{digest}|{format}|{z}/{x}/{y}/{size}'),
+            timeout=settings.TILE_METATILE_LOCK_TIMEOUT.total_seconds(),
+        )
+        # Render anyway if the other request takes too long
+        locked = lock.acquire(
+            blocking_timeout=settings.TILE_METATILE_LOCK_TIMEOUT.total_seconds()
+        )
+        try:
+            if locked:
+                # The metatile may have been rendered while waiting for the lock
+                for tile in list(metatile_tiles):
+                    cached = _get_tile(_tile_path(capture_id, *tile, format))
+                    if cached is not None:
+                        found[tile] = cached
+                        metatile_tiles.remove(tile)
+                if not metatile_tiles:
+                    continue
+            for tile, content in render(metatile).items():
+                cached = _put_tile(_tile_path(capture_id, *tile, format), content)
+                if tile in metatile_tiles:
+                    found[tile] = cached
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except LockNotOwnedError:
+                    # The render outlasted the lock, which another request
+                    # may hold by now
+                    logger.warning(f'Metatile lock expired while rendering {metatile}')
+    return found
@@ -0,0 +1,89 @@
+from bisect import bisect_right, insort
+from collections.abc import Iterable
+from datetime import date, datetime, timezone
+from typing import TypeVar
+
+import numpy as np
+
+from rdwatch.core.utils.capture import AbstractCapture
+
+SECONDS_PER_DAY = 86400
+
+CaptureT = TypeVar('CaptureT', bound=AbstractCapture)
+FloatT = TypeVar('FloatT', float, np.ndarray)
+
+
+def _seconds(timestamp: datetime | date) -> float:
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.combine(timestamp, datetime.min.time())
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def _day_range_bounds(check: FloatT, days_range: int) -> tuple[FloatT, FloatT]:
+    # `abs((check - timestamp).days) <= days_range`, where `.days` is floored,
+    # holds for timestamps in (check - (days_range + 1) days, check + days_range days]
+    return (
+        check - (days_range + 1) * SECONDS_PER_DAY,
+        check + days_range * SECONDS_PER_DAY,
+    )
+
+
+class TimestampIndex:
+    """
+    A sorted set of timestamps of images that were already found.
+
+    Checking whether a timestamp is within a number of days of any found
+    timestamp is a binary search instead of a scan over all of them.
+    """
+
+    def __init__(self, timestamps: Iterable[datetime | date] = ()) -> None:
+        self._sorted = sorted({_seconds(timestamp) for timestamp in timestamps})
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def __contains__(self, timestamp: datetime | date) -> bool:
+        seconds = _seconds(timestamp)
+        i = bisect_right(self._sorted, seconds)
+        return i > 0 and self._sorted[i - 1] == seconds
+
+    def add(self, timestamp: datetime | date) -> None:
+        if timestamp not in self:
+            insort(self._sorted, _seconds(timestamp))
+
+    def is_inside_range(self, timestamp: datetime | date, days_range: int) -> bool:
+        """Whether a found timestamp is within `days_range` days of `timestamp`."""
+        low, high = _day_range_bounds(_seconds(timestamp), days_range)
+        return bisect_right(self._sorted, low) < bisect_right(self._sorted, high)
+
+    def thin_captures(
+        self, captures: list[CaptureT], days_range: int | None
+    ) -> list[CaptureT]:
+        """
+        Drop the captures that would be skipped against the found timestamps.
+
+        A capture is skipped if its timestamp was already found or, unless
+        `days_range` is None, if it is within `days_range` days of a found
+        timestamp. All captures are checked at once before any download.
+        """
+        if not captures or not self._sorted:
+            return captures
+        found = np.asarray(self._sorted)
+        checks = np.fromiter(
+            (
+                _seconds(capture.timestamp.replace(microsecond=0))
+                for capture in captures
+            ),
+            dtype=np.float64,
+            count=len(captures),
+        )
+        i = np.searchsorted(found, checks, side='right')
+        skipped = found[np.maximum(i - 1, 0)] == checks
+        if days_range is not None:
+            low, high = _day_range_bounds(checks, days_range)
+            skipped |= np.searchsorted(found, low, side='right') < np.searchsorted(
+                found, high, side='right'
+            )
+        return [capture for capture, skip in zip(captures, skipped) if not skip]
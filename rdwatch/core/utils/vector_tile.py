@@ -0,0 +1,407 @@
+import math
+from typing import Any, Literal
+
+from pydantic import UUID4
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    Case,
+    CharField,
+    Exists,
+    F,
+    Field,
+    Func,
+    IntegerField,
+    OuterRef,
+    Q,
+    QuerySet,
+    Value,
+    When,
+)
+
+from rdwatch.core.db.functions import BoundingBoxSize, ExtractEpoch
+from rdwatch.core.models import ModelRun, Region, SiteEvaluation, SiteObservation
+
+# Width of a vector tile in grid units
+MVT_EXTENT = 4096
+# Width of the web mercator projection in meters
+WEB_MERCATOR_WIDTH = 2 * math.pi * 6378137
+
+# Aggregates of the properties of clustered points, formatted with the column
+FIRST = '(ARRAY_AGG({column} ORDER BY {column}))[1]'
+MINIMUM = 'MIN({column})'
+MAXIMUM = 'MAX({column})'
+SUM = 'SUM({column})'
+
+# Clustered points are grouped by properties the map styles and filters
+# depend on, and every other property is aggregated
+EVALUATION_CLUSTER_GROUP_BY = [
+    'configuration_id',
+    'configuration_name',
+    'label',
+    'performer_id',
+    'performer_name',
+    'region',
+    'groundtruth',
+    'site_polygon',
+]
+EVALUATION_CLUSTER_AGGREGATES = {
+    'id': FIRST,
+    'uuid': FIRST,
+    'timestamp': MAXIMUM,
+    'timemin': MINIMUM,
+    'timemax': MAXIMUM,
+    'site_number': MINIMUM,
+}
+OBSERVATION_CLUSTER_GROUP_BY = [
+    'configuration_id',
+    'configuration_name',
+    'site_label',
+    'label',
+    'performer_id',
+    'performer_name',
+    'region',
+    'groundtruth',
+]
+OBSERVATION_CLUSTER_AGGREGATES = {
+    'id': FIRST,
+    'site_number': MINIMUM,
+    'area': SUM,
+    'timemin': MINIMUM,
+    'timemax': MAXIMUM,
+    'version': MAXIMUM,
+}
+
+
+def get_tile_resolution(z: int) -> float:
+    """Get the width in meters of a vector tile grid unit at zoom `z`."""
+    return WEB_MERCATOR_WIDTH / (2**z * MVT_EXTENT)
+
+
+def get_tile_envelope(z: int, x: int, y: int) -> Func:
+    return Func(z, x, y, function='ST_TileEnvelope')
+
+
+def intersects_tile(geometry: Any, z: int, x: int, y: int) -> Q:
+    return Q(
+        Func(
+            geometry,
+            get_tile_envelope(z, x, y),
+            function='ST_Intersects',
+            output_field=BooleanField(),
+        )
+    )
+
+
+def as_mvt_geom(geom: Any, z: int, x: int, y: int, point: Any = None) -> Func:
+    """
+    Get the vector tile geometry of `geom`, simplified to the tile's grid,
+    or of `point` where `geom` is null.
+    """
+    geometry: Any = Func(
+        geom,
+        Value(get_tile_resolution(z)),
+        function='ST_SimplifyPreserveTopology',
+        output_field=Field(),
+    )
+    if point is not None:
+        geometry = Func(geometry, point, function='COALESCE', output_field=Field())
+    return Func(
+        geometry,
+        get_tile_envelope(z, x, y),
+        function='ST_AsMVTGeom',
+        output_field=Field(),
+    )
+
+
+def tile_features(
+    queryset: QuerySet,
+    z: int,
+    x: int,
+    y: int,
+    point: str | None = None,
+    drop_small: bool = True,
+    **properties: Any,
+) -> QuerySet:
+    """
+    Select the features of `queryset` in a vector tile, in one scan of its
+    `geom` and `point` fields.
+
+    Features have an `mvtgeom` column, every field of the model except
+    geometries and ones replaced by `properties`, and `properties`. Unless
+    `drop_small` is False, polygons smaller than
+    `VECTOR_TILE_MIN_FEATURE_SIZE` grid units are left out.
+    """
+    # An OR of the two tests can still use the spatial index of each field
+    intersects = intersects_tile('geom', z, x, y)
+    if point is not None:
+        intersects |= intersects_tile(point, z, x, y)
+    queryset = queryset.filter(intersects)
+
+    if drop_small:
+        min_size = settings.VECTOR_TILE_MIN_FEATURE_SIZE * get_tile_resolution(z)
+        large = Q(tile_feature_size__gte=min_size)
+        if point is not None:
+            large |= Q(**{f'{point}__isnull': False})
+        queryset = queryset.alias(tile_feature_size=BoundingBoxSize('geom')).filter(
+            large
+        )
+
+    fields = [
+        field.attname
+        for field in queryset.model._meta.concrete_fields
+        if not isinstance(field, GeometryField) and field.attname not in properties
+    ]
+    return queryset.values(*fields).annotate(
+        mvtgeom=as_mvt_geom('geom', z, x, y, point=point),
+        **properties,
+    )
+
+
+class VectorTileQuery:
+    """
+    A vector tile rendered with a single query.
+
+    Sources are queries of features with an `mvtgeom` column, and each is
+    run once however many layers select from it. A layer can select only
+    the points or the polygons of its source, so one scan of a table that
+    has both feeds a layer of each.
+    """
+
+    def __init__(self) -> None:
+        self.sources: list[tuple[str, str, tuple]] = []
+        self.layers: list[tuple[str, str, tuple]] = []
+
+    def add_source(self, name: str, queryset: QuerySet) -> None:
+        sql, params = queryset.query.sql_with_params()
+        self.sources.append((name, sql, tuple(params)))
+
+    def add_layer(
+        self,
+        layer: str,
+        source: str,
+        geometry: Literal['point', 'polygon'] | None = None,
+    ) -> None:
+        sql = f'SELECT * FROM {source}'
+        if geometry == 'point':
+            sql += ' WHERE ST_Dimension(mvtgeom) = 0'
+        elif geometry == 'polygon':
+            sql += ' WHERE ST_Dimension(mvtgeom) > 0'
+        self.layers.append((layer, sql, ()))
+
+    def add_cluster_layer(
+        self,
+        layer: str,
+        source: str,
+        size: int,
+        group_by: list[str],
+        aggregates: dict[str, str],
+    ) -> None:
+        """
+        Add a layer of the points of `source`, clustered into one feature per
+        cell of `size` grid units and combination of `group_by` properties.
+        Clusters are drawn at the centroid of their points, with their number
+        of points as the `count` property.
+        """
+        columns = [f'"{column}"' for column in group_by]
+        for column, aggregate in aggregates.items():
+            quoted = f'"{column}"'
+            columns.append(f'{aggregate.format(column=quoted)} AS {quoted}')
+        columns += [
+            'COUNT(*) AS "count"',
+            'ST_SnapToGrid(ST_Centroid(ST_Collect("mvtgeom")), 1) AS "mvtgeom"',
+        ]
+        group_by_columns = [
+            'ST_SnapToGrid("mvtgeom", %s)',
+            *(f'"{column}"' for column in group_by),
+        ]
+        sql = f"""
+            SELECT {', '.join(columns)}
+            FROM {source}
+            WHERE ST_Dimension("mvtgeom") = 0
+            GROUP BY {', '.join(group_by_columns)}
+        """
+        self.layers.append((layer, sql, (size,)))
+
+    def sql_with_params(self) -> tuple[str, tuple]:
+        sources = ',\n'.join(f'{name} AS ({sql})' for name, sql, _ in self.sources)
+        layers = '\n||\n'.join(
+            f"""(
+                SELECT ST_AsMVT(layer.*, %s, {MVT_EXTENT}, 'mvtgeom')
+                FROM ({sql}) AS layer
+            )"""
+            for _, sql, _ in self.layers
+        )
+        sql = f"""
+            WITH
+                {sources}
+            SELECT (
+                {layers}
+            )
+        """
+        params: tuple = ()
+        for _, _, source_params in self.sources:
+            params += source_params
+        for layer, _, layer_params in self.layers:
+            params += (layer,) + layer_params
+        return sql, params
+
+    def render(self, using: str = 'default') -> bytes:
+        with connections[using].cursor() as cursor:
+            cursor.execute(*self.sql_with_params())
+            row = cursor.fetchone()
+        return bytes(row[0]) if row[0] is not None else b''
+
+
+def _model_run_properties(
+    model_run: dict[str, Any] | None, prefix: str
+) -> dict[str, Any]:
+    if model_run is None:
+        return {
+            'configuration_name': F(f'{prefix}title'),
+            'performer_id': F(f'{prefix}performer_id'),
+            'performer_name': F(f'{prefix}performer__short_code'),
+            'region': F(f'{prefix}region__name'),
+        }
+    # Every feature of a single model run shares these, so they are query
+    # parameters rather than joins
+    return {
+        'configuration_name': Value(model_run['title'], output_field=CharField()),
+        'performer_id': Value(model_run['performer_id'], output_field=IntegerField()),
+        'performer_name': Value(
+            model_run['performer__short_code'], output_field=CharField()
+        ),
+        'region': Value(model_run['region__name'], output_field=CharField()),
+    }
+
+
+def _groundtruth(model_run: dict[str, Any] | None, prefix: str, score: str) -> Any:
+    # Only sites from TE with a score of 1 are ground truth
+    if model_run is None:
+        return Case(
+            When(Q(**{f'{prefix}performer__short_code': 'TE', score: 1}), True),
+            default=False,
+        )
+    if model_run['performer__short_code'] != 'TE':
+        return Value(False)
+    return Case(When(Q(**{score: 1}), True), default=False)
+
+
+def evaluation_properties(model_run: dict[str, Any] | None = None) -> dict[str, Any]:
+    """
+    Get the vector tile properties of site evaluations, of a single model run
+    if its `title`, `performer_id`, `performer__short_code` and
+    `region__name` are given.
+    """
+    return {
+        'id': F('pk'),
+        'uuid': F('pk'),  # maintain consistency with scoring DB for clicking on items
+        'configuration_id': F('configuration_id'),
+        'label': F('label_slug'),
+        'timestamp': ExtractEpoch('timestamp'),
+        'timemin': ExtractEpoch('start_date'),
+        'timemax': ExtractEpoch('end_date'),
+        'groundtruth': _groundtruth(model_run, 'configuration__', 'score'),
+        'site_number': F('number'),
+        'site_polygon': ~Exists(
+            SiteObservation.objects.filter(siteeval=OuterRef('pk'))
+        ),
+        **_model_run_properties(model_run, 'configuration__'),
+    }
+
+
+def observation_properties(model_run: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Get the vector tile properties of site observations, see `evaluation_properties`."""
+    return {
+        'id': F('pk'),
+        'configuration_id': F('siteeval__configuration_id'),
+        'site_label': F('siteeval__label_slug'),
+        'site_number': F('siteeval__number'),
+        'label': F('label_slug'),
+        'timemin': ExtractEpoch('timestamp'),
+        'timemax': ExtractEpoch('next_timestamp'),
+        'version': F('siteeval__version'),
+        'groundtruth': _groundtruth(
+            model_run, 'siteeval__configuration__', 'siteeval__score'
+        ),
+        **_model_run_properties(model_run, 'siteeval__configuration__'),
+    }
+
+
+def render_vector_tile(model_run_id: UUID4, z: int, x: int, y: int) -> bytes:
+    """
+    Render a model run's vector tile with a single `ST_AsMVT` query.
+
+    Polygons are simplified to the tile's grid, and ones smaller than
+    `VECTOR_TILE_MIN_FEATURE_SIZE` grid units are left out. Up to
+    `VECTOR_TILE_CLUSTER_MAX_ZOOM`, points are clustered into cells of
+    `VECTOR_TILE_CLUSTER_SIZE` grid units.
+    """
+    model_run = (
+        ModelRun.objects.filter(pk=model_run_id)
+        .values('title', 'performer_id', 'performer__short_code', 'region__name')
+        .first()
+    )
+    if model_run is None:
+        return b''
+
+    tile = VectorTileQuery()
+    tile.add_source(
+        'evaluations',
+        tile_features(
+            SiteEvaluation.objects.filter(configuration_id=model_run_id),
+            z,
+            x,
+            y,
+            point='point',
+            **evaluation_properties(model_run),
+        ),
+    )
+    tile.add_source(
+        'observations',
+        tile_features(
+            SiteObservation.objects.filter(siteeval__configuration_id=model_run_id),
+            z,
+            x,
+            y,
+            point='point',
+            **observation_properties(model_run),
+        ),
+    )
+    tile.add_source(
+        'regions',
+        tile_features(
+            Region.objects.filter(model_runs__id=model_run_id),
+            z,
+            x,
+            y,
+            drop_small=False,
+            name=F('name'),
+        ),
+    )
+
+    tile.add_layer(f'sites-{model_run_id}', 'evaluations', 'polygon')
+    tile.add_layer(f'observations-{model_run_id}', 'observations', 'polygon')
+    tile.add_layer(f'regions-{model_run_id}', 'regions')
+    if z <= settings.VECTOR_TILE_CLUSTER_MAX_ZOOM:
+        tile.add_cluster_layer(
+            f'sites_points-{model_run_id}',
+            'evaluations',
+            settings.VECTOR_TILE_CLUSTER_SIZE,
+            EVALUATION_CLUSTER_GROUP_BY,
+            EVALUATION_CLUSTER_AGGREGATES,
+        )
+        tile.add_cluster_layer(
+            f'observations_points-{model_run_id}',
+            'observations',
+            settings.VECTOR_TILE_CLUSTER_SIZE,
+            OBSERVATION_CLUSTER_GROUP_BY,
+            OBSERVATION_CLUSTER_AGGREGATES,
+        )
+    else:
+        tile.add_layer(f'sites_points-{model_run_id}', 'evaluations', 'point')
+        tile.add_layer(f'observations_points-{model_run_id}', 'observations', 'point')
+    return tile.render()
@@ -0,0 +1,183 @@
+import logging
+import tempfile
+from uuid import uuid4
+
+import mercantile
+from pmtiles.reader import Reader
+from pmtiles.tile import Compression, TileType, zxy_to_tileid
+from pmtiles.writer import Writer
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from rdwatch.core.models import ModelRun, VectorTileArchive
+from rdwatch.core.utils.storage import read_range
+from rdwatch.core.utils.vector_tile import render_vector_tile
+from rdwatch.core.utils.vector_tile_generation import start_vector_tile_generation
+
+logger = logging.getLogger(__name__)
+
+# The header and root directory of a PMTiles archive are within its first
+# 16KiB, which is cached so a tile only takes one or two range reads
+ARCHIVE_PREFIX_LENGTH = 16384
+
+VECTOR_LAYERS = [
+    'sites',
+    'observations',
+    'regions',
+    'sites_points',
+    'observations_points',
+]
+
+
+def _get_archive_bbox(model_run: ModelRun) -> tuple[float, float, float, float] | None:
+    """Get the bounds of everything drawn in a model run's vector tiles."""
+    extents = []
+    if model_run.cached_bbox:
+        extents.append(model_run.cached_bbox.extent)
+    if model_run.region.geom:
+        extents.append(model_run.region.geom.transform(4326, clone=True).extent)
+    if not extents:
+        return None
+    return (
+        max(min(extent[0] for extent in extents), -180.0),
+        max(min(extent[1] for extent in extents), -85.0511),
+        min(max(extent[2] for extent in extents), 180.0),
+        min(max(extent[3] for extent in extents), 85.0511),
+    )
+
+
+def _get_archive_tiles(
+    bbox: tuple[float, float, float, float],
+) -> tuple[list[tuple[int, int, int]], int]:
+    """
+    Get the tiles over `bbox` to build, from zoom 0 up to the highest zoom
+    that keeps the archive within `VECTOR_TILE_ARCHIVE_MAX_TILES`.
+    """
+    tiles: list[tuple[int, int, int]] = []
+    max_zoom = -1
+    for z in range(settings.VECTOR_TILE_ARCHIVE_MAX_ZOOM + 1):
+        zoom_tiles = [(tile.z, tile.x, tile.y) for tile in mercantile.tiles(*bbox, z)]
+        if len(tiles) + len(zoom_tiles) > settings.VECTOR_TILE_ARCHIVE_MAX_TILES:
+            break
+        tiles.extend(zoom_tiles)
+        max_zoom = z
+    # Tiles are written in tile ID order, so the archive is clustered
+    tiles.sort(key=lambda tile: zxy_to_tileid(*tile))
+    return tiles, max_zoom
+
+
+def build_vector_tile_archive(model_run_id: str) -> VectorTileArchive | None:
+    """
+    Render a model run's vector tiles from zoom 0 up to
+    `VECTOR_TILE_ARCHIVE_MAX_ZOOM` into a single PMTiles archive in storage.
+
+    The archive is tagged with the cache generation of the model run's
+    vector tiles when the build started, so tiles are only served from it
+    until the generation is bumped by the next change to the model run.
+    """
+    model_run = ModelRun.objects.select_related('region').get(pk=model_run_id)
+    generation = start_vector_tile_generation(model_run.pk)
+    bbox = _get_archive_bbox(model_run)
+    if bbox is None:
+        return None
+    tiles, max_zoom = _get_archive_tiles(bbox)
+    if max_zoom < 0:
+        return None
+
+    with tempfile.TemporaryFile() as f:
+        writer = Writer(f)
+        written = 0
+        for z, x, y in tiles:
+            tile = render_vector_tile(model_run.pk, z, x, y)
+            if tile:
+                writer.write_tile(zxy_to_tileid(z, x, y), tile)
+                written += 1
+
+        if written:
+            writer.finalize(
+                {
+                    'tile_type': TileType.MVT,
+                    'tile_compression': Compression.NONE,
+                    'min_lon_e7': int(bbox[0] * 10_000_000),
+                    'min_lat_e7': int(bbox[1] * 10_000_000),
+                    'max_lon_e7': int(bbox[2] * 10_000_000),
+                    'max_lat_e7': int(bbox[3] * 10_000_000),
+                },
+                {
+                    'name': model_run.title,
+                    'vector_layers': [
+                        {'id': f'{layer}-{model_run.pk}'} for layer in VECTOR_LAYERS
+                    ],
+                },
+            )
+
+        name = None
+        if written:
+            # Archives are never overwritten, so cached parts of the previous
+            # one can't be mixed up with the new one
+            f.seek(0)
+            name = default_storage.save(
+                f'{settings.VECTOR_TILE_ARCHIVE_PREFIX}/{model_run.pk}/{uuid4()}.pmtiles',
+                File(f),
+            )
+
+    # Builds of the same model run may overlap, the archive row is locked so
+    # exactly one file is kept and every other one is deleted
+    with transaction.atomic():
+        archive, created = VectorTileArchive.objects.select_for_update().get_or_create(
+            model_run=model_run,
+            defaults={'generation': generation, 'max_zoom': max_zoom, 'archive': name},
+        )
+        if created:
+            replaced = None
+        elif archive.generation > generation:
+            # A build that started after this one already finished
+            replaced = name
+        else:
+            replaced = archive.archive.name if archive.archive else None
+            archive.generation = generation
+            archive.max_zoom = max_zoom
+            # Empty if every tile is empty
+            archive.archive = name
+            archive.save()
+
+    if replaced:
+        default_storage.delete(replaced)
+    logger.info(
+        f'Built {written} vector tiles up to zoom {max_zoom} for model run {model_run.pk}'
+    )
+    return archive
+
+
+def _archive_source(name: str):
+    prefix_key = f'vector-tile-archive|{name}'
+
+    def get_bytes(offset: int, length: int) -> bytes:
+        if offset + length <= ARCHIVE_PREFIX_LENGTH:
+            prefix = cache.get(prefix_key)
+            if prefix is None:
+                prefix = read_range(name, 0, ARCHIVE_PREFIX_LENGTH)
+                cache.set(
+                    prefix_key,
+                    prefix,
+                    settings.VECTOR_TILE_ARCHIVE_CACHE_TIMEOUT.total_seconds(),
+                )
+            return prefix[offset : offset + length]
+        return read_range(name, offset, length)
+
+    return get_bytes
+
+
+def get_archive_tile(archive: VectorTileArchive, z: int, x: int, y: int) -> bytes:
+    """
+    Read a vector tile from a model run's archive with byte range requests.
+    Tiles missing from the archive are empty.
+    """
+    if not archive.archive:
+        return b''
+    reader = Reader(_archive_source(archive.archive.name))
+    return reader.get(z, x, y) or b''
@@ -0,0 +1,61 @@
+import time
+from collections.abc import Iterable
+
+from pydantic import UUID4
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _get_generation_key(model_run_id: UUID4) -> str:
+    return f'vector-tile-generation|{model_run_id}'
+
+
+def get_vector_tile_generation(model_run_id: UUID4) -> int | None:
+    """
+    Get the cache generation of a model run's vector tiles, or None if it
+    hasn't been started yet, see `start_vector_tile_generation`.
+    """
+    return cache.get(_get_generation_key(model_run_id))
+
+
+def start_vector_tile_generation(model_run_id: UUID4) -> int:
+    """
+    Start the cache generation of a model run's vector tiles if there isn't
+    one, and return the current generation.
+
+    Generations start from the current time in nanoseconds, so a model run's
+    generation never goes back to one that was used before it was cleared
+    or evicted from the cache.
+    """
+    key = _get_generation_key(model_run_id)
+    generation = time.time_ns()
+    if cache.add(key, generation, timeout=None):
+        return generation
+    # Another request started it first
+    return cache.get(key, generation)
+
+
+def bump_vector_tile_generation(model_run_id: UUID4) -> None:
+    """
+    Invalidate the cached vector tiles of a model run once the current
+    transaction commits.
+    """
+
+    def bump():
+        try:
+            cache.incr(_get_generation_key(model_run_id))
+        except ValueError:
+            # There is no generation yet, the next one to start is new anyway
+            pass
+
+    transaction.on_commit(bump)
+
+
+def clear_vector_tile_generations(model_run_ids: Iterable[UUID4]) -> None:
+    """
+    Forget the cache generations of deleted model runs once the current
+    transaction commits, so their vector tiles aren't served anymore.
+    """
+    keys = [_get_generation_key(model_run_id) for model_run_id in model_run_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,16 +1,42 @@
 import logging
+from datetime import timedelta
 from typing import Literal
 
-import rasterio  # type: ignore
 import sentry_sdk
 from rio_tiler.io.rasterio import Reader
 from rio_tiler.models import ImageData
-from rio_tiler.utils import pansharpening_brovey
 
+from django.core.cache import cache
+
+from rdwatch.core.utils.pansharpening import pansharpen, read_pan_and_multispectral
+from rdwatch.core.utils.reader_pool import pooled_reader
 from rdwatch.core.utils.worldview_nitf.satellite_captures import WorldViewNITFCapture
 
 logger = logging.getLogger(__name__)
 
+# Channel lookups rarely change for a given file
+COLORINTERP_CACHE_TIMEOUT = timedelta(days=7)
+
+# GDAL options used when reading, open readers are pooled per options
+TILE_ENV_OPTIONS = {
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+    'GDAL_CACHEMAX': 200,
+    'CPL_VSIL_CURL_CACHE_SIZE': 20000000,
+    'GDAL_BAND_BLOCK_CACHE': 'HASHSET',
+    'GDAL_HTTP_MULTIPLEX': 'YES',
+    'GDAL_HTTP_VERSION': 2,
+    'VSI_CACHE': 'TRUE',
+    'VSI_CACHE_SIZE': 5000000,
+}
+BBOX_ENV_OPTIONS = {
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+    'GDAL_HTTP_MULTIPLEX': 'YES',
+    'GDAL_HTTP_VERSION': 2,
+    'CPL_VSIL_CURL_CHUNK_SIZE': 524288,
+}
+
 
 def find_channels(colorinterp):
     rgb_indexes = {}
@@ -37,25 +63,72 @@ def find_channels(colorinterp):
         )
 
 
+def get_rgb_channels(reader: Reader) -> tuple[int, int, int] | int:
+    """Get the RGB (or gray) band indexes of a dataset, cached per URI."""
+    key = f'colorinterp|{reader.input}'
+    colorinterp = cache.get(key)
+    if colorinterp is None:
+        colorinterp = [color.name for color in reader.dataset.colorinterp]
+        cache.set(key, colorinterp, COLORINTERP_CACHE_TIMEOUT.total_seconds())
+    return find_channels(colorinterp)
+
+
 def get_worldview_nitf_tile(
     capture: WorldViewNITFCapture, z: int, x: int, y: int
 ) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_CACHEMAX=200,
-        CPL_VSIL_CURL_CACHE_SIZE=20000000,
-        GDAL_BAND_BLOCK_CACHE='HASHSET',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        VSI_CACHE='TRUE',
-        VSI_CACHE_SIZE=5000000,
-    ):
-        with Reader(input=capture.uri) as vis_img:
-            information = vis_img.info()
-            rgb_channels = find_channels(information.colorinterp)
-            rgb = vis_img.tile(x, y, z, tilesize=512, indexes=rgb_channels)
-        return rgb.render(img_format='WEBP')
+    with pooled_reader(capture.uri, **TILE_ENV_OPTIONS) as vis_img:
+        rgb_channels = get_rgb_channels(vis_img)
+        rgb = vis_img.tile(x, y, z, tilesize=512, indexes=rgb_channels)
+    return rgb.render(img_format='WEBP')
+
+
+def get_worldview_nitf_bbox_image(
+    capture: WorldViewNITFCapture,
+    bbox: tuple[float, float, float, float],
+    scale: Literal['default', 'bits'] = 'bits',
+    max_size: int | None = None,
+) -> ImageData | None:
+    logger.info(f'Downloading WorldView NITF bbox: {bbox} scale: {scale}')
+
+    def read_pan() -> ImageData | None:
+        if capture.panuri is None:
+            return None
+        with pooled_reader(capture.panuri, **BBOX_ENV_OPTIONS) as pan_img:
+            return pan_img.part(bbox=bbox, dst_crs='epsg:4326', max_size=max_size)
+
+    def read_vis() -> ImageData | None:
+        with pooled_reader(capture.uri, **BBOX_ENV_OPTIONS) as vis_img:
+            rgb_channels = get_rgb_channels(vis_img)
+            return vis_img.part(
+                bbox=bbox,
+                dst_crs='epsg:4326',
+                indexes=rgb_channels,
+                max_size=max_size,
+            )
+
+    try:
+        pan_chip, vis_chip = read_pan_and_multispectral(read_pan, read_vis)
+    except ValueError as e:
+        logger.info(f'Value Error: {e} - {capture.uri} {capture.panuri}')
+        sentry_sdk.capture_exception(e)
+        return None
+
+    if pan_chip:
+        final_chip = pansharpen(vis_chip, pan_chip)
+    else:
+        final_chip = vis_chip
+
+    statistics = list(final_chip.statistics().values())
+    if scale == 'default':
+        in_range = tuple((item.min, item.max) for item in statistics)
+    elif scale == 'bits':
+        in_range = tuple(
+            (item['percentile_2'], item['percentile_98']) for item in statistics
+        )
+    elif isinstance(scale, list) and len(scale) == 2:  # scale is an integeter range
+        in_range = tuple((scale[0], scale[1]) for item in statistics)
+    final_chip.rescale(in_range=in_range)
+    return final_chip
 
 
 def get_worldview_nitf_bbox(
@@ -63,65 +136,9 @@ def get_worldview_nitf_bbox(
     bbox: tuple[float, float, float, float],
     format='PNG',
     scale: Literal['default', 'bits'] = 'bits',
-) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        CPL_VSIL_CURL_CHUNK_SIZE=524288,
-    ):
-        logger.info(f'Downloading WorldView NITF bbox: {bbox} scale: {scale}')
-        with Reader(input=capture.uri) as vis_img:
-            pan_chip = None
-            if capture.panuri is not None:
-                with Reader(input=capture.panuri) as pan_img:
-                    try:
-                        pan_chip = pan_img.part(bbox=bbox, dst_crs='epsg:4326')
-                    except ValueError as e:
-                        logger.info(f'Value Error: {e} - {capture.panuri}')
-                        sentry_sdk.capture_exception(e)
-                        return None
-            size = (
-                {'width': pan_chip.width, 'height': pan_chip.height} if pan_chip else {}
-            )
-            information = vis_img.info()
-            rgb_channels = find_channels(information.colorinterp)
-            if all(
-                channel is not None for channel in rgb_channels
-            ):  # Ensure all RGB channels exist
-                try:
-                    vis_chip = vis_img.part(
-                        bbox=bbox,
-                        dst_crs='epsg:4326',
-                        indexes=rgb_channels,
-                        **size,
-                    )
-                except ValueError as e:
-                    logger.info(f'Value Error: {e} - {capture.uri}')
-                    sentry_sdk.capture_exception(e)
-                    return None
-                if pan_chip:
-                    final_chip = ImageData(
-                        pansharpening_brovey(
-                            vis_chip.data, pan_chip.data, 0.2, 'uint16'
-                        )
-                    )
-                else:
-                    final_chip = vis_chip
-
-                statistics = list(final_chip.statistics().values())
-                if scale == 'default':
-                    in_range = tuple((item.min, item.max) for item in statistics)
-                elif scale == 'bits':
-                    in_range = tuple(
-                        (item['percentile_2'], item['percentile_98'])
-                        for item in statistics
-                    )
-                elif (
-                    isinstance(scale, list) and len(scale) == 2
-                ):  # scale is an integeter range
-                    in_range = tuple((scale[0], scale[1]) for item in statistics)
-                final_chip.rescale(in_range=in_range)
-                return final_chip.render(img_format=format)
-    return None
+    max_size: int | None = None,
+) -> bytes | None:
+    final_chip = get_worldview_nitf_bbox_image(capture, bbox, scale, max_size)
+    if final_chip is None:
+        return None
+    return final_chip.render(img_format=format)
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from typing import cast
 
 from rdwatch.core.utils.capture import URICapture
-from rdwatch.core.utils.worldview_nitf.stac_search import worldview_search
+from rdwatch.core.utils.worldview_nitf.stac_search import Feature, worldview_search
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +39,11 @@ def get_captures(
         timebuffer = timedelta(hours=1)
 
     features = [f for f in get_features(timestamp, bbox, timebuffer=timebuffer)]
+    return get_captures_from_features(features)
+
+
+def get_captures_from_features(features: list[Feature]) -> list[WorldViewNITFCapture]:
+    """Build the captures for STAC features that have already been searched for."""
     vis_captures: list[WorldViewNITFCapture] = []
     pan_captures: list[WorldViewNITFCapture] = []
     for feature in features:
@@ -2,10 +2,10 @@ import logging
 from datetime import datetime, timedelta
 from typing import Literal, TypedDict, cast
 
-from pystac_client import Client
-
 from django.conf import settings
 
+from rdwatch.core.utils.stac_cache import cached_stac_search
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,11 +57,6 @@ def worldview_search(
     bbox: tuple[float, float, float, float],
     timebuffer: timedelta | None = None,
 ) -> Results:
-    stac_catalog = Client.open(
-        settings.SMART_STAC_URL,
-        headers={'x-api-key': settings.SMART_STAC_KEY},
-    )
-
     if timebuffer is not None:
         min_time = timestamp - timebuffer
         max_time = timestamp + timebuffer
@@ -69,15 +64,13 @@ def worldview_search(
     else:
         time_str = f'{_fmt_time(timestamp)}Z'
 
-    results = stac_catalog.search(
+    features = cached_stac_search(
+        settings.SMART_STAC_URL,
+        COLLECTIONS,
+        bbox,
+        time_str,
         method='GET',
-        bbox=bbox,
-        datetime=time_str,
-        collections=COLLECTIONS,
-        limit=100,
+        headers={'x-api-key': settings.SMART_STAC_KEY},
     )
 
-    # TODO: return `results` directly instead of converting to a dict.
-    # Before that can happen, the callers need to be updated to handle
-    # an `ItemSearch` object.
-    return cast(Results, results.item_collection_as_dict())
+    return cast(Results, {'type': 'FeatureCollection', 'features': features})
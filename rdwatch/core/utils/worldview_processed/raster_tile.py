@@ -2,50 +2,82 @@ import logging
 import time
 from typing import Literal
 
-import rasterio  # type: ignore
 from rio_tiler.io.rasterio import Reader
-from rio_tiler.utils import pansharpening_brovey
+from rio_tiler.models import ImageData
 
+from rdwatch.core.utils.metatile import (
+    Metatile,
+    TileZXY,
+    read_metatile,
+    render_metatile,
+)
+from rdwatch.core.utils.pansharpening import pansharpen, read_pan_and_multispectral
+from rdwatch.core.utils.reader_pool import pooled_reader
 from rdwatch.core.utils.worldview_processed.satellite_captures import (
     WorldViewProcessedCapture,
 )
 
 logger = logging.getLogger(__name__)
 
+# GDAL options used when reading, open readers are pooled per options
+READ_ENV_OPTIONS = {
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+    'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+    'GDAL_CACHEMAX': 200,
+    'CPL_VSIL_CURL_CACHE_SIZE': 20000000,
+    'GDAL_BAND_BLOCK_CACHE': 'HASHSET',
+    'GDAL_HTTP_MULTIPLEX': 'YES',
+    'GDAL_HTTP_VERSION': 2,
+    'VSI_CACHE': 'TRUE',
+    'VSI_CACHE_SIZE': 5000000,
+}
+
 
 def get_worldview_processed_visual_tile(
     capture: WorldViewProcessedCapture, z: int, x: int, y: int
 ) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_CACHEMAX=200,
-        CPL_VSIL_CURL_CACHE_SIZE=20000000,
-        GDAL_BAND_BLOCK_CACHE='HASHSET',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        VSI_CACHE='TRUE',
-        VSI_CACHE_SIZE=5000000,
-    ):
-        if not capture.panuri:
-            with Reader(input=capture.uri) as img:
-                rgb = img.tile(x, y, z, tilesize=512)
-        if capture.panuri:
-            logger.info(f'PAN URI: {capture.panuri}')
-            with Reader(input=capture.panuri) as img:
-                pan = img.tile(
-                    x,
-                    y,
-                    z,
-                    tilesize=512,
-                )
-                with Reader(input=capture.uri) as rgbimg:
-                    rgb = rgbimg.tile(x, y, z, tilesize=512)
-                    rgb = rgb.from_array(
-                        pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
-                    )
-            rgb.rescale(in_range=((0, 255),))
-        return rgb.render(img_format='WEBP')
+    if not capture.panuri:
+        with pooled_reader(capture.uri, **READ_ENV_OPTIONS) as img:
+            rgb = img.tile(x, y, z, tilesize=512)
+    if capture.panuri:
+        logger.info(f'PAN URI: {capture.panuri}')
+
+        def read_pan() -> ImageData:
+            with pooled_reader(capture.panuri, **READ_ENV_OPTIONS) as img:
+                return img.tile(x, y, z, tilesize=512)
+
+        def read_rgb() -> ImageData:
+            with pooled_reader(capture.uri, **READ_ENV_OPTIONS) as img:
+                return img.tile(x, y, z, tilesize=512)
+
+        pan, rgb = read_pan_and_multispectral(read_pan, read_rgb)
+        rgb = pansharpen(rgb, pan)
+        rgb.rescale(in_range=((0, 255),))
+    return rgb.render(img_format='WEBP')
+
+
+def get_worldview_processed_visual_metatile(
+    capture: WorldViewProcessedCapture, metatile: Metatile
+) -> dict[TileZXY, bytes]:
+    """
+    Render every tile of a metatile, as `get_worldview_processed_visual_tile`
+    would, reading the pan and RGB COGs once for all of them.
+    """
+
+    def read(uri: str) -> ImageData:
+        with pooled_reader(uri, **READ_ENV_OPTIONS) as img:
+            return read_metatile(img, metatile, 512)
+
+    panuri = capture.panuri
+    if not panuri:
+        rgb = read(capture.uri)
+    else:
+        pan, rgb = read_pan_and_multispectral(
+            lambda: read(panuri), lambda: read(capture.uri)
+        )
+        rgb = pansharpen(rgb, pan)
+        rgb.rescale(in_range=((0, 255),))
+    return render_metatile(rgb, metatile, 512)
 
 
 def get_cog_image(uri, bbox):
@@ -53,52 +85,54 @@ def get_cog_image(uri, bbox):
         return img.part(bbox)
 
 
+def get_worldview_processed_visual_bbox_image(
+    capture: WorldViewProcessedCapture,
+    bbox: tuple[float, float, float, float],
+    scale: Literal['default', 'bits'] = 'bits',
+    max_size: int | None = None,
+) -> ImageData:
+    startTime = time.time()
+    if not capture.panuri:
+        logger.info(f'Image URI: {capture.uri}')
+        with pooled_reader(capture.uri, **READ_ENV_OPTIONS) as img:
+            rgb = img.part(bbox, max_size=max_size)
+        logger.info(f'RGB Download Time: {time.time() - startTime}')
+
+    if capture.panuri:
+        logger.info(f'Pan URI: {capture.panuri}')
+
+        def read_pan() -> ImageData:
+            with pooled_reader(capture.panuri, **READ_ENV_OPTIONS) as img:
+                return img.part(bbox, max_size=max_size)
+
+        def read_rgb() -> ImageData:
+            with pooled_reader(capture.uri, **READ_ENV_OPTIONS) as img:
+                return img.part(bbox, max_size=max_size)
+
+        pan, rgb = read_pan_and_multispectral(read_pan, read_rgb)
+        logger.info(f'Pan and RGB Download Time: {time.time() - startTime}')
+        logger.info(f'PanSharpening: {capture.panuri}')
+        rgb = pansharpen(rgb, pan)
+        logger.info(f'Pan Sharpening Time: {time.time() - startTime}')
+
+    if scale == 'default':
+        rgb.rescale(in_range=((0, 255),))
+    elif scale == 'bits':
+        if capture.bits_per_pixel != 8:
+            max_bits = 2**capture.bits_per_pixel - 1
+            rgb.rescale(in_range=((0, max_bits),))
+    elif isinstance(scale, list) and len(scale) == 2:  # scale is an integeter range
+        rgb.rescale(in_range=((scale[0], scale[1]),))
+
+    return rgb
+
+
 def get_worldview_processed_visual_bbox(
     capture: WorldViewProcessedCapture,
     bbox: tuple[float, float, float, float],
     format='PNG',
     scale: Literal['default', 'bits'] = 'bits',
+    max_size: int | None = None,
 ) -> bytes:
-    with rasterio.Env(
-        GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
-        GDAL_HTTP_MERGE_CONSECUTIVE_RANGES='YES',
-        GDAL_CACHEMAX=200,
-        CPL_VSIL_CURL_CACHE_SIZE=20000000,
-        GDAL_BAND_BLOCK_CACHE='HASHSET',
-        GDAL_HTTP_MULTIPLEX='YES',
-        GDAL_HTTP_VERSION=2,
-        VSI_CACHE='TRUE',
-        VSI_CACHE_SIZE=5000000,
-    ):
-        startTime = time.time()
-        if not capture.panuri:
-            logger.info(f'Image URI: {capture.uri}')
-            with Reader(input=capture.uri) as img:
-                logger.info(f'Base Info Time: {time.time() - startTime}')
-                rgb = img.part(bbox)
-                logger.info(f'RGB Download Time: {time.time() - startTime}')
-
-        if capture.panuri:
-            logger.info(f'Pan URI: {capture.panuri}')
-            with Reader(input=capture.panuri) as img:
-                pan = img.part(bbox)
-                logger.info(f'Pan Download Time: {time.time() - startTime}')
-                with Reader(input=capture.uri) as rgbimg:
-                    rgb = rgbimg.part(bbox, width=pan.width, height=pan.height)
-                    logger.info(f'RGB Download Time: {time.time() - startTime}')
-                    logger.info(f'PanSharpening: {capture.panuri}')
-                    rgb = rgb.from_array(
-                        pansharpening_brovey(rgb.data, pan.data, 0.2, 'uint16')
-                    )
-                    logger.info(f'Pan Sharpening Time: {time.time() - startTime}')
-
-        if scale == 'default':
-            rgb.rescale(in_range=((0, 255),))
-        elif scale == 'bits':
-            if capture.bits_per_pixel != 8:
-                max_bits = 2**capture.bits_per_pixel - 1
-                rgb.rescale(in_range=((0, max_bits),))
-        elif isinstance(scale, list) and len(scale) == 2:  # scale is an integeter range
-            rgb.rescale(in_range=((scale[0], scale[1]),))
-
-        return rgb.render(img_format=format)
+    rgb = get_worldview_processed_visual_bbox_image(capture, bbox, scale, max_size)
+    return rgb.render(img_format=format)
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from typing import cast
 
 from rdwatch.core.utils.capture import URICapture
-from rdwatch.core.utils.worldview_processed.stac_search import worldview_search
+from rdwatch.core.utils.worldview_processed.stac_search import Feature, worldview_search
 
 
 @dataclass()
@@ -34,7 +34,13 @@ def get_captures(
         timebuffer = timedelta(hours=1)
 
     features = [f for f in get_features(timestamp, bbox, timebuffer=timebuffer)]
+    return get_captures_from_features(features)
 
+
+def get_captures_from_features(
+    features: list[Feature],
+) -> list[WorldViewProcessedCapture]:
+    """Build the captures for STAC features that have already been searched for."""
     captures = []
     for feature in features:
         if 'visual' in feature['assets']:
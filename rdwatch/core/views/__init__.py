@@ -3,18 +3,22 @@ from .satellite_image import (
     all_satellite_timestamps,
     satelliteimage_raster_bbox,
     satelliteimage_raster_tile,
+    satelliteimage_raster_tiles,
     satelliteimage_time_list,
     satelliteimage_visual_bbox,
     satelliteimage_visual_tile,
+    satelliteimage_visual_tiles,
     satelliteimage_visual_time_list,
 )
 from .vector_tile import vector_tile
 
 __all__ = [
     'satelliteimage_raster_tile',
+    'satelliteimage_raster_tiles',
     'satelliteimage_raster_bbox',
     'satelliteimage_time_list',
     'satelliteimage_visual_tile',
+    'satelliteimage_visual_tiles',
     'satelliteimage_visual_bbox',
     'satelliteimage_visual_time_list',
     'all_satellite_timestamps',
@@ -16,6 +16,7 @@ from rdwatch.core.tasks.animation_export import (
     create_modelrun_animation_export,
     create_site_animation_export,
 )
+from rdwatch.core.utils.task_progress import get_task_state
 
 logger = logging.getLogger(__name__)
 
@@ -37,14 +38,11 @@ def generate_download_data(
                 }
             )
         else:
-            task_id = export.celery_id
-            task = AsyncResult(task_id)
+            state, info = get_task_state(export.celery_id)
             celery_data = {}
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, Exception) else task.info
-            )
+            celery_data['state'] = state
+            celery_data['status'] = state
+            celery_data['info'] = str(info) if isinstance(info, Exception) else info
             output.append(
                 {
                     'created': export.created,
@@ -173,14 +171,14 @@ def get_downloaded_modelrun_animation(request: HttpRequest, task_id: UUID4):
 
 @router.get('/{task_id}/status/')
 def get_animation_status(request: HttpRequest, task_id: UUID4):
-    task = AsyncResult(task_id)
+    state, info = get_task_state(task_id)
     celery_data = {}
-    celery_data['state'] = task.state
-    celery_data['status'] = task.status
-    if isinstance(task.info, Exception):
-        celery_data['error'] = str(task.info)
+    celery_data['state'] = state
+    celery_data['status'] = state
+    if isinstance(info, Exception):
+        celery_data['error'] = str(info)
     else:
-        celery_data['info'] = task.info
+        celery_data['info'] = info
     return celery_data
 
 
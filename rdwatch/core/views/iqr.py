@@ -7,26 +7,17 @@ from typing import Literal
 import requests
 from ninja import Router, Schema
 
-from django.contrib.gis.db.models.functions import Area, Transform
 from django.core.files.storage import default_storage
-from django.db import connection
-from django.db.models import (
-    BooleanField,
-    Case,
-    Count,
-    F,
-    Field,
-    Func,
-    Min,
-    Q,
-    When,
-    Window,
-)
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404
 
-from rdwatch.core.db.functions import ExtractEpoch, GroupExcludeRowRange
 from rdwatch.core.models import SiteEvaluation, SiteImage, SiteObservation
+from rdwatch.core.utils.vector_tile import (
+    VectorTileQuery,
+    evaluation_properties,
+    observation_properties,
+    tile_features,
+)
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -297,244 +288,34 @@ def iqr_vector_tile(request: HttpRequest, sid: str, z: int, x: int, y: int):
     site_evals = SiteEvaluation.objects.filter(smqtk_uuid__in=uuids)
     site_ids = [site.id for site in site_evals]
 
-    envelope = Func(z, x, y, function='ST_TileEnvelope')
-    intersects_geom = Q(
-        Func(
-            'geom',
-            envelope,
-            function='ST_Intersects',
-            output_field=BooleanField(),
-        )
-    )
-    intersects_point = Q(
-        Func(
-            'point',
-            envelope,
-            function='ST_Intersects',
-            output_field=BooleanField(),
-        )
+    query = VectorTileQuery()
+    query.add_source(
+        'evaluations',
+        tile_features(
+            SiteEvaluation.objects.filter(id__in=site_ids),
+            z,
+            x,
+            y,
+            point='point',
+            **evaluation_properties(),
+        ),
     )
-    intersects = intersects_point | intersects_geom
-    mvtgeom_point = Func(
-        'point',
-        envelope,
-        function='ST_AsMVTGeom',
-        output_field=Field(),
+    query.add_source(
+        'observations',
+        tile_features(
+            SiteObservation.objects.filter(siteeval__in=site_ids),
+            z,
+            x,
+            y,
+            point='point',
+            **observation_properties(),
+        ),
     )
-    mvtgeom = Func(
-        'geom',
-        envelope,
-        function='ST_AsMVTGeom',
-        output_field=Field(),
-    )
-
-    evaluations_queryset = (
-        SiteEvaluation.objects.filter(id__in=site_ids)
-        .filter(intersects_geom)
-        .values()
-        .alias(observation_count=Count('observations'))
-        .annotate(
-            id=F('pk'),
-            uuid=F('pk'),  # maintain consistency with scoring DB for clicking on items
-            mvtgeom=mvtgeom,
-            configuration_id=F('configuration_id'),
-            configuration_name=F('configuration__title'),
-            label=F('label__slug'),
-            timestamp=ExtractEpoch('timestamp'),
-            timemin=ExtractEpoch('start_date'),
-            timemax=ExtractEpoch('end_date'),
-            performer_id=F('configuration__performer_id'),
-            performer_name=F('configuration__performer__short_code'),
-            region=F('configuration__region__name'),
-            groundtruth=Case(
-                When(
-                    Q(configuration__performer__short_code='TE') & Q(score=1),
-                    True,
-                ),
-                default=False,
-            ),
-            site_number=F('number'),
-            site_polygon=Case(
-                When(
-                    observation_count=0,
-                    then=True,
-                ),
-                default=False,
-            ),
-        )
-    )
-    (
-        evaluations_sql,
-        evaluations_params,
-    ) = evaluations_queryset.query.sql_with_params()
-
-    evaluations_points_queryset = (
-        SiteEvaluation.objects.filter(id__in=site_ids)
-        .filter(intersects_point)
-        .values()
-        .alias(observation_count=Count('observations'))
-        .annotate(
-            id=F('pk'),
-            uuid=F('pk'),  # maintain consistency with scoring DB for clicking on items
-            mvtgeom=mvtgeom_point,
-            configuration_id=F('configuration_id'),
-            configuration_name=F('configuration__title'),
-            label=F('label__slug'),
-            timestamp=ExtractEpoch('timestamp'),
-            timemin=ExtractEpoch('start_date'),
-            timemax=ExtractEpoch('end_date'),
-            performer_id=F('configuration__performer_id'),
-            performer_name=F('configuration__performer__short_code'),
-            region=F('configuration__region__name'),
-            groundtruth=Case(
-                When(
-                    Q(configuration__performer__short_code='TE') & Q(score=1),
-                    True,
-                ),
-                default=False,
-            ),
-            site_number=F('number'),
-            site_polygon=Case(
-                When(
-                    observation_count=0,
-                    then=True,
-                ),
-                default=False,
-            ),
-        )
-    )
-    (
-        evaluations_points_sql,
-        evaluations_points_params,
-    ) = evaluations_points_queryset.query.sql_with_params()
-
-    observations_queryset = (
-        SiteObservation.objects.filter(siteeval__in=site_ids)
-        .filter(intersects)
-        .values()
-        .annotate(
-            id=F('pk'),
-            mvtgeom=mvtgeom,
-            configuration_id=F('siteeval__configuration_id'),
-            configuration_name=F('siteeval__configuration__title'),
-            site_label=F('siteeval__label__slug'),
-            site_number=F('siteeval__number'),
-            label=F('label__slug'),
-            area=Area(Transform('geom', srid=6933)),
-            timemin=ExtractEpoch('timestamp'),
-            timemax=ExtractEpoch(
-                Window(
-                    expression=Min('timestamp'),
-                    partition_by=[F('siteeval')],
-                    frame=GroupExcludeRowRange(start=0, end=None),
-                    order_by='timestamp',  # type: ignore
-                ),
-            ),
-            performer_id=F('siteeval__configuration__performer_id'),
-            performer_name=F('siteeval__configuration__performer__short_code'),
-            region=F('siteeval__configuration__region__name'),
-            version=F('siteeval__version'),
-            groundtruth=Case(
-                When(
-                    Q(siteeval__configuration__performer__short_code='TE')
-                    & Q(siteeval__score=1),
-                    True,
-                ),
-                default=False,
-            ),
-        )
-    )
-    (
-        observations_sql,
-        observations_params,
-    ) = observations_queryset.query.sql_with_params()
-
-    observations_points_queryset = (
-        SiteObservation.objects.filter(siteeval__in=site_ids)
-        .filter(intersects_point)
-        .values()
-        .annotate(
-            id=F('pk'),
-            mvtgeom=mvtgeom_point,
-            configuration_id=F('siteeval__configuration_id'),
-            configuration_name=F('siteeval__configuration__title'),
-            site_label=F('siteeval__label__slug'),
-            site_number=F('siteeval__number'),
-            label=F('label__slug'),
-            area=Area(Transform('geom', srid=6933)),
-            timemin=ExtractEpoch('timestamp'),
-            timemax=ExtractEpoch(
-                Window(
-                    expression=Min('timestamp'),
-                    partition_by=[F('siteeval')],
-                    frame=GroupExcludeRowRange(start=0, end=None),
-                    order_by='timestamp',  # type: ignore
-                ),
-            ),
-            performer_id=F('siteeval__configuration__performer_id'),
-            performer_name=F('siteeval__configuration__performer__short_code'),
-            region=F('siteeval__configuration__region__name'),
-            version=F('siteeval__version'),
-            groundtruth=Case(
-                When(
-                    Q(siteeval__configuration__performer__short_code='TE')
-                    & Q(siteeval__score=1),
-                    True,
-                ),
-                default=False,
-            ),
-        )
-    )
-    (
-        observations_points_sql,
-        observations_points_params,
-    ) = observations_points_queryset.query.sql_with_params()
-
-    sql = f"""
-        WITH
-            evaluations AS ({evaluations_sql}),
-            observations AS ({observations_sql}),
-            evaluations_points AS ({evaluations_points_sql}),
-            observations_points AS ({observations_points_sql})
-        SELECT (
-            (
-                SELECT ST_AsMVT(evaluations.*, %s, 4096, 'mvtgeom')
-                FROM evaluations
-            )
-            ||
-            (
-                SELECT ST_AsMVT(observations.*, %s, 4096, 'mvtgeom')
-                FROM observations
-            )
-            ||
-            (
-                SELECT ST_AsMVT(evaluations_points.*, %s, 4096, 'mvtgeom')
-                FROM evaluations_points
-            )
-            ||
-            (
-                SELECT ST_AsMVT(observations_points.*, %s, 4096, 'mvtgeom')
-                FROM observations_points
-            )
-        )
-    """  # noqa: E501
-    params = (
-        evaluations_params
-        + observations_params
-        + evaluations_points_params
-        + observations_points_params
-        + (
-            f'sites-{sid}',
-            f'observations-{sid}',
-            f'sites_points-{sid}',
-            f'observations_points-{sid}',
-        )
-    )
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql, params)
-        row = cursor.fetchone()
-    tile = row[0]
+    query.add_layer(f'sites-{sid}', 'evaluations', 'polygon')
+    query.add_layer(f'observations-{sid}', 'observations', 'polygon')
+    query.add_layer(f'sites_points-{sid}', 'evaluations', 'point')
+    query.add_layer(f'observations_points-{sid}', 'observations', 'point')
+    tile = query.render()
 
     return HttpResponse(
         tile,
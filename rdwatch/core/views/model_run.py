@@ -54,6 +54,7 @@ from rdwatch.core.models.region import get_or_create_region
 from rdwatch.core.schemas import RegionModel, SiteModel
 from rdwatch.core.schemas.common import TimeRangeSchema
 from rdwatch.core.tasks import (
+    build_vector_tile_archive_task,
     cancel_generate_images_task,
     download_annotations,
     generate_site_images_for_evaluation_run,
@@ -378,6 +379,7 @@ def list_model_runs(
 def finalize_model_run(request: HttpRequest, id: UUID4):
     model_run = get_object_or_404(ModelRun, pk=id)
     model_run.compute_aggregate_stats()
+    build_vector_tile_archive_task.delay(model_run.pk)
     return {
         'id': model_run.pk,
         'title': model_run.title,
@@ -490,7 +492,7 @@ def generate_images(
     scalVal = params.scale
     if params.scale == 'custom':
         scalVal = params.scaleNum
-    generate_site_images_for_evaluation_run(
+    generate_site_images_for_evaluation_run.delay(
         model_run_id,
         params.constellation,
         params.force,
@@ -501,6 +503,7 @@ def generate_images(
         params.bboxScale,
         params.pointArea,
         params.worldviewSource,
+        maxDimension=params.maxDimension,
     )
     return 202, True
 
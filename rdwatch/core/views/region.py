@@ -4,15 +4,12 @@ import tempfile
 from ninja import Router, Schema
 from ninja.pagination import PageNumberPagination, paginate
 
-from django.db import connection
 from django.db.models import (
     BooleanField,
     Case,
     CharField,
     Exists,
     F,
-    Field,
-    Func,
     OuterRef,
     Q,
     Value,
@@ -24,6 +21,7 @@ from django.shortcuts import get_object_or_404
 
 from rdwatch.core.models import ModelRun, Region
 from rdwatch.core.schemas import RegionModel
+from rdwatch.core.utils.vector_tile import VectorTileQuery, tile_features
 
 router = Router()
 
@@ -161,52 +159,20 @@ def delete_region(request: HttpRequest, region_id: int):
 
 @router.get('/{region_id}/vector-tile/{z}/{x}/{y}.pbf/')
 def vector_tile(request: HttpRequest, region_id: int, z: int, x: int, y: int):
-    envelope = Func(z, x, y, function='ST_TileEnvelope')
-    intersects = Q(
-        Func(
-            'geom',
-            envelope,
-            function='ST_Intersects',
-            output_field=BooleanField(),
-        )
-    )
-    mvtgeom = Func(
-        'geom',
-        envelope,
-        function='ST_AsMVTGeom',
-        output_field=Field(),
-    )
-
-    regions_queryset = (
-        Region.objects.filter(pk=region_id)
-        .filter(intersects)
-        .values()
-        .annotate(
+    query = VectorTileQuery()
+    query.add_source(
+        'regions',
+        tile_features(
+            Region.objects.filter(pk=region_id),
+            z,
+            x,
+            y,
+            drop_small=False,
             name=F('name'),
-            mvtgeom=mvtgeom,
-        )
+        ),
     )
-    (
-        regions_sql,
-        regions_params,
-    ) = regions_queryset.query.sql_with_params()
-
-    sql = f"""
-        WITH
-            regions AS ({regions_sql})
-        SELECT (
-            (
-                SELECT ST_AsMVT(regions.*, %s, 4096, 'mvtgeom')
-                FROM regions
-            )
-        )
-    """  # noqa: E501
-    params = regions_params + (f'regions-{region_id}',)
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql, params)
-        row = cursor.fetchone()
-    tile = row[0]
+    query.add_layer(f'regions-{region_id}', 'regions')
+    tile = query.render()
 
     return HttpResponse(
         tile,
@@ -1,12 +1,12 @@
 import logging
 
-from celery.result import AsyncResult
 from ninja import Query, Router, Schema
 from pydantic import UUID4
 
 from django.http import HttpRequest
 
 from rdwatch.core.models import SatelliteFetching
+from rdwatch.core.utils.task_progress import get_task_state
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -35,13 +35,13 @@ def satellite_fetching_running(
     running_site_ids = list(running_sites.values('site_id', 'celery_id', 'error'))
     results = []
     for item in running_site_ids:
-        task = AsyncResult(item['celery_id'])
+        _, info = get_task_state(item['celery_id'])
         task_info = None
         error = item['error']
-        if isinstance(task.info, Exception):
-            error = str(task.info)
+        if isinstance(info, Exception):
+            error = str(info)
         else:
-            task_info = task.info
+            task_info = info
         site_id = item['site_id']
         results.append({'siteId': site_id, 'info': task_info, 'error': error})
 
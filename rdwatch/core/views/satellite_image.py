@@ -1,34 +1,299 @@
+import base64
+from collections import defaultdict
+from collections.abc import Callable
 from datetime import datetime
-from typing import Literal
-from urllib.parse import urlencode
+from functools import partial
+from typing import Literal, TypeVar
 
 import mercantile
 
+from django.conf import settings
+from django.core.cache import cache
 from django.http import (
     HttpRequest,
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseNotFound,
-    HttpResponsePermanentRedirect,
+    HttpResponseNotModified,
     JsonResponse,
 )
-from django.urls import reverse
+from django.utils.cache import patch_response_headers
 from django.views.decorators.cache import cache_page
 
 from rdwatch.core.models.lookups import Constellation
+from rdwatch.core.utils.metatile import Metatile, TileZXY
 from rdwatch.core.utils.raster_tile import (
     get_raster_bbox_from_reader,
-    get_raster_tile_from_reader,
+    get_raster_metatile_from_reader,
+)
+from rdwatch.core.utils.satellite_bands import Band, get_bands
+from rdwatch.core.utils.tile_cache import (
+    CachedTile,
+    get_cached_tiles,
+    get_capture_id,
+    get_timestamp_resolution_key,
 )
-from rdwatch.core.utils.satellite_bands import get_bands
 from rdwatch.core.utils.worldview_processed.raster_tile import (
     get_worldview_processed_visual_bbox,
-    get_worldview_processed_visual_tile,
+    get_worldview_processed_visual_metatile,
+)
+from rdwatch.core.utils.worldview_processed.satellite_captures import (
+    WorldViewProcessedCapture,
+    get_captures,
 )
-from rdwatch.core.utils.worldview_processed.satellite_captures import get_captures
 
 # @cache_page(60 * 60 * 24 * 7)  # Cache endpoint response for 1 week
 
+# How long clients may cache rendered tiles
+TILE_MAX_AGE = 60 * 60 * 24 * 365
+
+CaptureT = TypeVar('CaptureT', Band, WorldViewProcessedCapture)
+
+
+def get_tile_bbox(tile: TileZXY) -> tuple[float, float, float, float]:
+    z, x, y = tile
+    bounds = mercantile.bounds(x, y, z)
+    return (bounds.west, bounds.south, bounds.east, bounds.north)
+
+
+def get_union_bbox(tiles: list[TileZXY]) -> tuple[float, float, float, float]:
+    bboxes = [get_tile_bbox(tile) for tile in tiles]
+    return (
+        min(bbox[0] for bbox in bboxes),
+        min(bbox[1] for bbox in bboxes),
+        max(bbox[2] for bbox in bboxes),
+        max(bbox[3] for bbox in bboxes),
+    )
+
+
+def bbox_intersects(
+    bbox: tuple[float, float, float, float], other: tuple[float, float, float, float]
+) -> bool:
+    return (
+        bbox[0] <= other[2]
+        and other[0] <= bbox[2]
+        and bbox[1] <= other[3]
+        and other[1] <= bbox[3]
+    )
+
+
+def get_tiles(
+    source: str,
+    timestamp: datetime,
+    tiles: list[TileZXY],
+    search_captures: Callable[[tuple[float, float, float, float]], list[CaptureT]],
+    pick_capture: Callable[[list[CaptureT]], CaptureT | None],
+    render: Callable[[CaptureT, Metatile], dict[TileZXY, bytes]],
+) -> dict[TileZXY, CachedTile]:
+    """
+    Get the tiles of the captures closest to the requested timestamp, leaving
+    out the tiles without one.
+
+    Which capture a tile resolves to is cached, so once it is known a cached
+    tile is served without searching for the capture again. The tiles that
+    aren't resolved yet are searched for together over their combined bbox,
+    and each picks from the captures that intersect it. Tiles that resolve
+    to the same capture are rendered together in metatiles.
+    """
+    resolution_keys = {
+        tile: get_timestamp_resolution_key(source, *tile, timestamp) for tile in tiles
+    }
+    resolved = cache.get_many(list(resolution_keys.values()))
+
+    unresolved = [
+        tile
+        for tile, resolution_key in resolution_keys.items()
+        if resolution_key not in resolved
+    ]
+    candidates = search_captures(get_union_bbox(unresolved)) if unresolved else []
+
+    captures: dict[str, CaptureT] = {}
+    tiles_by_capture: dict[str, list[TileZXY]] = defaultdict(list)
+    for tile, resolution_key in resolution_keys.items():
+        capture_id = resolved.get(resolution_key)
+        if capture_id is None:
+            tile_bbox = get_tile_bbox(tile)
+            capture = pick_capture(
+                [
+                    candidate
+                    for candidate in candidates
+                    if bbox_intersects(candidate.bbox, tile_bbox)
+                ]
+            )
+            if capture is None:
+                continue
+            capture_id = get_capture_id(capture)
+            captures[capture_id] = capture
+            cache.set(
+                resolution_key,
+                capture_id,
+                settings.TILE_TIMESTAMP_CACHE_TIMEOUT.total_seconds(),
+            )
+        tiles_by_capture[capture_id].append(tile)
+
+    def render_metatile(
+        capture_id: str, capture_tiles: list[TileZXY], metatile: Metatile
+    ) -> dict[TileZXY, bytes]:
+        capture = captures.get(capture_id)
+        if capture is None:
+            capture = pick_capture(search_captures(get_tile_bbox(capture_tiles[0])))
+            if capture is None or get_capture_id(capture) != capture_id:
+                # The cached resolution is stale, resolve the tiles again next time
+                cache.delete_many([resolution_keys[tile] for tile in capture_tiles])
+                return {}
+            captures[capture_id] = capture
+        return render(capture, metatile)
+
+    found: dict[TileZXY, CachedTile] = {}
+    for capture_id, capture_tiles in tiles_by_capture.items():
+        found.update(
+            get_cached_tiles(
+                capture_id,
+                capture_tiles,
+                'WEBP',
+                partial(render_metatile, capture_id, capture_tiles),
+            )
+        )
+    return found
+
+
+def tile_response(request: HttpRequest, tile: CachedTile, format: str) -> HttpResponse:
+    """
+    Respond with a cached tile, or with 304 Not Modified if the client already
+    has it.
+    """
+    etag = f'"{tile.etag}"'
+    if request.headers.get('If-None-Match') == etag:
+        response: HttpResponse = HttpResponseNotModified()
+    else:
+        response = HttpResponse(tile.content, content_type=f'image/{format}')
+    response['ETag'] = etag
+    patch_response_headers(response, TILE_MAX_AGE)
+    return response
+
+
+def get_batch_tiles(request: HttpRequest) -> list[TileZXY]:
+    """
+    Get the `tiles` of a batch tile request, given as comma separated `z/x/y`.
+    Raises ValueError if they are malformed or there are too many of them.
+    """
+    tiles: list[TileZXY] = []
+    for value in request.GET['tiles'].split(','):
+        z, x, y = (int(part) for part in value.split('/'))
+        if z < 0 or not (0 <= x < 2**z and 0 <= y < 2**z):
+            raise ValueError(f'Invalid tile {value}')
+        tiles.append((z, x, y))
+    if len(tiles) > settings.TILE_BATCH_MAX_TILES:
+        raise ValueError(
+            f'At most {settings.TILE_BATCH_MAX_TILES} tiles can be requested'
+        )
+    return list(dict.fromkeys(tiles))
+
+
+def batch_tile_response(tiles: dict[TileZXY, CachedTile], format: str) -> JsonResponse:
+    """
+    Respond with several cached tiles at once, keyed by `z/x/y`, with base64
+    encoded content. Tiles without a capture are left out.
+    """
+    response = JsonResponse(
+        {
+            f'{z}/{x}/{y}': {
+                'content_type': f'image/{format.lower()}',
+                'etag': tile.etag,
+                'content': base64.b64encode(tile.content).decode(),
+            }
+            for (z, x, y), tile in tiles.items()
+        }
+    )
+    patch_response_headers(response, TILE_MAX_AGE)
+    return response
+
+
+def get_max_size(request: HttpRequest) -> int | None:
+    """
+    Get the optional `maxDimension` of a bbox request, limiting the longest side
+    of the returned image. Raises ValueError if it is not a positive integer.
+    """
+    if 'maxDimension' not in request.GET:
+        return None
+    max_size = int(request.GET['maxDimension'])
+    if max_size <= 0:
+        raise ValueError('maxDimension must be positive')
+    return max_size
+
+
+def search_bands(
+    constellation: str,
+    level: str,
+    spectrum: str,
+    timestamp: datetime,
+    bbox: tuple[float, float, float, float],
+) -> list[Band]:
+    """Search for the bands of a processing level and spectrum within `bbox`."""
+    return [
+        band
+        for band in get_bands(constellation, timestamp, bbox)
+        if (band.level.slug, band.spectrum.slug) == (level, spectrum)
+    ]
+
+
+def pick_band(timestamp: datetime, bands: list[Band]) -> Band | None:
+    """Pick the band closest to `timestamp`."""
+    if not bands:
+        return None
+
+    # Get timestamp closest to the requested timestamp
+    precise_timestamp = min(
+        bands, key=lambda band: abs(band.timestamp - timestamp)
+    ).timestamp
+
+    # Filter out any bands that don't have that timestamp
+    bands = [band for band in bands if band.timestamp == precise_timestamp]
+
+    # Sort bands so that bands in TIF format come first (TIFs are cheaper to
+    # tile and are preferred over other formats when possible)
+    bands.sort(
+        key=lambda band: all(uri.lower().endswith('.tif') for uri in band.uris),
+        reverse=True,
+    )
+    return bands[0]
+
+
+def find_band(
+    constellation: str,
+    level: str,
+    spectrum: str,
+    timestamp: datetime,
+    bbox: tuple[float, float, float, float],
+) -> Band | None:
+    """Find the band closest to `timestamp` within `bbox`."""
+    return pick_band(
+        timestamp, search_bands(constellation, level, spectrum, timestamp, bbox)
+    )
+
+
+def render_raster_metatile(band: Band, metatile: Metatile) -> dict[TileZXY, bytes]:
+    with band.open_reader() as reader:
+        return get_raster_metatile_from_reader(reader, metatile)
+
+
+def pick_worldview_capture(
+    timestamp: datetime,
+    captures: list[WorldViewProcessedCapture],
+) -> WorldViewProcessedCapture | None:
+    """Pick the WorldView capture closest to `timestamp`."""
+    if not captures:
+        return None
+    return min(captures, key=lambda capture: abs(capture.timestamp - timestamp))
+
+
+def find_worldview_capture(
+    timestamp: datetime,
+    bbox: tuple[float, float, float, float],
+) -> WorldViewProcessedCapture | None:
+    """Find the WorldView capture closest to `timestamp` within `bbox`."""
+    return pick_worldview_capture(timestamp, get_captures(timestamp, bbox))
+
 
 def get_satelliteimage_raster(
     request: HttpRequest,
@@ -47,12 +312,17 @@ def get_satelliteimage_raster(
 
     bbox = None
     format = None
+    max_size = None
     if x is None and y is None and z is None:  # Bbox image request
         request_type = 'bbox'
         if 'bbox' not in request.GET or 'format' not in request.GET:
             return HttpResponseBadRequest()
 
         format = request.GET['format']
+        try:
+            max_size = get_max_size(request)
+        except ValueError:
+            return HttpResponseBadRequest()
         bbox_strings = request.GET['bbox'].split(',')
         if len(bbox_strings) != 4:
             return HttpResponseBadRequest()
@@ -62,70 +332,37 @@ def get_satelliteimage_raster(
             float(bbox_strings[2]),
             float(bbox_strings[3]),
         )
-    else:
-        bounds = mercantile.bounds(x, y, z)
-        format = 'WEBP'
-        bbox = (bounds.west, bounds.south, bounds.east, bounds.north)
 
     constellation = Constellation(slug=request.GET['constellation'])
     timestamp = datetime.fromisoformat(str(request.GET['timestamp']))
     level = request.GET['level']
     spectrum = request.GET['spectrum']
 
-    # Convert generator to list so we can iterate over it multiple times
-    bands = list(get_bands(constellation.slug, timestamp, bbox))
-
-    # Filter bands by requested processing level and spectrum
-    bands = [
-        band
-        for band in bands
-        if (band.level.slug, band.spectrum.slug) == (level, spectrum)
-    ]
+    if request_type == 'tile':
+        tile = (z, x, y)
+        tiles = get_tiles(
+            f'{constellation.slug}|{level}|{spectrum}',
+            timestamp,
+            [tile],
+            partial(search_bands, constellation.slug, level, spectrum, timestamp),
+            partial(pick_band, timestamp),
+            render_raster_metatile,
+        )
+        if tile not in tiles:
+            return HttpResponseNotFound()
+        return tile_response(request, tiles[tile], 'WEBP')
 
-    if not bands:
+    band = find_band(constellation.slug, level, spectrum, timestamp, bbox)
+    if band is None:
         return HttpResponseNotFound()
-
-    # Get timestamp closest to the requested timestamp
-    precise_timestamp = min(
-        bands, key=lambda band: abs(band.timestamp - timestamp)
-    ).timestamp
-
-    # Filter out any bands that don't have that timestamp
-    bands = [band for band in bands if band.timestamp == precise_timestamp]
-
-    # Sort bands so that bands in TIF format come first (TIFs are cheaper to tile
-    # and are preferred over other formats when possible)
-    bands.sort(
-        key=lambda band: all(uri.lower().endswith('.tif') for uri in band.uris),
-        reverse=True,
+    with band.open_reader() as reader:
+        image = get_raster_bbox_from_reader(reader, bbox, format, max_size=max_size)
+    return HttpResponse(
+        image,
+        content_type=f'image/{format}',
+        status=200,
     )
 
-    if precise_timestamp == timestamp:
-        if request_type == 'bbox':
-            with bands[0].open_reader() as reader:
-                tile = get_raster_bbox_from_reader(reader, bbox, format)
-        else:
-            with bands[0].open_reader() as reader:
-                tile = get_raster_tile_from_reader(reader, z, x, y)
-        return HttpResponse(
-            tile,
-            content_type=f'image/{format}',
-            status=200,
-        )
-
-    query_params = {
-        **request.GET.dict(),
-        'timestamp': datetime.isoformat(precise_timestamp),
-    }
-    if request_type == 'bbox':
-        return HttpResponsePermanentRedirect(
-            reverse('satellite-bbox') + f'?{urlencode(query_params)}'
-        )
-    else:
-        return HttpResponsePermanentRedirect(
-            reverse('satellite-tiles', args=[z, x, y]) + f'?{urlencode(query_params)}'
-        )
-
 
 @cache_page(60 * 60 * 24 * 365)
 def satelliteimage_raster_bbox(
@@ -134,7 +371,6 @@ def satelliteimage_raster_bbox(
     return get_satelliteimage_raster(request)
 
 
-@cache_page(60 * 60 * 24 * 365)
 def satelliteimage_raster_tile(
     request: HttpRequest,
     z: int | None = None,
@@ -146,6 +382,36 @@ def satelliteimage_raster_tile(
     return get_satelliteimage_raster(request, z, x, y)
 
 
+def satelliteimage_raster_tiles(request: HttpRequest):
+    if (
+        'constellation' not in request.GET
+        or 'timestamp' not in request.GET
+        or 'spectrum' not in request.GET
+        or 'level' not in request.GET
+        or 'tiles' not in request.GET
+    ):
+        return HttpResponseBadRequest()
+    try:
+        tiles = get_batch_tiles(request)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    constellation = Constellation(slug=request.GET['constellation'])
+    timestamp = datetime.fromisoformat(str(request.GET['timestamp']))
+    level = request.GET['level']
+    spectrum = request.GET['spectrum']
+
+    found = get_tiles(
+        f'{constellation.slug}|{level}|{spectrum}',
+        timestamp,
+        tiles,
+        partial(search_bands, constellation.slug, level, spectrum, timestamp),
+        partial(pick_band, timestamp),
+        render_raster_metatile,
+    )
+    return batch_tile_response(found, 'WEBP')
+
+
 def get_satelliteimage_visual(
     request: HttpRequest,
     z: int | None = None,
@@ -158,12 +424,17 @@ def get_satelliteimage_visual(
     request_type: Literal['tile', 'bbox'] = 'tile'
     bbox = None
     format = None
+    max_size = None
     if x is None and y is None and z is None:  # Bbox image request
         request_type = 'bbox'
         if 'format' not in request.GET or 'bbox' not in request.GET:
             return HttpResponseBadRequest()
 
         format = request.GET['format']
+        try:
+            max_size = get_max_size(request)
+        except ValueError:
+            return HttpResponseBadRequest()
         bbox_strings = request.GET['bbox'].split(',')
         if len(bbox_strings) != 4:
             return HttpResponseBadRequest()
@@ -173,46 +444,33 @@ def get_satelliteimage_visual(
             float(bbox_strings[2]),
             float(bbox_strings[3]),
         )
-    else:
-        bounds = mercantile.bounds(x, y, z)
-        format = 'WEBP'
-        bbox = (bounds.west, bounds.south, bounds.east, bounds.north)
     timestamp = datetime.fromisoformat(str(request.GET['timestamp']))
-    captures = get_captures(timestamp, bbox)
-    if not captures:
-        return HttpResponseNotFound()
 
-    # Get timestamp closest to the requested timestamp
-    closest_capture = min(captures, key=lambda band: abs(band.timestamp - timestamp))
-
-    # If the timestamp provided by the user is *exactly* the timestamp of the retrieved
-    # band, return the raster data for it. Otherwise, redirect back to this same view
-    # with the exact timestamp as a parameter so that this behavior is triggered during
-    # that request. This is done to facilitate caching of the raster data.
-    if closest_capture.timestamp == timestamp:
-        if request_type == 'bbox':
-            tile = get_worldview_processed_visual_bbox(closest_capture, bbox, format)
-        else:
-            tile = get_worldview_processed_visual_tile(closest_capture, z, x, y)
-        return HttpResponse(
-            tile,
-            content_type=f'image/{format}',
-            status=200,
+    if request_type == 'tile':
+        tile = (z, x, y)
+        tiles = get_tiles(
+            'WV',
+            timestamp,
+            [tile],
+            partial(get_captures, timestamp),
+            partial(pick_worldview_capture, timestamp),
+            get_worldview_processed_visual_metatile,
         )
+        if tile not in tiles:
+            return HttpResponseNotFound()
+        return tile_response(request, tiles[tile], 'WEBP')
 
-    query_params = {
-        **request.GET.dict(),
-        'timestamp': datetime.isoformat(closest_capture.timestamp),
-    }
-    if request_type == 'bbox':
-        return HttpResponsePermanentRedirect(
-            reverse('satellite-visual-bbox') + f'?{urlencode(query_params)}'
-        )
-    else:
-        return HttpResponsePermanentRedirect(
-            reverse('satellite-visual-tiles', args=[z, x, y])
-            + f'?{urlencode(query_params)}'
-        )
+    closest_capture = find_worldview_capture(timestamp, bbox)
+    if closest_capture is None:
+        return HttpResponseNotFound()
+    image = get_worldview_processed_visual_bbox(
+        closest_capture, bbox, format, max_size=max_size
+    )
+    return HttpResponse(
+        image,
+        content_type=f'image/{format}',
+        status=200,
+    )
 
 
 @cache_page(60 * 60 * 24 * 365)
@@ -222,7 +480,6 @@ def satelliteimage_visual_bbox(
     return get_satelliteimage_visual(request)
 
 
-@cache_page(60 * 60 * 24 * 365)
 def satelliteimage_visual_tile(
     request: HttpRequest,
     z: int | None = None,
@@ -234,6 +491,26 @@ def satelliteimage_visual_tile(
     return get_satelliteimage_visual(request, z, x, y)
 
 
+def satelliteimage_visual_tiles(request: HttpRequest):
+    if 'timestamp' not in request.GET or 'tiles' not in request.GET:
+        return HttpResponseBadRequest()
+    try:
+        tiles = get_batch_tiles(request)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    timestamp = datetime.fromisoformat(str(request.GET['timestamp']))
+    found = get_tiles(
+        'WV',
+        timestamp,
+        tiles,
+        partial(get_captures, timestamp),
+        partial(pick_worldview_capture, timestamp),
+        get_worldview_processed_visual_metatile,
+    )
+    return batch_tile_response(found, 'WEBP')
+
+
 @cache_page(60 * 60 * 24 * 365)
 def satelliteimage_time_list(request: HttpRequest):
     if (
@@ -13,6 +13,7 @@ from django.shortcuts import get_object_or_404
 from rdwatch.core.models import SiteEvaluation, SiteEvaluationTracking, lookups
 from rdwatch.core.schemas import SiteEvaluationRequest
 from rdwatch.core.tasks import get_site_model_feature_JSON
+from rdwatch.core.utils.vector_tile_generation import bump_vector_tile_generation
 
 router = Router()
 
@@ -47,6 +48,7 @@ def patch_site_evaluation(request: HttpRequest, id: UUID4, data: SiteEvaluationR
             site_evaluation.label = lookups.ObservationLabel.objects.get(
                 slug=data.label
             )
+            site_evaluation.label_slug = site_evaluation.label.slug
 
         # Use `exclude_unset` here because an explicitly `null` start/end date
         # means something different than a missing start/end date.
@@ -58,6 +60,7 @@ def patch_site_evaluation(request: HttpRequest, id: UUID4, data: SiteEvaluationR
 
         site_evaluation.modified_timestamp = datetime.now()
         site_evaluation.save()
+        bump_vector_tile_generation(site_evaluation.configuration_id)
 
     return 200
 
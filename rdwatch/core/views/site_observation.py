@@ -29,6 +29,8 @@ from rdwatch.core.models import (
 from rdwatch.core.schemas import SiteObservationRequest
 from rdwatch.core.schemas.common import BoundingBoxSchema, TimeRangeSchema
 from rdwatch.core.tasks import generate_site_images
+from rdwatch.core.utils.task_progress import get_task_state
+from rdwatch.core.utils.vector_tile_generation import bump_vector_tile_generation
 
 logger = logging.getLogger(__name__)
 
@@ -188,12 +190,10 @@ def site_observations(request: HttpRequest, evaluation_id: UUID4):
         retrieved = SatelliteFetching.objects.filter(site=evaluation_id).first()
         celery_data = {}
         if retrieved.celery_id:
-            task = AsyncResult(retrieved.celery_id)
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, Exception) else task.info
-            )
+            state, info = get_task_state(retrieved.celery_id)
+            celery_data['state'] = state
+            celery_data['status'] = state
+            celery_data['info'] = str(info) if isinstance(info, Exception) else info
 
         queryset['job'] = {
             'status': retrieved.status,
@@ -215,11 +215,15 @@ class GenerateImagesSchema(Schema):
     scaleNum: None | list[int] = None
     bboxScale: None | float = 1.2
     pointArea: None | float = 200
+    # Limit the longest side of fetched images, reading from COG overviews
+    maxDimension: None | int = None
 
     @root_validator
     def validate_worldview_source(cls, values: dict[str, Any]):
         if 'WV' in values['constellation'] and values['worldviewSource'] is None:
             raise ValueError('worldviewSource is required for WV constellation')
+        if values.get('maxDimension') is not None and values['maxDimension'] <= 0:
+            raise ValueError('maxDimension must be a positive number of pixels')
         return values
 
 
@@ -243,6 +247,7 @@ def get_site_observation_images(
         params.bboxScale,
         params.pointArea,
         params.worldviewSource,
+        maxDimension=params.maxDimension,
     )
     return 202, True
 
@@ -314,6 +319,13 @@ def update_site_observation(
             )
 
         site_observation.save()
+        SiteObservation.update_derived_fields([site_observation.siteeval_id])
+
+        # The evaluation's vector tiles include its observations
+        SiteEvaluation.objects.filter(pk=site_observation.siteeval_id).update(
+            modified_timestamp=datetime.now()
+        )
+        bump_vector_tile_generation(site_observation.siteeval.configuration_id)
 
         return site_observation
 
@@ -330,13 +342,18 @@ def add_site_observation(
     if data.constellation:
         constellation = lookups.Constellation.objects.get(slug=data.label)
 
-    new_site_observation = SiteObservation.objects.create(
-        siteeval=site_evaluation,
-        label=label,
-        score=data.score,
-        geom=data.geom,
-        constellation=constellation,
-        spectrum=None,
-        timestamp=data.timestamp,
-    )
+    with transaction.atomic():
+        new_site_observation = SiteObservation.objects.create(
+            siteeval=site_evaluation,
+            label=label,
+            score=data.score,
+            geom=data.geom,
+            constellation=constellation,
+            spectrum=None,
+            timestamp=data.timestamp,
+        )
+        SiteObservation.update_derived_fields([site_evaluation.pk])
+        site_evaluation.modified_timestamp = datetime.now()
+        site_evaluation.save(update_fields=['modified_timestamp'])
+        bump_vector_tile_generation(site_evaluation.configuration_id)
     return new_site_observation
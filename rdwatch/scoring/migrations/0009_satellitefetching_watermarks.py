@@ -0,0 +1,21 @@
+# Generated by Django 5.0.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('scoring', '0008_remove_siteimage_aws_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='satellitefetching',
+            name='watermarks',
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text='Date range and parameters already fetched, per constellation',
+            ),
+        ),
+    ]
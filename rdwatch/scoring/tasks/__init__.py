@@ -6,9 +6,9 @@ from uuid import uuid4
 
 from celery import shared_task
 from celery.result import AsyncResult
-from PIL import Image
 from pydantic import UUID4
 
+from django.conf import settings
 from django.contrib.gis.geos import Point, Polygon
 from django.core.files import File
 from django.db import transaction
@@ -18,20 +18,21 @@ from rdwatch.core.tasks import (
     BaseTime,
     BboxScaleDefault,
     ToMeters,
-    get_worldview_nitf_bbox,
-    get_worldview_processed_visual_bbox,
-    is_inside_range,
     overrideImageSize,
     pointAreaDefault,
 )
+from rdwatch.core.utils.fetch_watermark import get_uncovered_windows, make_watermark
+from rdwatch.core.utils.image_quality import get_image_quality
 from rdwatch.core.utils.images import (
     fetch_boundbox_image,
+    fetch_capture_images,
     get_max_bbox,
-    get_percent_black_pixels,
     get_range_captures,
     scale_bbox,
 )
-from rdwatch.core.utils.raster_tile import get_raster_bbox_from_reader
+from rdwatch.core.utils.task_progress import ProgressReporter
+from rdwatch.core.utils.task_routing import get_bulk_fetch_options, get_delivery_options
+from rdwatch.core.utils.timestamp_index import TimestampIndex
 from rdwatch.scoring.models import (
     AnnotationProposalObservation,
     AnnotationProposalSet,
@@ -59,6 +60,7 @@ def get_siteobservation_images_task(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    maxDimension: int | None = None,
 ) -> None:
     capture_count = 0
     for constellation in baseConstellations:
@@ -74,6 +76,7 @@ def get_siteobservation_images_task(
             bboxScale=bboxScale,
             pointArea=pointArea,
             worldview_source=worldview_source,
+            maxDimension=maxDimension,
         )
     fetching_task = SatelliteFetching.objects.get(site=site_eval_id)
     fetching_task.status = SatelliteFetching.Status.COMPLETE
@@ -95,11 +98,13 @@ def get_siteobservations_images(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    maxDimension: int | None = None,
 ) -> None:
+    progress = ProgressReporter(self)
     # Ensure we are using ints for the DayRange and no_data_limit
     dayRange = int(dayRange)
     no_data_limit = int(no_data_limit)
-    found_timestamps = {}
+    found_timestamps = TimestampIndex()
     max_bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
 
     # Use the base SiteEvaluation extents as the max size
@@ -191,7 +196,7 @@ def get_siteobservations_images(
     downloaded_count = 0
     for observation in site_observations.iterator():
         break
-        self.update_state(
+        progress.update(
             state='PROGRESS',
             meta={
                 'current': count,
@@ -232,15 +237,20 @@ def get_siteobservations_images(
             if (
                 baseConstellation in ('S2', 'L8', 'PL')
                 and dayRange > -1
-                and is_inside_range(found_timestamps.keys(), observation.date, dayRange)
+                and found_timestamps.is_inside_range(observation.date, dayRange)
             ):
                 logger.info(f'Skipping Timestamp: {timestamp}')
                 continue
             if found.exists() and not force:
-                found_timestamps[observation.date] = True
+                found_timestamps.add(observation.date)
                 continue
             results = fetch_boundbox_image(
-                bbox, timestamp, constellation.slug, baseConstellation == 'WV', scale
+                bbox,
+                timestamp,
+                constellation.slug,
+                baseConstellation == 'WV',
+                scale,
+                max_size=maxDimension,
             )
             if results is None:
                 logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
@@ -249,17 +259,17 @@ def get_siteobservations_images(
             if bytes is None:
                 logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
-            percent_black = get_percent_black_pixels(bytes)
+            quality = results['quality']
+            percent_black = quality.percent_black
             cloudcover = results['cloudcover']
             found_timestamp = results['timestamp']
             if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[found_timestamp] = True
+                found_timestamps.add(found_timestamp)
             elif dayRange == -1:
-                found_timestamps[found_timestamp] = True
+                found_timestamps.add(found_timestamp)
             # logger.info(f'Retrieved Image with timestamp: {timestamp}')
             output = f'tile_image_{observation.pk}.png'
             image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
             if image is None:  # No null/None images should be set
                 continue
             downloaded_count += 1
@@ -271,7 +281,7 @@ def get_siteobservations_images(
                 existing.percent_black = percent_black
                 existing.uri_locations = results['uris']
                 existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
+                existing.image_dimensions = [quality.width, quality.height]
                 existing.save()
             else:
                 SiteImage.objects.create(
@@ -284,7 +294,7 @@ def get_siteobservations_images(
                     source=baseConstellation,
                     percent_black=percent_black,
                     image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
+                    image_dimensions=[quality.width, quality.height],
                 )
 
     # Now we need to go through and find all other images
@@ -300,11 +310,62 @@ def get_siteobservations_images(
         ) / 2
         timestamp = (min_time - timedelta(days=30)) + timebuffer
 
+    # Only the dates that weren't fetched before with the same parameters
+    # are searched, unless downloading is forced
+    fetching = SatelliteFetching.objects.filter(site=site_eval_id).first()
+    watermark = fetching.watermarks.get(baseConstellation) if fetching else None
+    fetch_params = {
+        'scale': scale,
+        'dayRange': dayRange,
+        'no_data_limit': no_data_limit,
+        'worldview_source': worldview_source,
+        'maxDimension': maxDimension,
+    }
+    range_start, range_end = timestamp - timebuffer, timestamp + timebuffer
+    windows = [(range_start, range_end)]
+    if not force:
+        windows = get_uncovered_windows(
+            watermark,
+            max_bbox,
+            range_start,
+            range_end,
+            fetch_params,
+            overlap=settings.SATELLITE_FETCH_WATERMARK_OVERLAP,
+        )
+        # Previously fetched images count as found for the dayRange checks
+        for site_image in SiteImage.objects.filter(
+            site=site_eval_id, source=baseConstellation
+        ).only('timestamp', 'percent_black'):
+            if dayRange == -1 or (
+                site_image.percent_black is not None
+                and site_image.percent_black < no_data_limit
+            ):
+                found_timestamps.add(site_image.timestamp.replace(microsecond=0))
+    logger.info(f'Searching uncovered date ranges: {windows}')
+
     # Now we get a list of all the timestamps and captures that fall in this range.
-    captures = get_range_captures(
-        max_bbox, timestamp, baseConstellation, timebuffer, worldview_source
+    captures = []
+    for window_start, window_end in windows:
+        window_buffer = (window_end - window_start) / 2
+        captures.extend(
+            get_range_captures(
+                max_bbox,
+                window_start + window_buffer,
+                baseConstellation,
+                window_buffer,
+                worldview_source,
+            )
+        )
+    # Captures that are already known to be skipped are never downloaded
+    captures = found_timestamps.thin_captures(
+        captures,
+        (
+            dayRange
+            if baseConstellation in ('S2', 'L8', 'PL') and dayRange > -1
+            else None
+        ),
     )
-    self.update_state(
+    progress.update(
         state='PROGRESS',
         meta={
             'current': 0,
@@ -321,7 +382,7 @@ def get_siteobservations_images(
     num_of_captures = len(captures)
     logger.info(f'Found {num_of_captures} captures')
     if num_of_captures == 0:
-        self.update_state(
+        progress.update(
             state='PROGRESS',
             meta={
                 'current': count,
@@ -332,9 +393,31 @@ def get_siteobservations_images(
             },
         )
 
+    def should_fetch(capture) -> bool:
+        capture_timestamp = capture.timestamp.replace(microsecond=0)
+        if (
+            baseConstellation in ('S2', 'L8', 'PL')
+            and dayRange > -1
+            and found_timestamps.is_inside_range(capture_timestamp, dayRange)
+        ):
+            return False
+        return capture_timestamp not in found_timestamps
+
+    # Captures are read concurrently but handed back in order, so the
+    # found_timestamps/dayRange checks below behave exactly as a serial fetch.
+    fetched_images = fetch_capture_images(
+        captures,
+        max_bbox,
+        baseConstellation,
+        worldview_source,
+        scale,
+        max_workers=settings.SATELLITE_FETCH_POOL_SIZE.get(baseConstellation, 1),
+        should_fetch=should_fetch,
+        max_size=maxDimension,
+    )
     # Now we go through the list and add in a timestmap if it doesn't exist
-    for capture in captures:
-        self.update_state(
+    for capture, img in fetched_images:
+        progress.update(
             state='PROGRESS',
             meta={
                 'current': count,
@@ -348,33 +431,24 @@ def get_siteobservations_images(
         if (
             baseConstellation in ('S2', 'L8', 'PL')
             and dayRange > -1
-            and is_inside_range(found_timestamps.keys(), capture_timestamp, dayRange)
+            and found_timestamps.is_inside_range(capture_timestamp, dayRange)
         ):
             count += 1
             continue
 
-        if capture_timestamp not in found_timestamps.keys():
+        if capture_timestamp not in found_timestamps:
             # we need to add a new image into the structure
-            bytes = None
-            if baseConstellation == 'WV' and worldview_source == 'cog':
-                bytes = get_worldview_processed_visual_bbox(
-                    capture, max_bbox, 'PNG', scale
-                )
-            elif baseConstellation == 'WV' and worldview_source == 'nitf':
-                bytes = get_worldview_nitf_bbox(capture, max_bbox, 'PNG', scale)
-            else:
-                with capture.open_reader() as reader:
-                    bytes = get_raster_bbox_from_reader(reader, max_bbox, 'PNG', scale)
-            if bytes is None:
+            if img is None:
                 count += 1
                 logger.info(f'COULD NOT FIND ANY IMAGE FOR TIMESTAMP: {timestamp}')
                 continue
-            percent_black = get_percent_black_pixels(bytes)
+            quality = get_image_quality(img)
+            bytes = img.render(img_format='PNG')
+            percent_black = quality.percent_black
             cloudcover = capture.cloudcover
             count += 1
             output = f'tile_image_{base_site_eval.pk}_nonobs_{uuid4()}.png'
             image = File(io.BytesIO(bytes), name=output)
-            imageObj = Image.open(io.BytesIO(bytes))
             if image is None:  # No null/None images should be set
                 count += 1
                 continue
@@ -384,9 +458,9 @@ def get_siteobservations_images(
                 source=baseConstellation,
             )
             if dayRange != -1 and percent_black < no_data_limit:
-                found_timestamps[capture_timestamp] = True
+                found_timestamps.add(capture_timestamp)
             elif dayRange == -1:
-                found_timestamps[capture_timestamp] = True
+                found_timestamps.add(capture_timestamp)
             downloaded_count += 1
             if found.exists():
                 existing = found.first()
@@ -395,7 +469,7 @@ def get_siteobservations_images(
                 existing.image = image
                 existing.uri_locations = capture.uris
                 existing.image_bbox = Polygon.from_bbox(max_bbox)
-                existing.image_dimensions = [imageObj.width, imageObj.height]
+                existing.image_dimensions = [quality.width, quality.height]
                 existing.save()
             else:
                 SiteImage.objects.create(
@@ -407,10 +481,23 @@ def get_siteobservations_images(
                     percent_black=percent_black,
                     source=baseConstellation,
                     image_bbox=Polygon.from_bbox(max_bbox),
-                    image_dimensions=[imageObj.width, imageObj.height],
+                    image_dimensions=[quality.width, quality.height],
                 )
         else:
             count += 1
+
+    if fetching is not None:
+        fetching.watermarks[baseConstellation] = make_watermark(
+            watermark if not force else None,
+            max_bbox,
+            range_start,
+            range_end,
+            fetch_params,
+        )
+        # The fetching row may have been removed while the task was running
+        SatelliteFetching.objects.filter(pk=fetching.pk).update(
+            watermarks=fetching.watermarks
+        )
     return downloaded_count
 
 
@@ -445,8 +532,9 @@ def cancel_generate_images_task(model_run_uuid: UUID4) -> None:
                     fetching_task.save()
 
 
-@shared_task
+@shared_task(bind=True)
 def generate_site_images(
+    self,
     model_run_uuid: UUID4,
     site_uuid: UUID4,
     constellation=['WV'],  # noqa
@@ -458,6 +546,7 @@ def generate_site_images(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    maxDimension: int | None = None,
 ):
     with transaction.atomic():
         # Use select_for_update here to lock the SatelliteFetching row
@@ -484,17 +573,21 @@ def generate_site_images(
                 timestamp=datetime.now(),
                 status=SatelliteFetching.Status.RUNNING,
             )
-        task_id = get_siteobservation_images_task.delay(
-            site_uuid,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
-            pointArea,
-            worldview_source,
+        task_id = get_siteobservation_images_task.apply_async(
+            (
+                site_uuid,
+                constellation,
+                force,
+                dayRange,
+                noData,
+                overrideDates,
+                scale,
+                bboxScale,
+                pointArea,
+                worldview_source,
+                maxDimension,
+            ),
+            **get_delivery_options(self),
         )
         fetching_task.celery_id = task_id.id
         fetching_task.save()
@@ -512,6 +605,7 @@ def generate_site_images_for_evaluation_run(
     bboxScale: float = BboxScaleDefault,
     pointArea: float = pointAreaDefault,
     worldview_source: Literal['cog', 'nitf'] | None = 'cog',
+    maxDimension: int | None = None,
 ):
     try:
         EvaluationRun.objects.get(pk=model_run_uuid)
@@ -522,17 +616,22 @@ def generate_site_images_for_evaluation_run(
             annotation_proposal_set_uuid=model_run_uuid
         )
 
-    for site in sites.iterator():
-        generate_site_images.delay(
-            model_run_uuid,
-            site.pk,
-            constellation,
-            force,
-            dayRange,
-            noData,
-            overrideDates,
-            scale,
-            bboxScale,
-            pointArea,
-            worldview_source,
+    total = sites.count()
+    for index, site in enumerate(sites.iterator()):
+        generate_site_images.apply_async(
+            (
+                model_run_uuid,
+                site.pk,
+                constellation,
+                force,
+                dayRange,
+                noData,
+                overrideDates,
+                scale,
+                bboxScale,
+                pointArea,
+                worldview_source,
+                maxDimension,
+            ),
+            **get_bulk_fetch_options(index, total),
         )
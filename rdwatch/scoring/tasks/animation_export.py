@@ -28,6 +28,7 @@ from rdwatch.core.tasks.animation_export import (
     rescale_bbox,
     to_pixel_coords,
 )
+from rdwatch.core.utils.task_progress import ProgressReporter
 from rdwatch.scoring.models import (
     AnimationModelRunExport,
     AnimationSiteExport,
@@ -139,6 +140,7 @@ def find_closest_observation(site_uuid, timestamp, model='Observation'):
 
 @shared_task
 def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
+    progress = ProgressReporter(self)
     settingsSchema = GenerateAnimationSchema(**settings)
     output_format = settingsSchema.output_format
     fps = settingsSchema.fps
@@ -282,7 +284,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
             # Convert grayscale to RGB
             img = img.convert('RGB')
 
-        self.update_state(
+        progress.update(
             state='PROGRESS',
             meta={
                 'current': count,
@@ -528,7 +530,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
     prefix = f'{base_str}_{str(site_evaluation.site_id)}'
     if frames:
         # Create a temporary directory
-        self.update_state(
+        progress.update(
             state='Progress',
             meta={
                 'current': count,
@@ -585,7 +587,7 @@ def create_animation(self, site_evaluation_id: UUID4, settings: dict[str, Any]):
 
                 video_writer.release()  # Close the video writer
         name = f'{prefix}.{output_format}'
-        self.update_state(
+        progress.update(
             state='SUCCESS',
             meta={
                 'current': count,
@@ -641,6 +643,7 @@ def create_site_animation_export(
 def create_modelrun_animation_export(
     self, modelrun_id: UUID4, settings: dict[str, Any], userId: int
 ):
+    progress = ProgressReporter(self)
     task_id = self.request.id
     model_run = EvaluationRun.objects.get(pk=modelrun_id)
     user = User.objects.get(pk=userId)
@@ -668,7 +671,7 @@ def create_modelrun_animation_export(
     while not result.ready():
         completed_count = result.completed_count()
         # Update the main task state with the overall progress
-        self.update_state(
+        progress.update(
             state=states.STARTED,
             meta={
                 'mode': 'Processing Site Animations',
@@ -680,7 +683,7 @@ def create_modelrun_animation_export(
         # Optionally, sleep for a while to avoid too frequent updates
         time.sleep(5)
     task_ids = [res.id for res in result.results]
-    self.update_state(
+    progress.update(
         state=states.STARTED,
         meta={
             'mode': 'Generating Zip file',
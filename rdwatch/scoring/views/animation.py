@@ -10,6 +10,7 @@ from django.db import transaction
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
 
+from rdwatch.core.utils.task_progress import get_task_state
 from rdwatch.core.views.animation import DeleteErrorSchema, DeleteSuccessSchema
 from rdwatch.scoring.models import (
     AnimationModelRunExport,
@@ -43,13 +44,11 @@ def generate_download_data(
             )
         else:
             task_id = export.celery_id
-            task = AsyncResult(task_id)
+            state, info = get_task_state(task_id)
             celery_data = {}
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, Exception) else task.info
-            )
+            celery_data['state'] = state
+            celery_data['status'] = state
+            celery_data['info'] = str(info) if isinstance(info, Exception) else info
             output.append(
                 {
                     'created': export.created,
@@ -173,14 +172,14 @@ def get_downloaded_modelrun_animation(request: HttpRequest, task_id: UUID4):
 
 @router.get('/{task_id}/status/')
 def get_animation_status(request: HttpRequest, task_id: UUID4):
-    task = AsyncResult(task_id)
+    state, info = get_task_state(task_id)
     celery_data = {}
-    celery_data['state'] = task.state
-    celery_data['status'] = task.status
-    if isinstance(task.info, Exception):
-        celery_data['error'] = str(task.info)
+    celery_data['state'] = state
+    celery_data['status'] = state
+    if isinstance(info, Exception):
+        celery_data['error'] = str(info)
     else:
-        celery_data['info'] = task.info
+        celery_data['info'] = info
     return celery_data
 
 
@@ -569,6 +569,7 @@ def generate_images(
         params.bboxScale,
         params.pointArea,
         params.worldviewSource,
+        maxDimension=params.maxDimension,
     )
     return 202, True
 
@@ -1,11 +1,11 @@
 import logging
 
-from celery.result import AsyncResult
 from ninja import Query, Router
 from pydantic import UUID4
 
 from django.http import HttpRequest
 
+from rdwatch.core.utils.task_progress import get_task_state
 from rdwatch.core.views.satellite_fetching import RunningSatelliteFetchingSchema
 from rdwatch.scoring.models import SatelliteFetching
 
@@ -25,13 +25,13 @@ def satellite_fetching_running(
     running_site_ids = list(running_sites.values('site', 'celery_id', 'error'))
     results = []
     for item in running_site_ids:
-        task = AsyncResult(item['celery_id'])
+        _, info = get_task_state(item['celery_id'])
         task_info = None
         error = item['error']
-        if isinstance(task.info, Exception):
-            error = str(task.info)
+        if isinstance(info, Exception):
+            error = str(info)
         else:
-            task_info = task.info
+            task_info = info
         site_id = item['site']
         results.append({'siteId': site_id, 'info': task_info, 'error': error})
 
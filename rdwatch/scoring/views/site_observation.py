@@ -17,6 +17,7 @@ from django.http import Http404, HttpRequest
 from django.shortcuts import get_object_or_404
 
 from rdwatch.core.db.functions import BoundingBox, ExtractEpoch
+from rdwatch.core.utils.task_progress import get_task_state
 from rdwatch.core.views.site_observation import SiteObservationsListSchema
 from rdwatch.scoring.models import (
     AnnotationProposalObservation,
@@ -44,11 +45,15 @@ class GenerateImagesSchema(Schema):
     scaleNum: None | list[int] = None
     bboxScale: None | float = 1.2
     pointArea: None | float = 200
+    # Limit the longest side of fetched images, reading from COG overviews
+    maxDimension: None | int = None
 
     @root_validator
     def validate_worldview_source(cls, values: dict[str, Any]):
         if 'WV' in values['constellation'] and values['worldviewSource'] is None:
             raise ValueError('worldviewSource is required for WV constellation')
+        if values.get('maxDimension') is not None and values['maxDimension'] <= 0:
+            raise ValueError('maxDimension must be a positive number of pixels')
         return values
 
 
@@ -199,12 +204,10 @@ def site_observations(request: HttpRequest, evaluation_id: UUID4):
         retrieved = SatelliteFetching.objects.filter(site=evaluation_id).first()
         celery_data = {}
         if retrieved.celery_id:
-            task = AsyncResult(retrieved.celery_id)
-            celery_data['state'] = task.state
-            celery_data['status'] = task.status
-            celery_data['info'] = (
-                str(task.info) if isinstance(task.info, Exception) else task.info
-            )
+            state, info = get_task_state(retrieved.celery_id)
+            celery_data['state'] = state
+            celery_data['status'] = state
+            celery_data['info'] = str(info) if isinstance(info, Exception) else info
 
         queryset['job'] = {
             'status': retrieved.status,
@@ -256,6 +259,7 @@ def get_site_observation_images(
         params.bboxScale,
         params.pointArea,
         params.worldviewSource,
+        maxDimension=params.maxDimension,
     )
     return 202, True
 
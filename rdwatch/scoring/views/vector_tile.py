@@ -5,7 +5,6 @@ from pydantic import UUID4
 from django.contrib.gis.db.models import GeometryField
 from django.contrib.gis.db.models.functions import Area, Transform
 from django.core.cache import cache
-from django.db import connections
 from django.db.models import (
     BooleanField,
     Case,
@@ -26,6 +25,7 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404
 
 from rdwatch.core.db.functions import ExtractEpoch, GroupExcludeRowRange
+from rdwatch.core.utils.vector_tile import VectorTileQuery, as_mvt_geom, intersects_tile
 from rdwatch.scoring.models import (
     AnnotationGroundTruthObservation,
     AnnotationGroundTruthSite,
@@ -78,24 +78,11 @@ def vector_tile_proposal(
 
     # Generate the vector tiles and cache them if there's no hit
     if tile is None:
-        envelope = Func(z, x, y, function='ST_TileEnvelope')
-        intersects = Q(
-            Func(
-                'transformedgeom',
-                envelope,
-                function='ST_Intersects',
-                output_field=BooleanField(),
-            )
-        )
+        intersects = intersects_tile('transformedgeom', z, x, y)
         transform = Func(
             'geomfromtext', 3857, function='ST_Transform', output_field=GeometryField()
         )
-        mvtgeom = Func(
-            'transformedgeom',
-            envelope,
-            function='ST_AsMVTGeom',
-            output_field=Field(),
-        )
+        mvtgeom = as_mvt_geom('transformedgeom', z, x, y)
 
         geomfromtext = Func(
             'geometry', 4326, function='ST_GeomFromText', output_field=Field()
@@ -177,11 +164,6 @@ def vector_tile_proposal(
                 'color_code',
             )
         )
-        (
-            site_sql,
-            site_params,
-        ) = site_queryset.query.sql_with_params()
-
         ground_truth_site_queryset = (
             AnnotationGroundTruthSite.objects.filter(
                 region_id=site_queryset.values('region_id')[:1]
@@ -252,17 +234,7 @@ def vector_tile_proposal(
                 'color_code',
             )
         )
-        (
-            ground_truth_site_sql,
-            ground_truth_site_params,
-        ) = ground_truth_site_queryset.query.sql_with_params()
-
-        (
-            site_union_sql,
-            site_union_params,
-        ) = site_queryset.union(
-            ground_truth_site_queryset, all=True
-        ).query.sql_with_params()
+        site_union_queryset = site_queryset.union(ground_truth_site_queryset, all=True)
 
         observations_queryset = (
             AnnotationProposalObservation.objects.filter(
@@ -349,11 +321,6 @@ def vector_tile_proposal(
             )
         )
 
-        (
-            observations_sql,
-            observations_params,
-        ) = observations_queryset.query.sql_with_params()
-
         ground_truth_observations_queryset = (
             AnnotationGroundTruthObservation.objects.filter(
                 annotation_ground_truth_site_uuid__in=(
@@ -432,17 +399,9 @@ def vector_tile_proposal(
                 'groundtruth',
             )
         )
-        (
-            ground_truth_observations_sql,
-            ground_truth_observations_params,
-        ) = ground_truth_observations_queryset.query.sql_with_params()
-
-        (
-            observations_union_sql,
-            observations_union_params,
-        ) = observations_queryset.union(
+        observations_union_queryset = observations_queryset.union(
             ground_truth_observations_queryset, all=True
-        ).query.sql_with_params()
+        )
 
         region_queryset = (
             Region.objects.filter(id=site_queryset.values('region_id')[:1])
@@ -452,51 +411,17 @@ def vector_tile_proposal(
             .values()
             .annotate(name=F('id'), mvtgeom=mvtgeom)
         )
-        (
-            region_sql,
-            region_params,
-        ) = region_queryset.query.sql_with_params()
-
-        sql = f"""
-            WITH
-                sites AS ({site_union_sql}),
-                observations AS ({observations_union_sql}),
-                regions AS ({region_sql})
-            SELECT(
-                (
-                    SELECT ST_AsMVT(sites.*, %s, 4096, 'mvtgeom')
-                    FROM sites
-                )
-                ||
-                (
-                    SELECT ST_AsMVT(observations.*, %s, 4096, 'mvtgeom')
-                    FROM observations
-                )
-                ||
-                (
-                    SELECT ST_AsMVT(regions.*, %s, 4096, 'mvtgeom')
-                    FROM regions
-                )
-            )
-        """  # noqa: E501
-        params = (
-            site_union_params
-            + observations_union_params
-            + region_params
-            + (
-                f'sites-{annotation_proposal_set_uuid}',
-                f'observations-{annotation_proposal_set_uuid}',
-                f'regions-{annotation_proposal_set_uuid}',
-            )
-        )
-
-        with connections['scoringdb'].cursor() as cursor:
-            cursor.execute(sql, params)
-            row = cursor.fetchone()
-        tile = row[0]
+        query = VectorTileQuery()
+        query.add_source('sites', site_union_queryset)
+        query.add_source('observations', observations_union_queryset)
+        query.add_source('regions', region_queryset)
+        query.add_layer(f'sites-{annotation_proposal_set_uuid}', 'sites')
+        query.add_layer(f'observations-{annotation_proposal_set_uuid}', 'observations')
+        query.add_layer(f'regions-{annotation_proposal_set_uuid}', 'regions')
+        tile = query.render(using='scoringdb')
 
         # Cache this for 30 days
-        cache.set(cache_key, tile.tobytes(), timedelta(days=30).total_seconds())
+        cache.set(cache_key, tile, timedelta(days=30).total_seconds())
 
     return HttpResponse(
         tile,
@@ -604,24 +529,11 @@ def vector_tile(
 
     # Generate the vector tiles and cache them if there's no hit
     if tile is None:
-        envelope = Func(z, x, y, function='ST_TileEnvelope')
-        intersects = Q(
-            Func(
-                'transformedgeom',
-                envelope,
-                function='ST_Intersects',
-                output_field=BooleanField(),
-            )
-        )
+        intersects = intersects_tile('transformedgeom', z, x, y)
         transform = Func(
             'geomfromtext', 3857, function='ST_Transform', output_field=GeometryField()
         )
-        mvtgeom = Func(
-            'transformedgeom',
-            envelope,
-            function='ST_AsMVTGeom',
-            output_field=Field(),
-        )
+        mvtgeom = as_mvt_geom('transformedgeom', z, x, y)
         geomfromuniongeometrytext = Func(
             'union_geometry', 4326, function='ST_GeomFromText', output_field=Field()
         )
@@ -681,11 +593,6 @@ def vector_tile(
                 base_site_id=F('site_id'),
             )
         )
-        (
-            site_sql,
-            site_params,
-        ) = site_queryset.query.sql_with_params()
-
         sites_points_queryset = (
             Site.objects.filter(evaluation_run_uuid=evaluation_run_uuid)
             .alias(
@@ -747,11 +654,6 @@ def vector_tile(
                 base_site_id=Substr(F('site_id'), 1, 12),
             )
         )
-        (
-            sites_points_sql,
-            sites_points_params,
-        ) = sites_points_queryset.query.sql_with_params()
-
         observations_queryset = (
             Observation.objects.filter(
                 site_uuid__evaluation_run_uuid=evaluation_run_uuid
@@ -811,11 +713,6 @@ def vector_tile(
                 ),
             )
         )
-        (
-            observations_sql,
-            observations_params,
-        ) = observations_queryset.query.sql_with_params()
-
         region_queryset = (
             Region.objects.filter(id=site_queryset.values('region_id')[:1])
             .alias(geomfromtext=geomfromobservationtext)
@@ -824,59 +721,19 @@ def vector_tile(
             .values()
             .annotate(name=F('id'), mvtgeom=mvtgeom)
         )
-        (
-            region_sql,
-            region_params,
-        ) = region_queryset.query.sql_with_params()
-
-        sql = f"""
-            WITH
-                sites AS ({site_sql}),
-                sites_points AS ({sites_points_sql}),
-                observations AS ({observations_sql}),
-                regions AS ({region_sql})
-            SELECT(
-                (
-                    SELECT ST_AsMVT(sites.*, %s, 4096, 'mvtgeom')
-                    FROM sites
-                )
-                ||
-                (
-                    SELECT ST_AsMVT(sites_points.*, %s, 4096, 'mvtgeom')
-                    FROM sites_points
-                )
-                ||
-                (
-                    SELECT ST_AsMVT(observations.*, %s, 4096, 'mvtgeom')
-                    FROM observations
-                )
-                ||
-                (
-                    SELECT ST_AsMVT(regions.*, %s, 4096, 'mvtgeom')
-                    FROM regions
-                )
-            )
-        """  # noqa: E501
-        params = (
-            site_params
-            + sites_points_params
-            + observations_params
-            + region_params
-            + (
-                f'sites-{evaluation_run_uuid}',
-                f'sites_points-{evaluation_run_uuid}',
-                f'observations-{evaluation_run_uuid}',
-                f'regions-{evaluation_run_uuid}',
-            )
-        )
-
-        with connections['scoringdb'].cursor() as cursor:
-            cursor.execute(sql, params)
-            row = cursor.fetchone()
-        tile = row[0]
+        query = VectorTileQuery()
+        query.add_source('sites', site_queryset)
+        query.add_source('sites_points', sites_points_queryset)
+        query.add_source('observations', observations_queryset)
+        query.add_source('regions', region_queryset)
+        query.add_layer(f'sites-{evaluation_run_uuid}', 'sites')
+        query.add_layer(f'sites_points-{evaluation_run_uuid}', 'sites_points')
+        query.add_layer(f'observations-{evaluation_run_uuid}', 'observations')
+        query.add_layer(f'regions-{evaluation_run_uuid}', 'regions')
+        tile = query.render(using='scoringdb')
 
         # Cache this for 30 days
-        cache.set(cache_key, tile.tobytes(), timedelta(days=30).total_seconds())
+        cache.set(cache_key, tile, timedelta(days=30).total_seconds())
 
     return HttpResponse(
         tile,
@@ -3,6 +3,7 @@ from datetime import timedelta
 from pathlib import Path
 
 from configurations import Configuration, values
+from kombu import Queue
 
 _ENVIRON_PREFIX = 'RDWATCH'
 
@@ -158,6 +159,111 @@ class BaseConfiguration(Configuration):
         environ_prefix=_ENVIRON_PREFIX,
     )
 
+    # Number of captures read concurrently for a single site when fetching
+    # satellite images, per constellation
+    SATELLITE_FETCH_POOL_SIZE = {
+        'WV': 2,
+        'S2': 8,
+        'L8': 8,
+        'PL': 4,
+    }
+
+    # STAC search results are cached in the default cache. Items are shared
+    # between searches and outlive the searches that reference them. Searches
+    # that reach into the last CAPTURE_CATALOG_PUBLICATION_LATENCY are only
+    # cached for STAC_RECENT_SEARCH_CACHE_TIMEOUT.
+    STAC_SEARCH_CACHE_TIMEOUT = timedelta(hours=12)
+    STAC_RECENT_SEARCH_CACHE_TIMEOUT = timedelta(minutes=15)
+    STAC_ITEM_CACHE_TIMEOUT = timedelta(days=7)
+    STAC_SEARCH_CACHE_MAX_ENTRIES = 50_000
+
+    # STAC items are harvested into the local capture catalog in windows of
+    # this long, and searches covered by a harvest are resolved from it
+    CAPTURE_CATALOG_HARVEST_CHUNK = timedelta(days=90)
+    CAPTURE_CATALOG_BATCH_SIZE = 500
+    # Captures this recent may still be published or backfilled, so they are
+    # never recorded as harvested
+    CAPTURE_CATALOG_PUBLICATION_LATENCY = timedelta(days=30)
+
+    # Neighbouring sites that hit the same capture are read as one shared
+    # window, no larger than this many degrees on a side
+    SHARED_WINDOW_MAX_SIZE = 0.05
+    SHARED_WINDOW_CACHE_TIMEOUT = timedelta(hours=1)
+
+    # Fetched site images are written in batches of this many rows, and their
+    # files are uploaded to storage by this many threads per site
+    SITE_IMAGE_BULK_BATCH_SIZE = 100
+    SITE_IMAGE_UPLOAD_POOL_SIZE = 8
+
+    # Progress of long running tasks is kept in the cache, and only written
+    # after this many seconds or percent of progress since the last write
+    TASK_PROGRESS_MIN_INTERVAL = 2.0
+    TASK_PROGRESS_MIN_PERCENT = 5.0
+    TASK_PROGRESS_TIMEOUT = timedelta(days=1)
+
+    # Raster asset statistics are stored in the database, this is how long
+    # they are additionally kept in the cache
+    ASSET_STATISTICS_CACHE_TIMEOUT = timedelta(days=7)
+
+    # Open raster readers are pooled per process, so repeated reads of the
+    # same capture don't fetch the COG header again. The maximum only applies
+    # to idle readers, checked out ones aren't counted
+    READER_POOL_MAX_OPEN = 32
+    READER_POOL_IDLE_TIMEOUT = timedelta(minutes=5)
+
+    # Repeated fetches for a site only search dates newer than what was
+    # already fetched, minus this overlap for captures that are published late
+    SATELLITE_FETCH_WATERMARK_OVERLAP = timedelta(days=3)
+
+    # Rendered satellite tiles are kept in a hot tier in the cache, limited to
+    # this many least recently used tiles, and durably in the default storage
+    # under TILE_CACHE_STORAGE_PREFIX
+    TILE_CACHE_HOT_MAX_ENTRIES = 20_000
+    TILE_CACHE_HOT_TIMEOUT = timedelta(days=1)
+    TILE_CACHE_STORAGE_PREFIX = 'tile-cache'
+    # Which capture a tile request for a timestamp resolves to is cached for
+    # this long, so tiles are served without searching for the capture again
+    TILE_TIMESTAMP_CACHE_TIMEOUT = timedelta(days=7)
+    # Tiles are rendered in metatiles of this many tiles on a side (a power of
+    # two), read with a single request, and a request waits this long for
+    # another one that is rendering the same metatile
+    TILE_METATILE_SIZE = 4
+    TILE_METATILE_LOCK_TIMEOUT = timedelta(seconds=60)
+    # Most tiles that can be requested at once from the batch tile endpoints
+    TILE_BATCH_MAX_TILES = 64
+
+    # Vector tiles of a model run are prebuilt into a PMTiles archive in
+    # storage from zoom 0 up to VECTOR_TILE_ARCHIVE_MAX_ZOOM, as long as the
+    # archive stays within VECTOR_TILE_ARCHIVE_MAX_TILES tiles. Higher zooms
+    # are rendered on request.
+    VECTOR_TILE_ARCHIVE_MAX_ZOOM = 12
+    VECTOR_TILE_ARCHIVE_MAX_TILES = 20_000
+    VECTOR_TILE_ARCHIVE_PREFIX = 'vector-tiles'
+    VECTOR_TILE_ARCHIVE_CACHE_TIMEOUT = timedelta(days=7)
+
+    # Sizes in vector tile grid units, of which there are 4096 across a tile
+    # (8 is a pixel of a tile drawn at 512 pixels). Polygons smaller than
+    # VECTOR_TILE_MIN_FEATURE_SIZE are left out of vector tiles, and points
+    # are clustered into cells of VECTOR_TILE_CLUSTER_SIZE up to
+    # VECTOR_TILE_CLUSTER_MAX_ZOOM.
+    VECTOR_TILE_MIN_FEATURE_SIZE = 8
+    VECTOR_TILE_CLUSTER_SIZE = 64
+    VECTOR_TILE_CLUSTER_MAX_ZOOM = 9
+
+    # Requests to remote hosts (STAC searches and raster reads) are limited to
+    # (requests per second, burst size) per host, shared by every process.
+    # Hosts are URL hosts, or bucket names for s3:// URIs. Throttled requests
+    # are retried with jittered exponential backoff.
+    RATE_LIMITS = {
+        'earth-search.aws.element84.com': (10.0, 20),
+        'landsatlook.usgs.gov': (5.0, 10),
+        'sentinel-cogs': (100.0, 200),
+    }
+    RATE_LIMIT_DEFAULT = (20.0, 40)
+    RATE_LIMIT_MAX_RETRIES = 5
+    RATE_LIMIT_BACKOFF_BASE = 0.5
+    RATE_LIMIT_BACKOFF_MAX = 30.0
+
     # Set to same value allowed by NGINX Unit server in `settings.http.max_body_size`
     # (in /docker/nginx.json)
     DATA_UPLOAD_MAX_MEMORY_SIZE = 134217728
@@ -206,6 +312,58 @@ class BaseConfiguration(Configuration):
         else:
             return []
 
+    # Tasks are routed to dedicated queues, so bulk work can't starve
+    # interactive requests. Workers consume every queue in CELERY_TASK_QUEUES
+    # unless started with `--queues`, one prefetched task per process at a time.
+    INTERACTIVE_FETCH_QUEUE = 'interactive-fetch'
+    BULK_FETCH_QUEUE = 'bulk-fetch'
+    EXPORT_QUEUE = 'export'
+    EMBEDDING_QUEUE = 'embedding'
+    MAINTENANCE_QUEUE = 'maintenance'
+    CELERY_TASK_DEFAULT_QUEUE = 'celery'
+    CELERY_TASK_QUEUES = [
+        Queue(name)
+        for name in (
+            INTERACTIVE_FETCH_QUEUE,
+            BULK_FETCH_QUEUE,
+            EXPORT_QUEUE,
+            EMBEDDING_QUEUE,
+            MAINTENANCE_QUEUE,
+            CELERY_TASK_DEFAULT_QUEUE,
+        )
+    ]
+    CELERY_TASK_ROUTES = {
+        'rdwatch.*.tasks.generate_site_images': {'queue': INTERACTIVE_FETCH_QUEUE},
+        'rdwatch.*.tasks.get_siteobservation_images_task': {
+            'queue': INTERACTIVE_FETCH_QUEUE
+        },
+        'rdwatch.*.tasks.cancel_generate_images_task': {
+            'queue': INTERACTIVE_FETCH_QUEUE
+        },
+        'rdwatch.*.tasks.generate_site_images_for_evaluation_run': {
+            'queue': BULK_FETCH_QUEUE
+        },
+        'rdwatch.core.tasks.precompute_asset_statistics': {'queue': BULK_FETCH_QUEUE},
+        'rdwatch.core.tasks.harvest_capture_catalog': {'queue': BULK_FETCH_QUEUE},
+        'rdwatch.*.tasks.animation_export.*': {'queue': EXPORT_QUEUE},
+        'rdwatch.core.tasks.download_annotations': {'queue': EXPORT_QUEUE},
+        'rdwatch.core.tasks.build_vector_tile_archive_task': {'queue': EXPORT_QUEUE},
+        'rdwatch.core.tasks.generate_image_embedding': {'queue': EMBEDDING_QUEUE},
+        'rdwatch.core.tasks.collect_garbage_task': {'queue': MAINTENANCE_QUEUE},
+    }
+    CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+    # Priorities go from 0 (highest) to TASK_MAX_PRIORITY. Within a queue,
+    # the sites of a model run are spread over the priorities by their
+    # fraction of the model run, so a model run that starts later isn't
+    # stuck behind all of an earlier, larger one.
+    TASK_MAX_PRIORITY = 9
+    CELERY_TASK_DEFAULT_PRIORITY = 0
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        'priority_steps': list(range(TASK_MAX_PRIORITY + 1)),
+        'queue_order_strategy': 'priority',
+    }
+
     CELERY_BEAT_SCHEDULE = {
         'collect-garbage-beat': {
             'task': 'rdwatch.core.tasks.collect_garbage_task',